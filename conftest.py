@@ -0,0 +1 @@
+# Lets pytest import the pipeline package from the repository root (tests/).
@@ -1,11 +1,17 @@
 import os
-import json
+import sys
 from datetime import datetime, timedelta
 from collections import defaultdict
-from azure.cosmos import CosmosClient
 from dotenv import load_dotenv
 from answer_scorer import score_answer
 
+# Shared client registry lives in the top-level pipeline package
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from pipeline.replay import open_container
+from pipeline.quantiles import DDSketch, latency_stats, quantile_stats
+from pipeline.artifacts import write_if_changed
+from pipeline.scoring import MAX_BATCH_OPERATIONS, ScoreWriter
+
 load_dotenv()
 
 # =============================================================================
@@ -14,23 +20,13 @@ load_dotenv()
 
 def connect_to_cosmos():
     """Connect to Cosmos DB (Staging) for A/B test data."""
-    client = CosmosClient(
-        os.getenv("COSMOS_ENDPOINT"),
-        credential=os.getenv("COSMOS_KEY")
-    )
-    database = client.get_database_client("history")
-    container = database.get_container_client("conversation")
-    return container
+    return open_container("staging_conversation", os.getenv("COSMOS_ENDPOINT"), os.getenv("COSMOS_KEY"),
+                          "history", "conversation")
 
 def connect_to_cosmos_prod():
     """Connect to Production Cosmos DB for adoption metrics."""
-    client = CosmosClient(
-        os.getenv("COSMOS_PROD_ENDPOINT"),
-        credential=os.getenv("COSMOS_PROD_KEY")
-    )
-    database = client.get_database_client("history")
-    container = database.get_container_client("conversation")
-    return container
+    return open_container("prod_conversation", os.getenv("COSMOS_PROD_ENDPOINT"), os.getenv("COSMOS_PROD_KEY"),
+                          "history", "conversation")
 
 # =============================================================================
 # DATA FETCHING
@@ -87,9 +83,14 @@ def fetch_all_queries_for_adoption(container, days=None):
 # SCORING
 # =============================================================================
 
-def score_unscored_queries(raw_data, container):
-    """Score queries that don't have evaluation scores yet."""
-    scored_count = 0
+def score_unscored_queries(raw_data, container, batch_size=MAX_BATCH_OPERATIONS):
+    """
+    Score queries that don't have evaluation scores yet; only /evaluation_scores is written back.
+    Scores are written every batch_size documents, so a crash loses at most one batch of judge calls.
+    """
+    writer = None
+    pending = []
+    written = 0
     
     for doc in raw_data:
         if doc.get('evaluation_scores'):
@@ -102,10 +103,16 @@ def score_unscored_queries(raw_data, container):
         scores = score_answer(query, answer, result_count)
         
         doc['evaluation_scores'] = scores
-        container.upsert_item(doc)
-        scored_count += 1
-    
-    return scored_count
+        pending.append(doc)
+        if len(pending) >= batch_size:
+            writer = writer or ScoreWriter(container)
+            written += len(writer.write(pending))
+            pending = []
+    
+    if pending:
+        writer = writer or ScoreWriter(container)
+        written += len(writer.write(pending))
+    return written
 
 # =============================================================================
 # ADOPTION METRICS CALCULATION
@@ -168,6 +175,8 @@ def calculate_adoption_metrics(raw_data):
     # --- Response Time Stats ---
     response_times = [q['response_time'] for q in user_queries if q['response_time'] and q['response_time'] > 0]
     avg_response_time = round(sum(response_times) / len(response_times), 0) if response_times else 0
+    response_sketch = DDSketch()
+    response_sketch.add_many(response_times)
     
     # --- Peak Hours ---
     hour_counts = defaultdict(int)
@@ -189,6 +198,7 @@ def calculate_adoption_metrics(raw_data):
         "totalUsers": total_users,
         "queriesPerUser": queries_per_user,
         "avgResponseTimeMs": avg_response_time,
+        "responseTimeStats": quantile_stats(response_sketch, digits=0),
         "peakHour": peak_hour,
         "queryTrend": query_trend,
         "topUsers": top_users,
@@ -222,8 +232,9 @@ def transform_to_dashboard_format(raw_data):
     improvement = ((t_avg_results - c_avg_results) / c_avg_results * 100) if c_avg_results > 0 else 0
     
     # Latency stats (treatment only)
-    latencies = [d.get('query_rewrite_telemetry', {}).get('rewrite_time_ms', 0) for d in treatment]
-    latencies = [l for l in latencies if l > 0]
+    latency_sketch = DDSketch()
+    for d in treatment:
+        latency_sketch.add(d.get('query_rewrite_telemetry', {}).get('rewrite_time_ms', 0))
     
     # Build treatment queries list with scores
     treatment_queries = []
@@ -316,7 +327,7 @@ def transform_to_dashboard_format(raw_data):
             "treatmentPercentage": round(len(treatment) / total * 100, 1) if total > 0 else 0,
             "controlCount": len(control),
             "controlPercentage": round(len(control) / total * 100, 1) if total > 0 else 0,
-            "avgLatencyMs": round(sum(latencies) / len(latencies), 2) if latencies else 0,
+            "avgLatencyMs": round(latency_sketch.sum / latency_sketch.count, 2) if latency_sketch.count else 0,
             "targetLatencyMs": 40
         },
         "zeroResultRates": {
@@ -328,13 +339,7 @@ def transform_to_dashboard_format(raw_data):
             "control": round(c_avg_results, 1),
             "improvementPercent": round(improvement, 1)
         },
-        "latencyStats": {
-            "min": round(min(latencies), 2) if latencies else 0,
-            "max": round(max(latencies), 2) if latencies else 0,
-            "avg": round(sum(latencies) / len(latencies), 2) if latencies else 0,
-            "p95": round(sorted(latencies)[int(len(latencies) * 0.95)] if latencies else 0, 2),
-            "target": 40
-        },
+        "latencyStats": latency_stats(latency_sketch, target=40),
         "evaluationScores": {
             "treatment": treatment_avg_scores,
             "control": control_avg_scores
@@ -376,9 +381,10 @@ def main():
     
     # Save A/B test data to src/data.json
     ab_output_path = os.path.join(os.path.dirname(__file__), '..', 'src', 'data.json')
-    with open(ab_output_path, 'w') as f:
-        json.dump(dashboard_data, f, indent=2)
-    print(f"✓ Saved A/B test data to src/data.json")
+    if write_if_changed(ab_output_path, dashboard_data):
+        print(f"✓ Saved A/B test data to src/data.json")
+    else:
+        print(f"✓ A/B test data unchanged, kept src/data.json")
     
     # --- PRODUCTION: Adoption Data ---
     print("\n" + "=" * 50)
@@ -394,9 +400,10 @@ def main():
     
     # Save adoption data to src/adoption.json
     adoption_output_path = os.path.join(os.path.dirname(__file__), '..', 'src', 'adoption.json')
-    with open(adoption_output_path, 'w') as f:
-        json.dump(adoption_metrics, f, indent=2)
-    print(f"✓ Saved adoption data to src/adoption.json")
+    if write_if_changed(adoption_output_path, adoption_metrics):
+        print(f"✓ Saved adoption data to src/adoption.json")
+    else:
+        print(f"✓ Adoption data unchanged, kept src/adoption.json")
     
     # --- SUMMARY ---
     print("\n" + "=" * 50)
@@ -0,0 +1 @@
+"""Support modules for the dashboard data pipeline (transform_to_dashboard.py)."""
@@ -0,0 +1,743 @@
+import heapq
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from pipeline.artifacts import ListSpool
+from pipeline.hll import DaySketches, hash_user
+from pipeline.quantiles import DDSketch, latency_stats, quantile_stats
+
+# Incremental versions of the calculate_*_metrics functions in
+# transform_to_dashboard.py. Documents are fed in with add()/add_page() as they
+# arrive and finalize() returns exactly the dict the list-based versions
+# returned. State is kept in plain dicts/lists and NumPy arrays; to_state()
+# turns it into plain JSON for a resume checkpoint and from_state() builds
+# the accumulator back from it.
+#
+# merge(other) folds in an accumulator that was fed the documents following
+# this one's, leaving exactly the state a single accumulator fed both runs in
+# order would have; pipeline.sharding relies on it to split a run across
+# processes.
+
+
+def _empty_group():
+    return {
+        "count": 0,
+        "zeros": 0,
+        "results": 0,
+        "scored": 0,
+        "relevance": 0,
+        "groundedness": 0,
+        "completeness": 0,
+    }
+
+
+def _keeps(heap, limit, key) -> bool:
+    """Whether an entry with (sort key, -sequence) `key` would enter the heap; saves building items that would not."""
+    return limit is None or len(heap) < limit or key > heap[0][:2]
+
+
+def _push_newest(heap, entry, limit):
+    """
+    Add (sort key, -sequence, item) to a min-heap holding the `limit` newest
+    entries (all of them when limit is None). The larger key wins; on equal
+    keys the earlier document wins, matching a stable descending sort.
+    """
+    if limit is None or len(heap) < limit:
+        heapq.heappush(heap, entry)
+    elif entry[:2] > heap[0][:2]:
+        heapq.heapreplace(heap, entry)
+
+
+def _merge_newest(heap, other_heap, offset, limit):
+    """Fold another accumulator's heap in, its sequence numbers shifted past ours by offset."""
+    shifted = [(key, neg_seq - offset, item) for key, neg_seq, item in other_heap]
+    if limit is None:
+        heap.extend(shifted)
+        heapq.heapify(heap)
+        return
+    for entry in shifted:
+        _push_newest(heap, entry, limit)
+
+
+def _heap_from_state(entries) -> list:
+    """A heap saved by to_state (its entries became JSON lists), in the same heap order."""
+    return [tuple(entry) for entry in entries]
+
+
+def _spools_state(spools) -> dict:
+    return {name: spool.to_state() for name, spool in spools.items()}
+
+
+def _spools_from_state(state) -> dict:
+    return {name: ListSpool.from_state(spool) for name, spool in state.items()}
+
+
+def _newest_first(heap) -> list:
+    return [entry[2] for entry in sorted(heap, key=lambda e: e[:2], reverse=True)]
+
+
+def _avg_scores(group):
+    if not group["count"] or not group["scored"]:
+        return {"relevance": 0, "groundedness": 0, "completeness": 0}
+    n = group["scored"]
+    return {
+        "relevance": round(group["relevance"] / n, 2),
+        "groundedness": round(group["groundedness"] / n, 2),
+        "completeness": round(group["completeness"] / n, 2)
+    }
+
+
+# =============================================================================
+# QUERY REWRITER
+# =============================================================================
+
+class RewriterAccumulator:
+    """
+    Accumulates query rewriter metrics one document at a time. The query
+    lists are kept newest first by _ts in heaps (bounded by query_limit and
+    zero_limit when set), so documents may arrive in any order. spools maps
+    "rewrittenQueries" and "zeroResultQueries" to ListSpools
+    (pipeline.artifacts) that are fed every item, so the heaps can stay
+    small while the whole lists still reach the shards.
+    """
+
+    # Top-level document fields add() reads; fetches project only these
+    FIELDS = ("id", "_ts", "conversation_id", "conversation", "timestamp", "resultCount",
+              "evaluation_scores", "query_rewrite_telemetry")
+
+    def __init__(self, query_limit=None, zero_limit=None, spools=None):
+        self.query_limit = query_limit
+        self.zero_limit = zero_limit
+        self.spools = spools or {}
+        self.total = 0
+        self.groups = {"rewritten": _empty_group(), "passthrough": _empty_group()}
+        self.latency_sketch = DDSketch()
+        self.expansion_total = 0
+        self.entity_counts = {}
+        self.rewritten_heap = []
+        self.zero_result_heap = []
+
+    @property
+    def rewritten_queries(self) -> list:
+        return _newest_first(self.rewritten_heap)
+
+    @property
+    def zero_result_queries(self) -> list:
+        return _newest_first(self.zero_result_heap)
+
+    def add(self, doc):
+        self.total += 1
+        key = (doc.get('_ts', 0), -self.total)
+        telemetry = doc.get('query_rewrite_telemetry', {})
+        expansion_count = telemetry.get('expansion_count', 0)
+        result_count = doc.get('resultCount', 0)
+        is_rewritten = expansion_count > 0
+
+        group = self.groups["rewritten" if is_rewritten else "passthrough"]
+        group["count"] += 1
+        group["results"] += result_count
+        if result_count == 0:
+            group["zeros"] += 1
+
+        scores = doc.get('evaluation_scores')
+        if scores:
+            group["scored"] += 1
+            group["relevance"] += scores.get('relevance', 0)
+            group["groundedness"] += scores.get('groundedness', 0)
+            group["completeness"] += scores.get('completeness', 0)
+
+        if is_rewritten:
+            lat = telemetry.get('rewrite_time_ms', 0)
+            if lat > 0:
+                self.latency_sketch.add(lat)
+
+            self.expansion_total += expansion_count
+
+            for entity in telemetry.get('matched_entities', []):
+                self.entity_counts[entity] = self.entity_counts.get(entity, 0) + 1
+
+            spool = self.spools.get("rewrittenQueries")
+            if spool is not None or _keeps(self.rewritten_heap, self.query_limit, key):
+                scores = doc.get('evaluation_scores', {})
+                item = {
+                    "id": doc.get('conversation_id', doc.get('id', ''))[:8],
+                    "query": doc.get('conversation', ''),
+                    "matchedEntities": telemetry.get('matched_entities', []),
+                    "expansionCount": telemetry.get('expansion_count', 0),
+                    "expandedQuery": telemetry.get('expanded_query', ''),
+                    "rewriteTimeMs": round(telemetry.get('rewrite_time_ms', 0), 2),
+                    "resultCount": result_count,
+                    "scores": {
+                        "relevance": scores.get('relevance', 0),
+                        "groundedness": scores.get('groundedness', 0),
+                        "completeness": scores.get('completeness', 0)
+                    }
+                }
+                if spool is not None:
+                    spool.append(*key, item)
+                _push_newest(self.rewritten_heap, (*key, item), self.query_limit)
+
+        spool = self.spools.get("zeroResultQueries")
+        if result_count == 0 and (spool is not None or _keeps(self.zero_result_heap, self.zero_limit, key)):
+            item = {
+                "id": doc.get('conversation_id', doc.get('id', ''))[:8],
+                "query": doc.get('conversation', ''),
+                "matchedEntities": telemetry.get('matched_entities', []),
+                "wasRewritten": is_rewritten,
+                "timestamp": doc.get('timestamp', '')
+            }
+            if spool is not None:
+                spool.append(*key, item)
+            _push_newest(self.zero_result_heap, (*key, item), self.zero_limit)
+
+    def add_page(self, docs):
+        for doc in docs:
+            self.add(doc)
+        for spool in self.spools.values():
+            spool.flush()
+
+    def merge(self, other):
+        """Fold in an accumulator fed the documents after this one's."""
+        if self.spools or other.spools:
+            raise ValueError("Cannot merge accumulators that spool their lists")
+        offset = self.total
+        self.total += other.total
+        for name, group in other.groups.items():
+            for field, value in group.items():
+                self.groups[name][field] += value
+        self.latency_sketch.merge(other.latency_sketch)
+        self.expansion_total += other.expansion_total
+        for entity, count in other.entity_counts.items():
+            self.entity_counts[entity] = self.entity_counts.get(entity, 0) + count
+        _merge_newest(self.rewritten_heap, other.rewritten_heap, offset, self.query_limit)
+        _merge_newest(self.zero_result_heap, other.zero_result_heap, offset, self.zero_limit)
+        return self
+
+    def to_state(self) -> dict:
+        """JSON-serializable state for a resume checkpoint; see from_state."""
+        return {
+            "query_limit": self.query_limit,
+            "zero_limit": self.zero_limit,
+            "spools": _spools_state(self.spools),
+            "total": self.total,
+            "groups": self.groups,
+            "latency_sketch": self.latency_sketch.to_dict(),
+            "expansion_total": self.expansion_total,
+            "entity_counts": list(self.entity_counts.items()),
+            "rewritten_heap": self.rewritten_heap,
+            "zero_result_heap": self.zero_result_heap,
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        accumulator = cls(state["query_limit"], state["zero_limit"], _spools_from_state(state["spools"]))
+        accumulator.total = state["total"]
+        accumulator.groups = state["groups"]
+        accumulator.latency_sketch = DDSketch.from_dict(state["latency_sketch"])
+        accumulator.expansion_total = state["expansion_total"]
+        accumulator.entity_counts = dict(state["entity_counts"])
+        accumulator.rewritten_heap = _heap_from_state(state["rewritten_heap"])
+        accumulator.zero_result_heap = _heap_from_state(state["zero_result_heap"])
+        return accumulator
+
+    def finalize(self):
+        total = self.total
+        if total == 0:
+            return {"error": "No data"}
+
+        rewritten = self.groups["rewritten"]
+        passthrough = self.groups["passthrough"]
+
+        top_entities = [{"entity": k, "count": v} for k, v in sorted(self.entity_counts.items(), key=lambda x: -x[1])[:10]]
+
+        return {
+            "summary": {
+                "totalQueries": total,
+                "rewrittenCount": rewritten["count"],
+                "passthroughCount": passthrough["count"],
+                "rewriteRate": round(rewritten["count"] / total * 100, 1),
+                "avgExpansionCount": round(self.expansion_total / rewritten["count"], 1) if rewritten["count"] else 0
+            },
+            "effectiveness": {
+                "rewrittenZeroRate": round(rewritten["zeros"] / rewritten["count"] * 100, 1) if rewritten["count"] else 0,
+                "passthroughZeroRate": round(passthrough["zeros"] / passthrough["count"] * 100, 1) if passthrough["count"] else 0,
+                "rewrittenAvgResults": round(rewritten["results"] / rewritten["count"], 1) if rewritten["count"] else 0,
+                "passthroughAvgResults": round(passthrough["results"] / passthrough["count"], 1) if passthrough["count"] else 0
+            },
+            "latencyStats": latency_stats(self.latency_sketch, target=40),
+            "qualityScores": {
+                "rewritten": _avg_scores(rewritten),
+                "passthrough": _avg_scores(passthrough)
+            },
+            "topEntities": top_entities,
+            "rewrittenQueries": self.rewritten_queries,
+            "zeroResultQueries": self.zero_result_queries,
+            "metadata": {
+                "generatedAt": datetime.now().isoformat(),
+                "dataSource": "staging"
+            }
+        }
+
+
+# =============================================================================
+# ADOPTION
+# =============================================================================
+
+_NO_TELEMETRY = {}
+
+
+class _UserIndex(dict):
+    """User id -> column index; a missing user gets the next index."""
+
+    def __missing__(self, user):
+        self[user] = index = len(self)
+        return index
+
+
+class AdoptionAccumulator:
+    """
+    Columnar adoption engine. Each page is decoded once into integer and float
+    columns (_ts, interned user index, response time) and every aggregate is
+    folded in with vectorized operations. Local hour and day are decoded per
+    distinct 15-minute _ts bucket rather than per row. Memory grows with
+    users and days, not rows.
+
+    With distinct="hll", WAU, MAU and totalUsers come from per-day
+    HyperLogLog sketches (pipeline.hll) instead of exact per-user flags.
+    Windows then cover whole local days: WAU counts users active on the last
+    seven days, today included, and MAU on the last thirty. Pass
+    day_sketches to merge in sketches persisted by earlier runs. Per-user
+    columns are then only needed for topUsers, so they are bounded: past
+    2 * max_users users they are cut back to the max_users heaviest, and
+    topUsers becomes approximate (a dropped user who returns counts anew).
+    """
+
+    # Every UTC offset in use is a multiple of 15 minutes, so all timestamps in
+    # a bucket share a local hour and day
+    BUCKET_SECONDS = 900
+
+    def __init__(self, now=None, distinct="exact", day_sketches=None, max_users=10000):
+        self.now = now or datetime.now()
+        self.distinct = distinct
+        self.week_ago = self.now - timedelta(days=7)
+        self.month_ago = self.now - timedelta(days=30)
+        self.total_queries = 0
+        self.user_index = _UserIndex()  # user id -> column index, in first-seen order
+        self.user_counts = np.zeros(0, dtype=np.int64)
+        self.wau_seen = np.zeros(0, dtype=bool)
+        self.mau_seen = np.zeros(0, dtype=bool)
+        self.hour_counts = np.zeros(24, dtype=np.int64)
+        self.hour_order = []  # hours in first-seen order, for peak hour ties
+        self.daily_counts = {}
+        self.response_time_total = 0
+        self.response_time_count = 0
+        self.response_sketch = DDSketch()
+        self._buckets = {}  # bucket -> (local hour, local day)
+        if distinct == "hll":
+            self.user_hashes = np.zeros(0, dtype=np.uint64)
+            self.day_sketches = day_sketches or DaySketches()
+            self.max_users = max_users
+            self.top_users_exact = True
+
+    def add(self, doc):
+        self.add_page([doc])
+
+    def add_page(self, docs):
+        # Plain list comprehensions and a dict with __missing__ for interning:
+        # the per-document field reads are most of the cost of a page
+        ts = np.array([doc.get('_ts') or 0 for doc in docs], dtype=np.int64)
+        if not ts.all():
+            docs = [doc for doc, keep in zip(docs, ts.tolist()) if keep]
+            ts = ts[ts != 0]
+        if not len(docs):
+            return
+        index = self.user_index
+        users = np.array(
+            [index[doc.get('user_id') or doc.get('user_name') or 'anonymous'] for doc in docs],
+            dtype=np.int64
+        )
+        response_times = np.array(
+            [(doc.get('llm_telemetry') or _NO_TELEMETRY).get('response_time_ms') or 0 for doc in docs],
+            dtype=np.float64
+        )
+        self.add_columns(ts, users, response_times)
+
+    def add_columns(self, ts, users, response_times):
+        """Fold one page of columns in; users are indexes into user_index."""
+        self.total_queries += len(ts)
+        self._grow(len(self.user_index))
+
+        self.user_counts += np.bincount(users, minlength=len(self.user_counts))
+        week = ts >= self.week_ago.timestamp()
+        month = ts >= self.month_ago.timestamp()
+        self.wau_seen[users[week]] = True
+        self.mau_seen[users[month]] = True
+
+        positive = response_times > 0
+        self.response_time_total += float(response_times[positive].sum())
+        self.response_time_count += int(positive.sum())
+        self.response_sketch.add_many(response_times[positive])
+
+        # Buckets relative to the page's oldest one; a page spans a bounded
+        # range of _ts, so bincount over the range beats sorting the rows
+        buckets = ts // self.BUCKET_SECONDS
+        first_bucket = int(buckets.min())
+        buckets -= first_bucket
+        present = np.flatnonzero(np.bincount(buckets)).tolist()
+        bucket_hours = np.zeros(present[-1] + 1, dtype=np.int64)
+        bucket_days = {}
+        for b in present:
+            bucket_hours[b], bucket_days[b] = self._decode(first_bucket + b)
+
+        hours = bucket_hours[buckets]
+        hour_counts = np.bincount(hours, minlength=24)
+        self.hour_counts += hour_counts
+        new_hours = [h for h in np.flatnonzero(hour_counts).tolist() if h not in self.hour_order]
+        self.hour_order.extend(sorted(new_hours, key=lambda h: int(np.argmax(hours == h))))
+
+        month_counts = np.bincount(buckets[month], minlength=len(bucket_hours))
+        for b in np.flatnonzero(month_counts).tolist():
+            day_key = bucket_days[b]
+            self.daily_counts[day_key] = self.daily_counts.get(day_key, 0) + int(month_counts[b])
+
+        if self.distinct == "hll":
+            row_days = np.zeros(len(bucket_hours), dtype=np.int64)
+            day_keys = sorted(set(bucket_days.values()))
+            for b, day_key in bucket_days.items():
+                row_days[b] = day_keys.index(day_key)
+            row_days = row_days[buckets]
+            for i, day_key in enumerate(day_keys):
+                self.day_sketches.add_hashes(day_key, self.user_hashes[users[row_days == i]])
+            self._bound_users()
+
+    def merge(self, other):
+        """Fold in an accumulator (same clock and mode) fed the documents after this one's."""
+        if other.now != self.now or other.distinct != self.distinct:
+            raise ValueError("Cannot merge adoption accumulators with different clocks or distinct modes")
+        self.total_queries += other.total_queries
+        intern = self.user_index.setdefault
+        users = np.fromiter((intern(user, len(self.user_index)) for user in other.user_index),
+                            dtype=np.int64, count=len(other.user_index))
+        self._grow(len(self.user_index))
+        self.user_counts[users] += other.user_counts
+        self.wau_seen[users] |= other.wau_seen
+        self.mau_seen[users] |= other.mau_seen
+        self.hour_counts += other.hour_counts
+        self.hour_order.extend(h for h in other.hour_order if h not in self.hour_order)
+        for day_key, count in other.daily_counts.items():
+            self.daily_counts[day_key] = self.daily_counts.get(day_key, 0) + count
+        self.response_time_total += other.response_time_total
+        self.response_time_count += other.response_time_count
+        self.response_sketch.merge(other.response_sketch)
+        self._buckets.update(other._buckets)
+        if self.distinct == "hll":
+            self.day_sketches.merge(other.day_sketches)
+            self.top_users_exact = self.top_users_exact and other.top_users_exact
+            self._bound_users()
+        return self
+
+    def to_state(self) -> dict:
+        """JSON-serializable state for a resume checkpoint; see from_state."""
+        state = {
+            "now": self.now.isoformat(),
+            "distinct": self.distinct,
+            "total_queries": self.total_queries,
+            "users": list(self.user_index),
+            "user_counts": self.user_counts.tolist(),
+            "wau_seen": self.wau_seen.tolist(),
+            "mau_seen": self.mau_seen.tolist(),
+            "hour_counts": self.hour_counts.tolist(),
+            "hour_order": self.hour_order,
+            "daily_counts": self.daily_counts,
+            "response_time_total": self.response_time_total,
+            "response_time_count": self.response_time_count,
+            "response_sketch": self.response_sketch.to_dict(),
+        }
+        if self.distinct == "hll":
+            state.update(day_sketches=self.day_sketches.to_state(), max_users=self.max_users,
+                         top_users_exact=self.top_users_exact)
+        return state
+
+    @classmethod
+    def from_state(cls, state):
+        hll = state["distinct"] == "hll"
+        accumulator = cls(now=datetime.fromisoformat(state["now"]), distinct=state["distinct"],
+                          day_sketches=DaySketches.from_state(state["day_sketches"]) if hll else None,
+                          **({"max_users": state["max_users"]} if hll else {}))
+        accumulator.total_queries = state["total_queries"]
+        accumulator.user_index = _UserIndex((user, i) for i, user in enumerate(state["users"]))
+        accumulator.user_counts = np.array(state["user_counts"], dtype=np.int64)
+        accumulator.wau_seen = np.array(state["wau_seen"], dtype=bool)
+        accumulator.mau_seen = np.array(state["mau_seen"], dtype=bool)
+        accumulator.hour_counts = np.array(state["hour_counts"], dtype=np.int64)
+        accumulator.hour_order = state["hour_order"]
+        accumulator.daily_counts = state["daily_counts"]
+        accumulator.response_time_total = state["response_time_total"]
+        accumulator.response_time_count = state["response_time_count"]
+        accumulator.response_sketch = DDSketch.from_dict(state["response_sketch"])
+        if hll:
+            accumulator.user_hashes = np.fromiter((hash_user(user) for user in state["users"]),
+                                                  dtype=np.uint64, count=len(state["users"]))
+            accumulator.top_users_exact = state["top_users_exact"]
+        return accumulator
+
+    def _grow(self, size):
+        extra = size - len(self.user_counts)
+        if extra > 0:
+            self.user_counts = np.concatenate([self.user_counts, np.zeros(extra, dtype=np.int64)])
+            self.wau_seen = np.concatenate([self.wau_seen, np.zeros(extra, dtype=bool)])
+            self.mau_seen = np.concatenate([self.mau_seen, np.zeros(extra, dtype=bool)])
+            if self.distinct == "hll":
+                new_users = list(self.user_index)[size - extra:]
+                hashes = np.fromiter((hash_user(u) for u in new_users), dtype=np.uint64, count=extra)
+                self.user_hashes = np.concatenate([self.user_hashes, hashes])
+
+    def _bound_users(self):
+        """Cut the per-user columns back to the max_users heaviest users (hll mode)."""
+        if len(self.user_index) <= 2 * self.max_users:
+            return
+        # Stable on count so ties keep the earliest-seen users, then back in
+        # first-seen order
+        keep = np.sort(np.argsort(-self.user_counts, kind="stable")[:self.max_users])
+        users = list(self.user_index)
+        self.user_index = _UserIndex((users[i], n) for n, i in enumerate(keep.tolist()))
+        self.user_counts = self.user_counts[keep]
+        self.wau_seen = self.wau_seen[keep]
+        self.mau_seen = self.mau_seen[keep]
+        self.user_hashes = self.user_hashes[keep]
+        self.top_users_exact = False
+
+    def _decode(self, bucket):
+        decoded = self._buckets.get(bucket)
+        if decoded is None:
+            local = datetime.fromtimestamp(bucket * self.BUCKET_SECONDS)
+            decoded = self._buckets[bucket] = (local.hour, local.strftime('%Y-%m-%d'))
+        return decoded
+
+    def finalize(self):
+        user_query_counts = dict(zip(self.user_index, self.user_counts.tolist()))
+        hour_counts = {hour: int(self.hour_counts[hour]) for hour in self.hour_order}
+
+        if self.distinct == "hll":
+            sketches = self.day_sketches
+            return build_adoption_metrics(
+                total_queries=self.total_queries,
+                wau=sketches.count((self.now - timedelta(days=6)).strftime('%Y-%m-%d')),
+                mau=sketches.count((self.now - timedelta(days=29)).strftime('%Y-%m-%d')),
+                user_query_counts=user_query_counts,
+                response_time_total=self.response_time_total,
+                response_time_count=self.response_time_count,
+                hour_counts=hour_counts,
+                daily_counts=self.daily_counts,
+                response_time_stats=quantile_stats(self.response_sketch, digits=0),
+                total_users=sketches.count(),
+                distinct_counting={
+                    "mode": "hll",
+                    "standardError": round(sketches.window().relative_error, 4),
+                    "topUsersExact": self.top_users_exact
+                }
+            )
+
+        return build_adoption_metrics(
+            total_queries=self.total_queries,
+            wau=int(np.count_nonzero(self.wau_seen)),
+            mau=int(np.count_nonzero(self.mau_seen)),
+            user_query_counts=user_query_counts,
+            response_time_total=self.response_time_total,
+            response_time_count=self.response_time_count,
+            hour_counts=hour_counts,
+            daily_counts=self.daily_counts,
+            response_time_stats=quantile_stats(self.response_sketch, digits=0)
+        )
+
+
+def build_adoption_metrics(total_queries, wau, mau, user_query_counts, response_time_total,
+                           response_time_count, hour_counts, daily_counts, response_time_stats=None,
+                           total_users=None, distinct_counting=None):
+    """
+    Shape adoption aggregates into the adoption.json dict. Shared by every
+    adoption engine so they produce identical output. user_query_counts and
+    hour_counts must iterate in first-seen order (newest query first), which
+    is how ties between equal counts are broken. response_time_stats holds the
+    response-time quantiles (pipeline.quantiles). total_users defaults to the
+    number of users in user_query_counts; distinct_counting, when given, is
+    recorded in the metadata.
+    """
+    if not total_queries:
+        return {
+            "wau": 0, "mau": 0, "stickiness": 0, "totalQueries": 0,
+            "queriesPerUser": 0, "avgResponseTimeMs": 0,
+            "peakHour": 0, "queryTrend": [], "topUsers": [], "totalUsers": 0
+        }
+
+    if total_users is None:
+        total_users = len(user_query_counts)
+
+    top_users = []
+    for user_id, count in sorted(user_query_counts.items(), key=lambda x: -x[1])[:10]:
+        display_name = user_id[:8] + "..." if len(str(user_id)) > 8 else str(user_id)
+        top_users.append({"user": display_name, "queries": count})
+
+    return {
+        "wau": wau,
+        "mau": mau,
+        "stickiness": round((wau / mau * 100), 1) if mau > 0 else 0,
+        "totalQueries": total_queries,
+        "totalUsers": total_users,
+        "queriesPerUser": round(total_queries / total_users, 1) if total_users > 0 else 0,
+        "avgResponseTimeMs": round(response_time_total / response_time_count, 0) if response_time_count else 0,
+        "responseTimeStats": response_time_stats or {},
+        "peakHour": max(hour_counts, key=hour_counts.get) if hour_counts else 0,
+        "queryTrend": [{"date": d, "count": c} for d, c in sorted(daily_counts.items())],
+        "topUsers": top_users,
+        "metadata": {
+            "generatedAt": datetime.now().isoformat(),
+            "dataSource": "production",
+            **({"distinctUsers": distinct_counting} if distinct_counting else {})
+        }
+    }
+
+
+# =============================================================================
+# FEEDBACK
+# =============================================================================
+
+class FeedbackAccumulator:
+    """
+    Accumulates feedback metrics. Documents must already carry their category
+    if categorization is wanted. Items are kept in a heap ordered by the
+    'timestamp' field; with items_limit only the newest that many are kept.
+    spools may map "feedbackItems" to a ListSpool fed every item, as in
+    RewriterAccumulator.
+    """
+
+    # Top-level document fields add() and the categorizer read
+    FIELDS = ("id", "_ts", "feedbackType", "timestamp", "userName", "comment", "category",
+              "conversationId")
+
+    def __init__(self, categorized=True, items_limit=None, now=None, spools=None):
+        self.categorized = categorized
+        self.items_limit = items_limit
+        self.spools = spools or {}
+        self.month_ago = (now or datetime.now()) - timedelta(days=30)
+        self.total = 0
+        self.thumbs_up = 0
+        self.thumbs_down = 0
+        self.daily_feedback = {}
+        self.category_counts = {}
+        self.items_heap = []
+
+    def add(self, f):
+        self.total += 1
+        feedback_type = f.get('feedbackType')
+        if feedback_type == 'thumbsUp':
+            self.thumbs_up += 1
+        elif feedback_type == 'thumbsDown':
+            self.thumbs_down += 1
+
+        ts = f.get('_ts', 0)
+        if ts:
+            feedback_time = datetime.fromtimestamp(ts)
+            if feedback_time >= self.month_ago:
+                day_key = feedback_time.strftime('%Y-%m-%d')
+                day = self.daily_feedback.setdefault(day_key, {"positive": 0, "negative": 0})
+                if feedback_type == 'thumbsUp':
+                    day['positive'] += 1
+                else:
+                    day['negative'] += 1
+
+        category = f.get('category', 'Uncategorized')
+        self.category_counts[category] = self.category_counts.get(category, 0) + 1
+
+        item = {
+            "id": f.get('id', '')[:12],
+            "timestamp": f.get('timestamp', ''),
+            "userName": f.get('userName', 'Anonymous'),
+            "feedbackType": f.get('feedbackType', 'unknown'),
+            "comment": f.get('comment', ''),
+            "category": f.get('category', 'Uncategorized'),
+            "conversationId": f.get('conversationId', '')[:12]
+        }
+        spool = self.spools.get("feedbackItems")
+        if spool is not None:
+            spool.append(item["timestamp"], -self.total, item)
+        _push_newest(self.items_heap, (item["timestamp"], -self.total, item), self.items_limit)
+
+    def add_page(self, docs):
+        for f in docs:
+            self.add(f)
+        for spool in self.spools.values():
+            spool.flush()
+
+    def merge(self, other):
+        """Fold in an accumulator (same clock) fed the documents after this one's."""
+        if other.month_ago != self.month_ago:
+            raise ValueError("Cannot merge feedback accumulators with different clocks")
+        if self.spools or other.spools:
+            raise ValueError("Cannot merge accumulators that spool their lists")
+        _merge_newest(self.items_heap, other.items_heap, self.total, self.items_limit)
+        self.total += other.total
+        self.thumbs_up += other.thumbs_up
+        self.thumbs_down += other.thumbs_down
+        for day_key, day in other.daily_feedback.items():
+            mine = self.daily_feedback.setdefault(day_key, {"positive": 0, "negative": 0})
+            mine["positive"] += day["positive"]
+            mine["negative"] += day["negative"]
+        for category, count in other.category_counts.items():
+            self.category_counts[category] = self.category_counts.get(category, 0) + count
+        return self
+
+    def to_state(self) -> dict:
+        """JSON-serializable state for a resume checkpoint; see from_state."""
+        return {
+            "categorized": self.categorized,
+            "items_limit": self.items_limit,
+            "spools": _spools_state(self.spools),
+            "month_ago": self.month_ago.isoformat(),
+            "total": self.total,
+            "thumbs_up": self.thumbs_up,
+            "thumbs_down": self.thumbs_down,
+            "daily_feedback": self.daily_feedback,
+            "category_counts": list(self.category_counts.items()),
+            "items_heap": self.items_heap,
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        accumulator = cls(state["categorized"], state["items_limit"], spools=_spools_from_state(state["spools"]))
+        accumulator.month_ago = datetime.fromisoformat(state["month_ago"])
+        accumulator.total = state["total"]
+        accumulator.thumbs_up = state["thumbs_up"]
+        accumulator.thumbs_down = state["thumbs_down"]
+        accumulator.daily_feedback = state["daily_feedback"]
+        accumulator.category_counts = dict(state["category_counts"])
+        accumulator.items_heap = _heap_from_state(state["items_heap"])
+        return accumulator
+
+    def finalize(self):
+        total = self.total
+        if not total:
+            return {"error": "No feedback data"}
+
+        feedback_items = _newest_first(self.items_heap)
+
+        return {
+            "summary": {
+                "total": total,
+                "thumbsUp": self.thumbs_up,
+                "thumbsDown": self.thumbs_down,
+                "positiveRate": round(self.thumbs_up / total * 100, 1)
+            },
+            "trend": [
+                {"date": d, "positive": v['positive'], "negative": v['negative']}
+                for d, v in sorted(self.daily_feedback.items())
+            ],
+            "categoryBreakdown": [{"category": k, "count": v} for k, v in sorted(self.category_counts.items(), key=lambda x: -x[1])],
+            "feedbackItems": feedback_items,
+            "metadata": {
+                "generatedAt": datetime.now().isoformat(),
+                "dataSource": "production",
+                "aiCategorized": self.categorized
+            }
+        }
@@ -0,0 +1,296 @@
+"""
+Dashboard artifacts: minified summaries plus paginated list shards.
+
+A dashboard JSON is written as a minified summary that the pages import
+eagerly. The long lists in it (see SHARDED_LISTS) are moved out into pages of
+page_size items, and the summary carries a "shards" manifest in their place:
+per list the total, page size and count, a path template ({page} is the
+four-digit page number) and facet counts, so a page can show totals and
+filter counts before loading any items, and the summary's size does not
+depend on how long the lists are. Shard files also get a .gz sibling, and a
+.br one when the brotli package is installed, for static hosts that serve
+precompressed files.
+
+    src/data.json                                      summary, bundled by Vite
+    public/shards/data/manifest.json                   the manifest on its own
+    public/shards/data/zeroResultQueries-0000.json     first page (+ .gz, .br)
+
+Shards are written before the summary that points at them, and pages a
+smaller list no longer needs are removed afterwards.
+
+Every file goes through write_if_changed: the new content is written to a
+temp file and renamed over the old one only if its content hash differs.
+The hash leaves out VOLATILE_FIELDS such as metadata.generatedAt, so a rerun
+over unchanged data leaves every file (and its mtime) alone and does not
+trigger a rebuild and redeploy of the dashboard.
+"""
+import os
+import re
+import json
+import gzip
+import hashlib
+
+# Lists moved into shards -> fields counted per value for the manifest facets
+SHARDED_LISTS = {
+    "rewrittenQueries": (),
+    "zeroResultQueries": ("wasRewritten",),
+    "feedbackItems": ("feedbackType", "category"),
+}
+
+DEFAULT_PAGE_SIZE = int(os.getenv("DASHBOARD_SHARD_PAGE_SIZE", "200"))
+
+# Shard paths in the manifest are relative to the site root (Vite's public/)
+SHARD_URL_PREFIX = "shards"
+
+# Fields that differ on every run even when the data does not; not hashed
+VOLATILE_FIELDS = frozenset({"generatedAt"})
+
+_SHARD_FILE = re.compile(r"^(?P<list>\w+)-\d{4,}\.json(?:\.gz|\.br)?$")
+
+
+def _compressors() -> dict:
+    """Sibling suffix -> compress(bytes); brotli only when installed."""
+    compressors = {".gz": lambda data: gzip.compress(data, compresslevel=9, mtime=0)}
+    try:
+        import brotli
+    except ImportError:
+        return compressors
+    compressors[".br"] = lambda data: brotli.compress(data, quality=11)
+    return compressors
+
+
+def dumps(data) -> bytes:
+    """Minified UTF-8 JSON."""
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def _without_volatile(data):
+    if isinstance(data, dict):
+        return {key: _without_volatile(value) for key, value in data.items() if key not in VOLATILE_FIELDS}
+    if isinstance(data, list):
+        return [_without_volatile(value) for value in data]
+    return data
+
+
+def content_hash(data) -> str:
+    """SHA-256 of the minified JSON of `data` without its VOLATILE_FIELDS."""
+    return hashlib.sha256(dumps(_without_volatile(data))).hexdigest()
+
+
+def _file_hash(path):
+    """content_hash of a JSON file, or None if it is missing or unreadable."""
+    try:
+        with open(path, 'rb') as f:
+            return content_hash(json.loads(f.read()))
+    except (OSError, ValueError):
+        return None
+
+
+def _write_temp(path, payload) -> str:
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    return tmp_path
+
+
+def write_if_changed(path, data, compressors=None) -> bool:
+    """
+    Write `data` as minified JSON to path, plus a precompressed sibling per
+    entry of `compressors`, unless path already holds the same content
+    (VOLATILE_FIELDS aside). The file is only ever replaced by an atomic
+    rename, so readers and a crash never see half of it. Returns whether
+    anything was written.
+    """
+    compressors = compressors or {}
+    payload = dumps(data)
+    tmp_path = _write_temp(path, payload)
+    if _file_hash(path) == content_hash(data):
+        os.remove(tmp_path)
+        # A compressor installed since the last run still gets its sibling
+        missing = {suffix: compress for suffix, compress in compressors.items()
+                   if not os.path.exists(path + suffix)}
+        if not missing:
+            return False
+        with open(path, 'rb') as f:
+            payload = f.read()
+        compressors = missing
+    else:
+        os.replace(tmp_path, path)
+    for suffix, compress in compressors.items():
+        os.replace(_write_temp(path + suffix, compress(payload)), path + suffix)
+    return True
+
+
+def default_shard_dir(src_dir) -> str:
+    """public/shards next to a Vite src/ directory, otherwise a shards/ subdirectory."""
+    src_dir = os.path.abspath(src_dir)
+    if os.path.basename(src_dir) == 'src':
+        return os.path.join(os.path.dirname(src_dir), 'public', SHARD_URL_PREFIX)
+    return os.path.join(src_dir, SHARD_URL_PREFIX)
+
+
+def facet_counts(items, fields, facets=None) -> dict:
+    """
+    {field: {value: count}}; non-string values are keyed by their JSON text
+    (true, 3). Pass the facets of earlier items to keep counting into them.
+    """
+    facets = facets if facets is not None else {field: {} for field in fields}
+    for item in items:
+        for field in fields:
+            value = item.get(field)
+            key = value if isinstance(value, str) else json.dumps(value)
+            facets[field][key] = facets[field].get(key, 0) + 1
+    return facets
+
+
+def _paginate(items, page_size):
+    """Yield (page number, items) for any iterable, holding one page at a time."""
+    page = []
+    number = 0
+    for item in items:
+        page.append(item)
+        if len(page) == page_size:
+            yield number, page
+            number += 1
+            page = []
+    if page:
+        yield number, page
+
+
+def write_artifact(src_dir, filename, metrics, shard_dir=None, page_size=DEFAULT_PAGE_SIZE, spools=None) -> int:
+    """
+    Write `metrics` as src_dir/filename (minified summary) plus its shards
+    under shard_dir/<artifact>/. spools maps a list name to the ListSpool
+    holding the whole list when `metrics` only carries its newest items (a
+    streamed run); the list's shards are then paged from the spool. Returns
+    the number of files written or removed; 0 means the artifact was
+    already up to date.
+    """
+    artifact = os.path.splitext(filename)[0]
+    spools = spools or {}
+    summary = {key: value for key, value in metrics.items() if key not in SHARDED_LISTS}
+    lists = {name: spools[name].items() if name in spools else metrics[name]
+             for name in SHARDED_LISTS if name in spools or metrics.get(name) is not None}
+    changed = 0
+    pages = set()
+
+    if lists:
+        artifact_dir = os.path.join(shard_dir or default_shard_dir(src_dir), artifact)
+        os.makedirs(artifact_dir, exist_ok=True)
+        compressors = _compressors()
+        manifest = {}
+        for name, items in lists.items():
+            fields = SHARDED_LISTS[name]
+            facets = facet_counts((), fields)
+            total = page_count = 0
+            for number, page in _paginate(items, page_size):
+                page_name = f"{name}-{number:04d}.json"
+                changed += write_if_changed(os.path.join(artifact_dir, page_name), page, compressors)
+                pages.add(page_name)
+                facet_counts(page, fields, facets)
+                total += len(page)
+                page_count += 1
+            manifest[name] = {
+                "total": total,
+                "pageSize": page_size,
+                "pageCount": page_count,
+                "path": f"{SHARD_URL_PREFIX}/{artifact}/{name}-{{page}}.json",
+                "facets": facets,
+            }
+        summary["shards"] = manifest
+        changed += write_if_changed(os.path.join(artifact_dir, "manifest.json"), manifest, compressors)
+
+    os.makedirs(src_dir, exist_ok=True)
+    changed += write_if_changed(os.path.join(src_dir, filename), summary)
+
+    if lists:
+        # Pages beyond the new end of a list, and siblings of an uninstalled compressor
+        keep = {page + suffix for page in pages for suffix in ("", *compressors)}
+        for existing in os.listdir(artifact_dir):
+            match = _SHARD_FILE.match(existing)
+            if match and match.group("list") in SHARDED_LISTS and existing not in keep:
+                os.remove(os.path.join(artifact_dir, existing))
+                changed += 1
+    return changed
+
+
+# =============================================================================
+# SPOOLED LISTS
+# =============================================================================
+
+class ListSpool:
+    """
+    Append-only JSONL file holding every entry of one dashboard list, for
+    streamed runs whose accumulators keep only the newest few items in
+    memory. An accumulator append()s (sort key, -sequence, item) entries as
+    in its heaps and flush()es them after each page. In a resume checkpoint
+    a spool is just its path and length (to_state); from_state cuts off
+    entries written after the checkpoint was taken.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self.size = 0
+        self.pending = []
+
+    def append(self, key, neg_seq, item):
+        self.pending.append((key, neg_seq, item))
+
+    def flush(self):
+        if not self.pending:
+            return
+        payload = b"".join(dumps(entry) + b"\n" for entry in self.pending)
+        # A new spool starts the file over
+        with open(self.path, 'ab' if self.size else 'wb') as f:
+            f.write(payload)
+        self.count += len(self.pending)
+        self.size += len(payload)
+        self.pending = []
+
+    def to_state(self) -> dict:
+        self.flush()
+        return {"path": self.path, "count": self.count, "size": self.size}
+
+    @classmethod
+    def from_state(cls, state):
+        if state["size"] and os.path.getsize(state["path"]) < state["size"]:
+            raise ValueError(f"List spool {state['path']} is shorter than its checkpoint")
+        spool = cls(state["path"])
+        spool.count, spool.size = state["count"], state["size"]
+        if spool.size:
+            with open(spool.path, 'r+b') as f:
+                f.truncate(spool.size)
+        return spool
+
+    def _entries(self):
+        if not self.size:
+            return
+        with open(self.path, 'rb') as f:
+            for line in f:
+                yield json.loads(line)
+
+    def _in_order(self) -> bool:
+        previous = None
+        for entry in self._entries():
+            if previous is not None and entry[:2] > previous:
+                return False
+            previous = entry[:2]
+        return True
+
+    def items(self):
+        """
+        The items newest first. An ordered stream appends them in that order
+        and they are read straight off the file; otherwise they are sorted in
+        memory once.
+        """
+        self.flush()
+        if self._in_order():
+            return (entry[2] for entry in self._entries())
+        return (entry[2] for entry in sorted(self._entries(), key=lambda e: e[:2], reverse=True))
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
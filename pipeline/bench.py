@@ -0,0 +1,197 @@
+"""
+Benchmarks for the metrics calculators over synthetic data of growing size.
+
+Each calculator runs on pipeline.synthetic documents at every size in a
+forked child process, so one run's memory never shows up in the next. A
+child records the best wall time of --repeat runs, the growth in peak RSS
+over the dataset already in memory, and, in a separate traced run,
+tracemalloc's peak and the net number of allocated blocks. Results are
+saved as JSON named after the current commit. Pass --compare with an
+earlier file to flag regressions.
+
+    python -m pipeline.bench --sizes 10000 100000 1000000
+    python -m pipeline.bench --compare .pipeline_state/bench_1a2b3c4.json
+"""
+import os
+import sys
+import gc
+import json
+import time
+import platform
+import resource
+import argparse
+import subprocess
+import tracemalloc
+import multiprocessing
+from datetime import datetime
+
+from pipeline.state import state_path
+from pipeline.synthetic import conversation_docs, feedback_docs
+
+DEFAULT_SIZES = (10000, 100000, 1000000)
+
+# A calculator whose time per row grows by more than this against --compare is a regression
+REGRESSION_RATIO = 1.2
+
+# Fixed clock so every run sees the same documents
+BENCH_NOW = datetime(2026, 1, 15, 12, 0, 0)
+
+
+def _calculators():
+    """name -> (dataset, fn(docs)). Imported lazily so --help stays fast."""
+    import transform_to_dashboard as pipeline
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'evaluation'))
+    from evaluation.cosmos_to_dashboard import transform_to_dashboard_format
+
+    return {
+        "calculate_rewriter_metrics": ("staging", pipeline.calculate_rewriter_metrics),
+        "calculate_adoption_metrics": ("prod", pipeline.calculate_adoption_metrics),
+        "calculate_feedback_metrics": ("feedback", lambda docs: pipeline.calculate_feedback_metrics(docs, categorize=False)),
+        "transform_to_dashboard_format": ("staging", transform_to_dashboard_format),
+    }
+
+
+def make_dataset(kind, rows, seed=0) -> list:
+    if kind == "feedback":
+        return list(feedback_docs(rows, seed=seed, now=BENCH_NOW))
+    return list(conversation_docs(rows, seed=seed, now=BENCH_NOW, staging=kind == "staging"))
+
+
+def _max_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def measure(fn, docs, repeat=3) -> dict:
+    """Time and memory of fn(docs); run inside a fresh process for a meaningful peak RSS."""
+    gc.collect()
+    rss_before = _max_rss_mb()
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(docs)
+        times.append(time.perf_counter() - start)
+    rss_after = _max_rss_mb()
+
+    gc.collect()
+    blocks_before = sys.getallocatedblocks()
+    tracemalloc.start()
+    result = fn(docs)
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    blocks = sys.getallocatedblocks() - blocks_before
+    del result
+
+    best = min(times)
+    return {
+        "wallSeconds": round(best, 4),
+        "usPerRow": round(best / len(docs) * 1e6, 3) if docs else 0,
+        "peakRssMb": round(rss_after, 1),
+        "rssGrowthMb": round(rss_after - rss_before, 1),
+        "allocPeakMb": round(traced_peak / (1024 * 1024), 2),
+        "netAllocatedBlocks": blocks,
+    }
+
+
+def _child(conn, fn, docs, repeat):
+    try:
+        conn.send(measure(fn, docs, repeat))
+    except Exception as e:
+        conn.send({"error": f"{type(e).__name__}: {e}"})
+    finally:
+        conn.close()
+
+
+def run_isolated(fn, docs, repeat=3) -> dict:
+    """measure() in a forked child (inheriting docs), or in-process where fork is unavailable."""
+    if "fork" not in multiprocessing.get_all_start_methods():
+        return measure(fn, docs, repeat)
+    context = multiprocessing.get_context("fork")
+    parent_conn, child_conn = context.Pipe(duplex=False)
+    process = context.Process(target=_child, args=(child_conn, fn, docs, repeat))
+    process.start()
+    child_conn.close()
+    result = parent_conn.recv()
+    process.join()
+    return result
+
+
+def current_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, names=None, repeat=3) -> dict:
+    calculators = _calculators()
+    names = names or list(calculators)
+    results = []
+
+    for rows in sizes:
+        datasets = {}
+        for name in names:
+            kind, fn = calculators[name]
+            if kind not in datasets:
+                datasets[kind] = make_dataset(kind, rows)
+            measured = run_isolated(fn, datasets[kind], repeat)
+            results.append({"calculator": name, "rows": rows, **measured})
+            if "error" in measured:
+                print(f"{name:<32} {rows:>9}  error: {measured['error']}")
+            else:
+                print(f"{name:<32} {rows:>9} {measured['wallSeconds']:>9.3f}s {measured['usPerRow']:>9.2f}us/row "
+                      f"{measured['rssGrowthMb']:>8.1f}MB rss {measured['allocPeakMb']:>8.1f}MB traced")
+        datasets.clear()
+        gc.collect()
+
+    return {
+        "commit": current_commit(),
+        "generatedAt": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def compare(current, baseline, ratio=REGRESSION_RATIO) -> list:
+    """Rows of (calculator, rows, baseline us/row, current us/row, change) for runs present in both."""
+    previous = {(r["calculator"], r["rows"]): r for r in baseline["results"] if "error" not in r}
+    rows = []
+    for r in current["results"]:
+        before = previous.get((r["calculator"], r["rows"]))
+        if before is None or "error" in r or not before["usPerRow"]:
+            continue
+        change = r["usPerRow"] / before["usPerRow"]
+        rows.append((r["calculator"], r["rows"], before["usPerRow"], r["usPerRow"], change, change > ratio))
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard metrics calculators.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="Dataset sizes in rows")
+    parser.add_argument("--only", nargs="+", help="Calculators to run (default: all)")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per calculator and size (best is kept)")
+    parser.add_argument("--out", help="Result file (default: .pipeline_state/bench_<commit>.json)")
+    parser.add_argument("--compare", help="Earlier result file to compare against")
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.sizes, args.only, args.repeat)
+    out = args.out or state_path(f"bench_{report['commit']}", ".json")
+    with open(out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved results to {out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = 0
+        print(f"\nvs {baseline.get('commit', args.compare)} (us/row)")
+        for name, rows, before, after, change, regressed in compare(report, baseline):
+            regressions += regressed
+            print(f"{name:<32} {rows:>9} {before:>9.2f} -> {after:>9.2f} ({change:.2f}x)"
+                  f"{'  REGRESSION' if regressed else ''}")
+        sys.exit(1 if regressions else 0)
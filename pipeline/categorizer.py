@@ -0,0 +1,311 @@
+import os
+import re
+import json
+
+from pipeline.llm_cache import normalize_text, prompt_version
+from pipeline.state import state_path
+from pipeline.instrumentation import record_llm_usage
+
+MAX_RECORDED_LABELS = int(os.getenv("CATEGORY_LABELS_MAX", "5000"))
+
+VALID_CATEGORIES = ['ServiceFabric', 'Capacity', 'Connectivity', 'Facilities', 'General Info', 'Out-of-Scope', 'Other']
+
+CATEGORY_RUBRIC = """Categories:
+- ServiceFabric: Questions about ServiceFabric/SF product
+- Capacity: Questions about power, space, MW, kW, availability
+- Connectivity: Questions about network, Metro Connect, NSPs, cloud
+- Facilities: Questions about specific sites, locations, data centers
+- General Info: General questions about Digital Realty
+- Out-of-Scope: Not related to data centers (HR, jokes, document creation)
+- Other: Doesn't fit above categories"""
+
+CATEGORY_PROMPT = """Categorize this data center chatbot query into ONE category:
+
+QUERY: {comment}
+
+""" + CATEGORY_RUBRIC + """
+
+Respond with ONLY the category name, nothing else."""
+
+CATEGORY_BATCH_PROMPT = """Categorize each data center chatbot query below into ONE category.
+
+""" + CATEGORY_RUBRIC + """
+
+QUERIES (JSON array; "i" is the query index):
+{queries}
+
+Respond with a JSON object only, in this exact format, with every index exactly once:
+{{"labels": [{{"i": 0, "category": "<category name>"}}]}}"""
+
+# Single and batched prompts share one rubric, so their labels share one cache
+# namespace; editing either template invalidates both.
+CATEGORY_PROMPT_VERSION = prompt_version(CATEGORY_PROMPT + CATEGORY_BATCH_PROMPT)
+
+
+def validate_category(category) -> str:
+    return category if category in VALID_CATEGORIES else 'Other'
+
+
+def build_batch_prompt(comments) -> str:
+    queries = json.dumps([{"i": i, "query": c} for i, c in enumerate(comments)], ensure_ascii=False)
+    return CATEGORY_BATCH_PROMPT.format(queries=queries)
+
+
+def parse_batch_labels(content, expected):
+    """
+    Parse a batched response into a list of `expected` categories.
+    Returns None when the response is malformed (bad JSON, missing or
+    duplicate indices); unknown category names become 'Other'.
+    """
+    try:
+        data = json.loads(content)
+    except (TypeError, ValueError):
+        return None
+
+    entries = data.get('labels') if isinstance(data, dict) else data
+    if not isinstance(entries, list):
+        return None
+
+    labels = [None] * expected
+    for entry in entries:
+        if not isinstance(entry, dict):
+            return None
+        i = entry.get('i')
+        if not isinstance(i, int) or not 0 <= i < expected or labels[i] is not None:
+            return None
+        labels[i] = validate_category(str(entry.get('category', '')).strip())
+
+    if any(label is None for label in labels):
+        return None
+    return labels
+
+
+def _categorize_one(client, deployment, comment):
+    try:
+        response = client.chat.completions.create(
+            model=deployment,
+            messages=[{"role": "user", "content": CATEGORY_PROMPT.format(comment=comment)}],
+            temperature=0,
+            max_tokens=20
+        )
+        record_llm_usage(response)
+        return validate_category(response.choices[0].message.content.strip())
+    except Exception as e:
+        print(f"Categorization error: {e}")
+        return None
+
+
+def _categorize_batch(client, deployment, comments):
+    """Labels for `comments`, or None for a malformed response; request errors propagate."""
+    response = client.chat.completions.create(
+        model=deployment,
+        messages=[{"role": "user", "content": build_batch_prompt(comments)}],
+        temperature=0,
+        max_tokens=20 + 16 * len(comments),
+        response_format={"type": "json_object"}
+    )
+    record_llm_usage(response)
+    return parse_batch_labels(response.choices[0].message.content, len(comments))
+
+
+def categorize_comments(client, deployment, comments, batch_size=20) -> list:
+    """
+    Categorize comments with one request per batch of `batch_size`. A batch
+    whose response is malformed is split in half and retried, down to single
+    comments, which use the original one-comment prompt. A batch whose
+    request fails (throttling, timeouts, connection errors, after the
+    client's own retries) is not split: more requests would only add to
+    the throttling. A comment whose request failed gets None rather than a
+    label, so callers neither cache nor learn from an outage.
+    """
+    labels = []
+    for start in range(0, len(comments), batch_size):
+        labels.extend(_categorize_split(client, deployment, comments[start:start + batch_size]))
+    return labels
+
+
+def _categorize_split(client, deployment, comments):
+    if len(comments) == 1:
+        return [_categorize_one(client, deployment, comments[0])]
+
+    try:
+        labels = _categorize_batch(client, deployment, comments)
+    except Exception as e:
+        print(f"Batch categorization error ({len(comments)} items): {e}")
+        return [None] * len(comments)
+    if labels is not None:
+        return labels
+
+    middle = len(comments) // 2
+    return (_categorize_split(client, deployment, comments[:middle]) +
+            _categorize_split(client, deployment, comments[middle:]))
+
+
+# =============================================================================
+# LOCAL FAST-PATH CLASSIFIER
+# =============================================================================
+
+# (pattern, weight) per category. Weight 2 marks an unambiguous signal (a
+# product name, a power figure); weight 1 is supporting evidence. Anything
+# shaped like a site code ("abc123", but also "gpt4", "utf8") is only
+# supporting evidence: real site codes count as strong signals through the
+# ontology entities KeywordClassifier is built with.
+KEYWORD_RULES = {
+    'ServiceFabric': [
+        (r'\bservice\s?fabric\b', 2), (r'\bsf\b', 1),
+    ],
+    'Capacity': [
+        (r'\b\d+(\.\d+)?\s?(mw|kw)\b', 2), (r'\b(mw|kw|megawatts?|kilowatts?)\b', 2),
+        (r'\bpower\b', 1), (r'\bcapacity\b', 1), (r'\bavailab(le|ility)\b', 1),
+        (r'\bspace\b', 1), (r'\b(cabinets?|racks?|cages?)\b', 1),
+    ],
+    'Connectivity': [
+        (r'\bmetro\s?connect\b', 2), (r'\bnsps?\b', 2), (r'\bcross[\s-]?connects?\b', 2),
+        (r'\bnetwork\b', 1), (r'\b(cloud|azure|aws|gcp|oracle cloud)\b', 1),
+        (r'\binterconnect(ion)?\b', 1), (r'\b(latency|bandwidth|carriers?)\b', 1),
+    ],
+    'Facilities': [
+        (r'\b[a-z]{3}\d{1,3}\b', 1),
+        (r'\bdata\s?cent(er|re)s?\b', 1), (r'\b(campus|site|sites|locations?|address)\b', 1),
+    ],
+    'Out-of-Scope': [
+        (r'\b(joke|poem|recipe|weather)\b', 2), (r'\b(pto|payroll|vacation|benefits|expense report)\b', 2),
+        (r'\bwrite (me )?(an? )?(email|essay|letter|cover letter)\b', 2),
+    ],
+}
+
+DEFAULT_FAST_PATH_THRESHOLD = 0.65
+
+
+class KeywordClassifier:
+    """
+    Deterministic pre-classifier for feedback comments.
+
+    Each category collects the weights of its matching rules; ontology
+    entities seen in rewriter telemetry are added as strong literal rules for
+    the category their own text points to. Confidence is
+    (best - runner_up) / (best + 1), so a single strong signal scores 0.67,
+    two score 0.8, and any conflicting evidence pulls the score down. Only
+    comments at or above the threshold are labelled locally.
+    """
+
+    def __init__(self, entities=None):
+        self._rules = {category: [(re.compile(pattern), weight) for pattern, weight in rules]
+                       for category, rules in KEYWORD_RULES.items()}
+        self.entity_categories = {}
+        for entity in entities or []:
+            category, confidence = self._score(str(entity).lower())
+            if category and confidence > 0:
+                self.entity_categories[str(entity).lower()] = category
+        self._entity_patterns = [(re.compile(r'(?<!\w)' + re.escape(entity) + r'(?!\w)'), category)
+                                 for entity, category in self.entity_categories.items()]
+
+    def _score(self, text, extra=None):
+        totals = dict(extra or {})
+        for category, rules in self._rules.items():
+            for pattern, weight in rules:
+                if pattern.search(text):
+                    totals[category] = totals.get(category, 0) + weight
+        if not totals:
+            return None, 0.0
+        ranked = sorted(totals.items(), key=lambda x: -x[1])
+        best, best_score = ranked[0]
+        runner_up = ranked[1][1] if len(ranked) > 1 else 0
+        return best, (best_score - runner_up) / (best_score + 1)
+
+    def classify(self, comment):
+        """Return (category, confidence); category is None when nothing matched."""
+        text = str(comment or '').lower()
+        entity_hits = {}
+        for pattern, category in self._entity_patterns:
+            if pattern.search(text):
+                entity_hits[category] = entity_hits.get(category, 0) + 2
+        return self._score(text, entity_hits)
+
+
+def collect_entity_vocabulary(docs) -> dict:
+    """Count matched_entities across rewriter telemetry documents."""
+    counts = {}
+    for doc in docs:
+        for entity in (doc.get('query_rewrite_telemetry') or {}).get('matched_entities', []):
+            counts[entity] = counts.get(entity, 0) + 1
+    return counts
+
+
+def save_entity_vocabulary(counts: dict):
+    """Write the vocabulary atomically; a concurrent reader sees the old file or the new one."""
+    path = state_path("entity_vocabulary", ".json")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(counts, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def load_entity_vocabulary() -> dict:
+    path = state_path("entity_vocabulary", ".json")
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def record_labels(pairs, limit=MAX_RECORDED_LABELS):
+    """
+    Record (comment, GPT category) pairs used to tune the fast-path threshold.
+    Labels are kept one per normalized comment (the latest wins) and only
+    for the `limit` most recently labelled comments; the file is rewritten
+    atomically.
+    """
+    labels = {}
+    for item in load_labels() + [{"comment": comment, "category": category} for comment, category in pairs]:
+        key = normalize_text(item['comment'], lower=True)
+        labels.pop(key, None)
+        labels[key] = item
+    path = state_path("category_labels", ".jsonl")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        for item in list(labels.values())[-limit:]:
+            f.write(json.dumps(item) + "\n")
+    os.replace(tmp_path, path)
+
+
+def load_labels() -> list:
+    path = state_path("category_labels", ".jsonl")
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def evaluate_classifier(classifier, labeled, thresholds=(0.3, 0.4, 0.5, 0.6, 0.67, 0.75, 0.8, 0.9)) -> list:
+    """
+    Precision/coverage of the fast path against GPT labels, per threshold.
+    Coverage is the share of comments labelled locally; precision is the share
+    of those that agree with GPT.
+    """
+    predictions = [(classifier.classify(item['comment']), item['category']) for item in labeled]
+    rows = []
+    for threshold in thresholds:
+        covered = [(category, label) for (category, confidence), label in predictions
+                   if category and confidence >= threshold]
+        correct = sum(1 for category, label in covered if category == label)
+        rows.append({
+            "threshold": threshold,
+            "covered": len(covered),
+            "coverage": round(len(covered) / len(labeled) * 100, 1) if labeled else 0,
+            "precision": round(correct / len(covered) * 100, 1) if covered else 0
+        })
+    return rows
+
+
+if __name__ == "__main__":
+    labeled = load_labels()
+    if not labeled:
+        print("No GPT labels recorded yet; run the pipeline with categorization first.")
+    else:
+        classifier = KeywordClassifier(load_entity_vocabulary())
+        print(f"Fast-path classifier vs {len(labeled)} GPT labels "
+              f"({len(classifier.entity_categories)} ontology entities)")
+        print(f"{'threshold':>10} {'coverage':>10} {'precision':>10} {'covered':>8}")
+        for row in evaluate_classifier(classifier, labeled):
+            print(f"{row['threshold']:>10} {row['coverage']:>9}% {row['precision']:>9}% {row['covered']:>8}")
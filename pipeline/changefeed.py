@@ -0,0 +1,262 @@
+"""
+Near-real-time dashboard metrics from the Cosmos DB change feed.
+
+A long-running loop reads the change feed of the staging conversation
+container (rewriter), the production conversation container (adoption) and
+the production feedback container. It keeps the fields each metric reads in
+a local document table and refreshes the day rollups (see pipeline.rollups)
+for just the days the changes touch. The dashboard JSONs are rewritten at
+most once per debounce interval. Continuation tokens are checkpointed only
+after the rollups and outputs are written, so a restart replays at most one
+interval of changes, and replaying a change is harmless.
+
+The change feed shows the latest version of inserted and updated documents;
+deletes are not seen, as with the incremental fetch.
+
+    python transform_to_dashboard.py --watch --debounce 60
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+
+from pipeline.state import state_path
+from pipeline.accumulators import RewriterAccumulator, FeedbackAccumulator
+from pipeline.rollups import RollupStore, day_of
+from pipeline.artifacts import write_artifact, DEFAULT_PAGE_SIZE
+
+# What each feed keeps of a changed document, and where its metrics go
+FEEDS = {
+    "rewriter": {
+        "fields": RewriterAccumulator.FIELDS,
+        "keep": lambda doc: 'query_rewrite_telemetry' in doc,
+        "output": "data.json",
+    },
+    "adoption": {
+        "fields": ("id", "_ts", "user_id", "user_name", "llm_telemetry"),
+        "keep": lambda doc: True,
+        "output": "adoption.json",
+    },
+    "feedback": {
+        "fields": FeedbackAccumulator.FIELDS,
+        "keep": lambda doc: True,
+        "output": "feedback.json",
+    },
+}
+
+DOCUMENTS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    source TEXT, id TEXT, day TEXT, ts INTEGER, seq INTEGER, doc TEXT,
+    PRIMARY KEY (source, id)
+);
+CREATE INDEX IF NOT EXISTS documents_by_day ON documents (source, day);
+"""
+
+
+# =============================================================================
+# SOURCES
+# =============================================================================
+# A source's poll(continuation) returns (documents changed since the
+# continuation, new continuation); None starts from the beginning.
+
+class CosmosChangeFeedSource:
+    """Change feed of one Cosmos container."""
+
+    def __init__(self, container, page_size=1000):
+        self.container = container
+        self.page_size = page_size
+
+    def poll(self, continuation=None):
+        if continuation:
+            pages = self.container.query_items_change_feed(continuation=continuation, max_item_count=self.page_size)
+        else:
+            pages = self.container.query_items_change_feed(is_start_from_beginning=True,
+                                                           max_item_count=self.page_size)
+        docs = list(pages)
+        # The continuation of a change feed query comes back as the etag
+        headers = self.container.client_connection.last_response_headers or {}
+        return docs, headers.get('etag') or continuation
+
+
+class FakeChangeFeedSource:
+    """In-memory change feed for tests: publish() documents, poll() them back."""
+
+    def __init__(self):
+        self.log = []
+        self.lock = threading.Lock()
+
+    def publish(self, docs):
+        with self.lock:
+            for doc in docs:
+                doc = dict(doc)
+                doc.setdefault('_ts', int(time.time()))
+                self.log.append(doc)
+
+    def poll(self, continuation=None):
+        with self.lock:
+            start = int(continuation or 0)
+            return self.log[start:], str(len(self.log))
+
+
+# =============================================================================
+# DOCUMENT TABLE
+# =============================================================================
+
+class DocumentTable:
+    """Latest projected version of every document seen on a feed, by day."""
+
+    def __init__(self, path=None):
+        self.path = path or state_path("changefeed", ".sqlite")
+        self.conn = sqlite3.connect(self.path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(DOCUMENTS_SCHEMA)
+        self.seq = self.conn.execute("SELECT COALESCE(MAX(seq), 0) FROM documents").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+
+    def upsert(self, source, docs):
+        rows = []
+        for doc in docs:
+            self.seq += 1
+            ts = doc.get('_ts', 0)
+            rows.append((source, doc['id'], day_of(ts), ts, self.seq, json.dumps(doc, separators=(',', ':'))))
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    def docs(self, source, days=None) -> list:
+        """Documents of `source` (only in `days` if given), newest first."""
+        if days is None:
+            rows = self.conn.execute(
+                "SELECT doc FROM documents WHERE source = ? ORDER BY ts DESC, seq DESC", (source,)
+            )
+            return [json.loads(doc) for (doc,) in rows]
+        docs = []
+        for day in days:
+            rows = self.conn.execute("SELECT ts, seq, doc FROM documents WHERE source = ? AND day = ?", (source, day))
+            docs.extend(rows)
+        docs.sort(key=lambda row: (row[0], row[1]), reverse=True)
+        return [json.loads(doc) for _, _, doc in docs]
+
+
+def project(doc, fields) -> dict:
+    return {field: doc[field] for field in fields if field in doc}
+
+
+# =============================================================================
+# DAEMON
+# =============================================================================
+
+def load_tokens(name="changefeed") -> dict:
+    path = state_path(name, ".tokens.json")
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_tokens(tokens, name="changefeed"):
+    path = state_path(name, ".tokens.json")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(tokens, f)
+    os.replace(tmp_path, path)
+
+
+class MetricsDaemon:
+    """
+    Polls each feed in `sources` ({"rewriter"|"adoption"|"feedback": source})
+    every poll_interval seconds and rewrites the outputs of feeds with pending
+    changes once the oldest pending change is debounce seconds old.
+    prepare maps a feed to a callable run on the documents being rolled up
+    (e.g. feedback categorization). Outputs are written with
+    pipeline.artifacts, shards going to shard_dir.
+    """
+
+    def __init__(self, sources, output_dir, debounce=60, poll_interval=5, prepare=None, name="changefeed",
+                 shard_dir=None, page_size=DEFAULT_PAGE_SIZE):
+        self.sources = sources
+        self.output_dir = output_dir
+        self.shard_dir = shard_dir
+        self.page_size = page_size
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.prepare = prepare or {}
+        self.name = name
+        self.documents = DocumentTable(state_path(name, ".sqlite"))
+        self.rollups = RollupStore(state_path(name + "_rollups", ".sqlite"))
+        self.tokens = load_tokens(name)
+        self.pending = {feed: {} for feed in sources}
+        self.pending_since = None
+
+    def close(self):
+        self.documents.close()
+        self.rollups.close()
+
+    def poll(self) -> int:
+        """Read every feed once; returns the number of changed documents kept."""
+        changed = 0
+        for feed, source in self.sources.items():
+            docs, self.tokens[feed] = source.poll(self.tokens.get(feed))
+            spec = FEEDS[feed]
+            docs = [project(doc, spec["fields"]) for doc in docs if doc.get('id') is not None and spec["keep"](doc)]
+            if not docs:
+                continue
+            self.documents.upsert(feed, docs)
+            for doc in docs:
+                self.pending[feed][doc['id']] = doc
+            changed += len(docs)
+        if changed and self.pending_since is None:
+            self.pending_since = time.monotonic()
+        return changed
+
+    def due(self) -> bool:
+        return self.pending_since is not None and time.monotonic() - self.pending_since >= self.debounce
+
+    def flush(self):
+        """Refresh the rollups of feeds with pending changes, rewrite their outputs, checkpoint."""
+        for feed, pending in self.pending.items():
+            if not pending:
+                continue
+            delta = list(pending.values())
+            if self.rollups.is_current(feed):
+                docs = self.documents.docs(feed, self.rollups.changed_days(feed, delta))
+            else:
+                docs = self.documents.docs(feed)
+            rebuilt = self.rollups.refresh(feed, docs, delta=delta, prepare=self.prepare.get(feed))
+
+            metrics = {
+                "rewriter": self.rollups.rewriter_metrics,
+                "adoption": self.rollups.adoption_metrics,
+                "feedback": lambda: self.rollups.feedback_metrics(categorized=feed in self.prepare),
+            }[feed]()
+            output_path = os.path.join(self.output_dir, FEEDS[feed]["output"])
+            changed = write_artifact(self.output_dir, FEEDS[feed]["output"], metrics, self.shard_dir, self.page_size)
+            print(f"✓ {feed}: {len(delta)} changed documents, {rebuilt} days rebuilt -> {output_path}"
+                  f"{'' if changed else ' (unchanged)'}")
+            pending.clear()
+
+        save_tokens(self.tokens, self.name)
+        self.pending_since = None
+
+    def run(self, stop=None, max_polls=None):
+        """
+        Poll until `stop` (a threading.Event) is set, max_polls is reached or
+        Ctrl+C, then flush whatever is still pending.
+        """
+        stop = stop or threading.Event()
+        polls = 0
+        try:
+            while not stop.is_set():
+                self.poll()
+                polls += 1
+                if self.due():
+                    self.flush()
+                if max_polls is not None and polls >= max_polls:
+                    break
+                stop.wait(self.poll_interval)
+        except KeyboardInterrupt:
+            print("\nStopping")
+        if self.pending_since is not None:
+            self.flush()
@@ -0,0 +1,71 @@
+import os
+import threading
+
+# Connection-pool and retry settings shared by every Cosmos client the
+# pipeline creates. Override any of them through the environment.
+POOL_CONNECTIONS = int(os.getenv("COSMOS_POOL_CONNECTIONS", "4"))
+POOL_MAXSIZE = int(os.getenv("COSMOS_POOL_MAXSIZE", "32"))
+CONNECTION_TIMEOUT = int(os.getenv("COSMOS_CONNECTION_TIMEOUT", "30"))
+RETRY_TOTAL = int(os.getenv("COSMOS_RETRY_TOTAL", "9"))
+RETRY_BACKOFF_MAX = int(os.getenv("COSMOS_RETRY_BACKOFF_MAX", "30"))
+# Writes only need the status code, not the document echoed back; a call
+# that needs the stored document passes no_response=False
+NO_RESPONSE_ON_WRITE = True
+
+_clients = {}
+_containers = {}
+_lock = threading.Lock()
+
+
+def _pooled_transport():
+    """A requests transport whose session keeps up to POOL_MAXSIZE keep-alive connections per host."""
+    import requests
+    from requests.adapters import HTTPAdapter
+    from azure.core.pipeline.transport import RequestsTransport
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return RequestsTransport(session=session, session_owner=False)
+
+
+def get_cosmos_client(endpoint: str, key: str):
+    """
+    Return the shared CosmosClient for an account endpoint, creating it once.
+
+    Reusing one client per account keeps a single connection pool and a
+    single copy of the account/collection metadata caches, so repeated
+    connects don't pay for new TLS handshakes or metadata lookups.
+    """
+    from azure.cosmos import CosmosClient
+
+    if not endpoint:
+        raise ValueError("Cosmos endpoint is not configured")
+
+    with _lock:
+        client = _clients.get(endpoint)
+        if client is None:
+            client = CosmosClient(
+                endpoint,
+                credential=key,
+                transport=_pooled_transport(),
+                connection_timeout=CONNECTION_TIMEOUT,
+                retry_total=RETRY_TOTAL,
+                retry_backoff_max=RETRY_BACKOFF_MAX,
+                no_response_on_write=NO_RESPONSE_ON_WRITE
+            )
+            _clients[endpoint] = client
+        return client
+
+
+def get_container(endpoint: str, key: str, database: str, container: str):
+    """Return a cached container client on the shared client for `endpoint`."""
+    cache_key = (endpoint, database, container)
+    client = get_cosmos_client(endpoint, key)
+    with _lock:
+        proxy = _containers.get(cache_key)
+        if proxy is None:
+            proxy = client.get_database_client(database).get_container_client(container)
+            _containers[cache_key] = proxy
+        return proxy
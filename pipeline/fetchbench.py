@@ -0,0 +1,95 @@
+"""
+Request charge and latency of the fetch queries with and without ORDER BY.
+
+Each dashboard fetch query runs against its container ordered (ORDER BY
+c._ts DESC, as the pipeline has always issued it) and unordered (--unordered),
+through one cross-partition iterator and, with --parallelism, through the
+feed-range reader as well. Every variant runs --repeat times; the fastest run
+is kept with its request charge and page count, plus the time a client-side
+sort of the unordered results takes, the cost the unordered mode moves to
+the client. Results are saved as JSON named after the current commit.
+
+    python -m pipeline.fetchbench --repeat 3 --parallelism 8
+    python -m pipeline.fetchbench --replay fixtures/
+"""
+import os
+import json
+import time
+import argparse
+from datetime import datetime
+
+from pipeline.state import state_path
+from pipeline.feedranges import query_all
+from pipeline.bench import current_commit
+from pipeline.instrumentation import step
+
+
+def _queries():
+    """name -> (connect(), query_builder(ordered)). Imported lazily so --help stays fast."""
+    import transform_to_dashboard as pipeline
+    return {
+        "rewriter": (pipeline.connect_to_cosmos_staging, lambda ordered: pipeline.rewriter_query(ordered=ordered)),
+        "adoption": (pipeline.connect_to_cosmos_prod, lambda ordered: pipeline.adoption_query(ordered=ordered)),
+        "feedback": (pipeline.connect_to_cosmos_prod_feedback,
+                     lambda ordered: pipeline.feedback_query(ordered=ordered)),
+    }
+
+
+def measure(container, query, parameters, parallelism, ordered, repeat) -> dict:
+    best = None
+    for _ in range(repeat):
+        with step("fetchbench") as record:
+            start = time.perf_counter()
+            results = query_all(container, query, parameters, parallelism, newest_first=ordered)
+            wall = time.perf_counter() - start
+        if best is None or wall < best["wallSeconds"]:
+            best = {"wallSeconds": round(wall, 3), "documents": len(results),
+                    "requestCharge": round(record.counters["request_charge"], 2),
+                    "pages": record.counters["pages"]}
+            if not ordered:
+                start = time.perf_counter()
+                sorted(results, key=lambda doc: doc.get('_ts', 0), reverse=True)
+                best["clientSortSeconds"] = round(time.perf_counter() - start, 3)
+    return best
+
+
+def run(names=None, parallelism=1, repeat=3) -> dict:
+    queries = _queries()
+    results = []
+    for name in names or list(queries):
+        connect, build = queries[name]
+        container = connect()
+        for reader in sorted({1, parallelism}):
+            for ordered in (True, False):
+                query, parameters = build(ordered)
+                measured = measure(container, query, parameters, reader, ordered, repeat)
+                results.append({"query": name, "ordered": ordered, "parallelism": reader, **measured})
+                print(f"{name:<10} {'ordered' if ordered else 'unordered':<10} x{reader:<3} "
+                      f"{measured['wallSeconds']:>9.3f}s {measured['requestCharge']:>12.1f} RU "
+                      f"{measured['pages']:>6} pages {measured['documents']:>10} docs")
+    return {
+        "commit": current_commit(),
+        "generatedAt": datetime.now().isoformat(),
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare RU and latency of ordered and unordered fetches.")
+    parser.add_argument("--only", nargs="+", choices=["rewriter", "adoption", "feedback"],
+                        help="Queries to run (default: all)")
+    parser.add_argument("--parallelism", type=int, default=1,
+                        help="Also measure feed-range reads with this many concurrent queries")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per variant (fastest is kept)")
+    parser.add_argument("--replay", metavar="DIR", help="Read a pipeline.synthetic fixture instead of Cosmos")
+    parser.add_argument("--out", help="Result file (default: .pipeline_state/fetchbench_<commit>.json)")
+    args = parser.parse_args()
+
+    if args.replay:
+        os.environ["PIPELINE_REPLAY_DIR"] = os.path.abspath(args.replay)
+    report = run(args.only, args.parallelism, args.repeat)
+    out = args.out or state_path(f"fetchbench_{report['commit']}", ".json")
+    with open(out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved results to {out}")
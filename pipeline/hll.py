@@ -0,0 +1,221 @@
+"""
+HyperLogLog sketches for approximate distinct-user counts.
+
+One sketch is kept per local day. Any window of whole days (7, 30, 90,
+rolling) is answered by merging that window's day sketches, and sketches
+from different runs or shards merge the same way, because re-adding a user
+never changes a sketch. With the default precision (p=14, 16 KiB per day)
+the relative standard error is 1.04 / sqrt(2**14), about 0.8%; roughly 95%
+of estimates fall within 1.6% of the true count.
+
+    python -m pipeline.hll --users 200000 --rows 2000000
+"""
+import os
+import sys
+import math
+import time
+import base64
+import hashlib
+import argparse
+
+import numpy as np
+
+from pipeline.state import state_path
+
+DEFAULT_PRECISION = 14
+
+
+def hash_user(user_id) -> int:
+    """Stable 64-bit hash of a user id (Python's hash() is salted per process)."""
+    return int.from_bytes(hashlib.blake2b(str(user_id).encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def _bit_length(values):
+    """Vectorized int.bit_length() for uint64 values."""
+    high = (values >> np.uint64(32)).astype(np.float64)
+    low = (values & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    # log2 is exact enough to floor correctly below 2**32
+    high_bits = np.where(high > 0, np.floor(np.log2(np.maximum(high, 1))) + 33, 0)
+    low_bits = np.where(low > 0, np.floor(np.log2(np.maximum(low, 1))) + 1, 0)
+    return np.where(high_bits > 0, high_bits, low_bits).astype(np.uint8)
+
+
+class HyperLogLog:
+    """A HyperLogLog sketch over 64-bit hashes with 2**p one-byte registers."""
+
+    def __init__(self, p=DEFAULT_PRECISION, registers=None):
+        self.p = p
+        self.m = 1 << p
+        self.registers = registers if registers is not None else np.zeros(self.m, dtype=np.uint8)
+
+    @property
+    def relative_error(self) -> float:
+        return 1.04 / math.sqrt(self.m)
+
+    def add(self, user_id):
+        self.add_hashes(np.array([hash_user(user_id)], dtype=np.uint64))
+
+    def add_hashes(self, hashes):
+        """Add an array of uint64 hashes."""
+        if not len(hashes):
+            return
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        index = (hashes >> np.uint64(64 - self.p)).astype(np.int64)
+        rest = (hashes << np.uint64(self.p)) | np.uint64(1 << (self.p - 1))
+        rank = (np.uint8(65) - _bit_length(rest)).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other):
+        """Fold another sketch of the same precision into this one."""
+        if other.p != self.p:
+            raise ValueError(f"Cannot merge HyperLogLog sketches of precision {self.p} and {other.p}")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def copy(self):
+        return HyperLogLog(self.p, self.registers.copy())
+
+    def count(self) -> int:
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / float(np.sum(np.ldexp(1.0, -self.registers.astype(np.int64))))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            # Small-range correction (linear counting)
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+
+# =============================================================================
+# PER-DAY SKETCHES
+# =============================================================================
+
+# Key of the sketch that days dropped by prune() fold into, in saved files
+EARLIER = "earlier"
+
+
+class DaySketches:
+    """
+    HyperLogLog sketches keyed by local day ('%Y-%m-%d'), plus one sketch of
+    every user seen on days already pruned, so all-time counts survive pruning.
+    """
+
+    def __init__(self, p=DEFAULT_PRECISION):
+        self.p = p
+        self.days = {}
+        self.earlier = HyperLogLog(p)
+
+    def add_hashes(self, day_key, hashes):
+        sketch = self.days.get(day_key)
+        if sketch is None:
+            sketch = self.days[day_key] = HyperLogLog(self.p)
+        sketch.add_hashes(hashes)
+
+    def merge(self, other):
+        for day_key, sketch in other.days.items():
+            if day_key in self.days:
+                self.days[day_key].merge(sketch)
+            else:
+                self.days[day_key] = sketch.copy()
+        self.earlier.merge(other.earlier)
+        return self
+
+    def window(self, start_day=None, end_day=None) -> HyperLogLog:
+        """Merged sketch of the days in [start_day, end_day] (None = unbounded)."""
+        merged = self.earlier.copy() if start_day is None else HyperLogLog(self.p)
+        for day_key, sketch in self.days.items():
+            if (start_day is None or day_key >= start_day) and (end_day is None or day_key <= end_day):
+                merged.merge(sketch)
+        return merged
+
+    def count(self, start_day=None, end_day=None) -> int:
+        return self.window(start_day, end_day).count()
+
+    def prune(self, keep_from_day):
+        """Fold day sketches older than keep_from_day into the earlier sketch."""
+        for day_key in [d for d in self.days if d < keep_from_day]:
+            self.earlier.merge(self.days.pop(day_key))
+
+    def to_state(self) -> dict:
+        """JSON-serializable state: base64 registers by day key, EARLIER for the pruned days."""
+        registers = {d: s.registers for d, s in self.days.items()}
+        registers[EARLIER] = self.earlier.registers
+        return {"p": self.p,
+                "registers": {key: base64.b64encode(r.tobytes()).decode("ascii") for key, r in registers.items()}}
+
+    @classmethod
+    def from_state(cls, state):
+        sketches = cls(state["p"])
+        for key, data in state["registers"].items():
+            sketch = HyperLogLog(sketches.p, np.frombuffer(base64.b64decode(data), dtype=np.uint8).copy())
+            if key == EARLIER:
+                sketches.earlier = sketch
+            else:
+                sketches.days[key] = sketch
+        return sketches
+
+
+def load_day_sketches(name: str, p=DEFAULT_PRECISION) -> DaySketches:
+    """Load persisted day sketches, or an empty set if none (or of another precision)."""
+    sketches = DaySketches(p)
+    path = state_path(name, ".hll.npz")
+    if not os.path.exists(path):
+        return sketches
+    with np.load(path) as data:
+        for day_key in data.files:
+            registers = data[day_key]
+            if len(registers) != 1 << p:
+                continue
+            if day_key == EARLIER:
+                sketches.earlier = HyperLogLog(p, registers.copy())
+            else:
+                sketches.days[day_key] = HyperLogLog(p, registers.copy())
+    return sketches
+
+
+def save_day_sketches(name: str, sketches: DaySketches):
+    path = state_path(name, ".hll.npz")
+    tmp_path = path + ".tmp.npz"
+    arrays = {d: s.registers for d, s in sketches.days.items()}
+    arrays[EARLIER] = sketches.earlier.registers
+    np.savez_compressed(tmp_path, **arrays)
+    os.replace(tmp_path, path)
+
+
+# =============================================================================
+# BENCHMARK
+# =============================================================================
+
+def bench(users, rows, p=DEFAULT_PRECISION, seed=7):
+    rng = np.random.default_rng(seed)
+    user_ids = [f"user{i}@example.com" for i in range(users)]
+    picks = rng.integers(0, users, rows)
+
+    start = time.perf_counter()
+    exact = set()
+    for i in picks.tolist():
+        exact.add(user_ids[i])
+    exact_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    hashes = np.fromiter((hash_user(u) for u in user_ids), dtype=np.uint64, count=users)
+    sketch = HyperLogLog(p)
+    sketch.add_hashes(hashes[picks])
+    estimate = sketch.count()
+    hll_time = time.perf_counter() - start
+
+    error = (estimate - len(exact)) / len(exact) * 100
+    print(f"{rows} rows, {len(exact)} distinct users")
+    exact_bytes = sys.getsizeof(exact) + sum(sys.getsizeof(u) for u in exact)
+    print(f"  exact: {len(exact):>9} in {exact_time:.3f}s, {exact_bytes} bytes")
+    print(f"  hll:   {estimate:>9} in {hll_time:.3f}s, {sketch.m} bytes "
+          f"(error {error:+.2f}%, standard error {sketch.relative_error * 100:.2f}%)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare exact and HyperLogLog distinct counts.")
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--precision", type=int, default=DEFAULT_PRECISION)
+    args = parser.parse_args()
+    bench(args.users, args.rows, args.precision)
@@ -0,0 +1,220 @@
+"""
+Per-step instrumentation for pipeline runs.
+
+Stages open nested steps with step("fetch") and so on. Code anywhere below
+them adds to the innermost open step with record(documents=..., ...), and
+every enclosing step receives the same increments, so a stage's figures
+include its sub-steps. The open step is tracked in a contextvar. Stage
+threads start their own root step, and work handed to an executor keeps its
+step when run under contextvars.copy_context().
+
+Cosmos request charges are collected by passing cosmos_hook() as the
+response_hook of a query or write. The SDK calls it once per page or write
+with the response headers.
+
+At the end of a run the report is written as JSON and, optionally, as an
+OpenMetrics text file.
+"""
+import os
+import json
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime
+
+COUNTERS = (
+    "documents",          # documents read from Cosmos
+    "pages",              # Cosmos query pages (server round trips)
+    "request_charge",     # Cosmos RUs, reads and writes
+    "writes",             # Cosmos document writes
+    "llm_calls",          # chat completion requests sent
+    "prompt_tokens",
+    "completion_tokens",
+    "cache_hits",         # LLM results served from pipeline.llm_cache
+    "retries",            # LLM requests retried after 429/timeout/5xx
+)
+
+_current = contextvars.ContextVar("pipeline_step", default=None)
+
+
+class StepRecord:
+    """Wall time and counters of one step."""
+
+    def __init__(self, name, parent=None):
+        self.name = f"{parent.name}/{name}" if parent else name
+        self.parent = parent
+        self.started = time.perf_counter()
+        self.wall_seconds = None
+        self.error = None
+        self.counters = dict.fromkeys(COUNTERS, 0)
+
+    def to_dict(self) -> dict:
+        data = {"name": self.name, "wallSeconds": round(self.wall_seconds or 0, 3)}
+        data.update({name: round(value, 2) if isinstance(value, float) else value
+                     for name, value in self.counters.items()})
+        if self.error:
+            data["error"] = self.error
+        return data
+
+
+class RunReport:
+    """Steps recorded during one pipeline run, in the order they finished."""
+
+    def __init__(self):
+        self.started_at = datetime.now()
+        self.started = time.perf_counter()
+        self.steps = []
+        self.lock = threading.Lock()
+
+    def add(self, record):
+        with self.lock:
+            self.steps.append(record)
+
+    def to_dict(self) -> dict:
+        """
+        Steps with the same name (e.g. one "score" per streamed page) are
+        merged: wall times and counters add up and "calls" counts them.
+        """
+        with self.lock:
+            steps = sorted(self.steps, key=lambda r: r.started)
+        merged = {}
+        totals = dict.fromkeys(COUNTERS, 0)
+        for r in steps:
+            data = r.to_dict()
+            if r.parent is None:
+                for name in COUNTERS:
+                    totals[name] += data[name]
+            previous = merged.get(r.name)
+            if previous is None:
+                merged[r.name] = dict(data, calls=1)
+                continue
+            previous["calls"] += 1
+            previous["wallSeconds"] = round(previous["wallSeconds"] + data["wallSeconds"], 3)
+            for name in COUNTERS:
+                previous[name] = round(previous[name] + data[name], 2)
+            if "error" in data:
+                previous["error"] = data["error"]
+        return {
+            "startedAt": self.started_at.isoformat(),
+            "wallSeconds": round(time.perf_counter() - self.started, 3),
+            "totals": {name: round(value, 2) for name, value in totals.items()},
+            "steps": list(merged.values()),
+        }
+
+
+_report = RunReport()
+
+
+def get_report() -> RunReport:
+    return _report
+
+
+def reset_report():
+    global _report
+    _report = RunReport()
+
+
+@contextmanager
+def step(name):
+    """Time a step nested in the currently open one and record it in the run report."""
+    record = StepRecord(name, _current.get())
+    token = _current.set(record)
+    try:
+        yield record
+    except Exception as e:
+        record.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        record.wall_seconds = time.perf_counter() - record.started
+        _current.reset(token)
+        _report.add(record)
+
+
+def record(**increments):
+    """Add to the counters of the open step and every step enclosing it."""
+    current = _current.get()
+    if current is None:
+        return
+    with _report.lock:
+        while current is not None:
+            for name, value in increments.items():
+                current.counters[name] += value
+            current = current.parent
+
+
+def cosmos_hook(write=False, items=1):
+    """
+    response_hook for a Cosmos query or write. Each call is one page (or
+    one write, or one transactional batch of `items` writes) and adds its
+    request charge to the open step.
+    """
+    def hook(headers, result=None):
+        charge = float((headers or {}).get('x-ms-request-charge', 0) or 0)
+        if write:
+            record(writes=items, request_charge=charge)
+        else:
+            record(pages=1, request_charge=charge)
+    return hook
+
+
+def record_llm_usage(response):
+    """Count one chat completion and its token usage."""
+    usage = getattr(response, 'usage', None)
+    record(llm_calls=1,
+           prompt_tokens=getattr(usage, 'prompt_tokens', 0) or 0,
+           completion_tokens=getattr(usage, 'completion_tokens', 0) or 0)
+
+
+# =============================================================================
+# OUTPUT
+# =============================================================================
+
+def _openmetrics_label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def openmetrics_text(report: dict) -> str:
+    """The report's steps as OpenMetrics text (one series per step and counter)."""
+    lines = ["# TYPE pipeline_step_wall_seconds gauge",
+             "# UNIT pipeline_step_wall_seconds seconds",
+             "# HELP pipeline_step_wall_seconds Wall time of a pipeline step."]
+    for s in report["steps"]:
+        lines.append(f'pipeline_step_wall_seconds{{step="{_openmetrics_label(s["name"])}"}} {s["wallSeconds"]}')
+    for name in COUNTERS:
+        metric = f"pipeline_step_{name}"
+        lines.append(f"# TYPE {metric} counter")
+        for s in report["steps"]:
+            lines.append(f'{metric}_total{{step="{_openmetrics_label(s["name"])}"}} {s[name]}')
+    lines.append("# TYPE pipeline_run_wall_seconds gauge")
+    lines.append("# UNIT pipeline_run_wall_seconds seconds")
+    lines.append(f"pipeline_run_wall_seconds {report['wallSeconds']}")
+    lines.append("# EOF")
+    return "\n".join(lines) + "\n"
+
+
+def write_report(path, openmetrics_path=None) -> dict:
+    """Write the run report as JSON (and OpenMetrics text if asked); returns the report dict."""
+    report = _report.to_dict()
+    for target, content in ((path, json.dumps(report, indent=2)),
+                            (openmetrics_path, openmetrics_text(report) if openmetrics_path else None)):
+        if not target:
+            continue
+        os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+        tmp_path = target + ".tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(content)
+        os.replace(tmp_path, target)
+    return report
+
+
+def summary_lines(report: dict) -> list:
+    """One console line per top-level step."""
+    lines = [f"{'step':<12} {'wall':>8} {'docs':>9} {'pages':>6} {'RU':>10} {'LLM':>6} {'tokens':>9} {'cached':>7}"]
+    for s in report["steps"]:
+        if "/" in s["name"]:
+            continue
+        lines.append(f"{s['name']:<12} {s['wallSeconds']:>7.2f}s {s['documents']:>9} {s['pages']:>6} "
+                     f"{s['request_charge']:>10.1f} {s['llm_calls']:>6} "
+                     f"{s['prompt_tokens'] + s['completion_tokens']:>9} {s['cache_hits']:>7}")
+    return lines
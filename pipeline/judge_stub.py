@@ -0,0 +1,161 @@
+"""
+Local stand-in for the Azure OpenAI chat completions endpoint, for
+benchmarking the scoring engine offline.
+
+    python -m pipeline.judge_stub --port 8089 --latency-ms 400 --rate-limit 0.05
+    AZURE_OPENAI_ENDPOINT=http://127.0.0.1:8089 AZURE_OPENAI_KEY=stub python transform_to_dashboard.py --replay DIR
+
+or run a self-contained benchmark against an in-process stub:
+
+    python -m pipeline.judge_stub --bench 500 --max-concurrency 16
+"""
+import os
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def _completion(content):
+    return {
+        "id": "chatcmpl-stub",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": "stub",
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop"
+        }],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+    }
+
+
+_STUB_KEYWORDS = [("mw", "Capacity"), ("power", "Capacity"), ("metro connect", "Connectivity"),
+                  ("service fabric", "ServiceFabric"), ("dfw", "Facilities")]
+
+
+def _stub_category(text):
+    text = text.lower()
+    return next((category for word, category in _STUB_KEYWORDS if word in text), "Other")
+
+
+def stub_reply(prompt: str, malformed=0.0) -> str:
+    """Deterministic reply for a judge, categorization or batched categorization prompt."""
+    if "RELEVANCE" in prompt:
+        seed = sum(map(ord, prompt)) % 3
+        return json.dumps({"relevance": 3 + seed % 3, "groundedness": 4, "completeness": 3 + (seed + 1) % 3,
+                           "reasoning": "stub"})
+    if '"labels"' in prompt:
+        if malformed and random.random() < malformed:
+            return '{"labels": [truncated'
+        queries = json.loads(prompt.split("QUERIES", 1)[1].split("\n", 1)[1].split("\n\nRespond", 1)[0])
+        return json.dumps({"labels": [{"i": q["i"], "category": _stub_category(q["query"])} for q in queries]})
+    return _stub_category(prompt.split("QUERY:", 1)[-1].split("\n", 1)[0])
+
+
+def make_handler(latency_ms=300, rate_limit=0.0, malformed=0.0):
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            if not self.path.split('?')[0].endswith('/chat/completions'):
+                self.send_error(404)
+                return
+
+            if rate_limit and random.random() < rate_limit:
+                self.send_response(429)
+                self.send_header('Retry-After', '0.2')
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(b'{"error": {"code": "429", "message": "Rate limit (stub)"}}')
+                return
+
+            time.sleep(latency_ms / 1000.0 * random.uniform(0.5, 1.5))
+            request = json.loads(body or b'{}')
+            prompt = request.get('messages', [{}])[-1].get('content', '')
+            payload = json.dumps(_completion(stub_reply(prompt, malformed))).encode()
+
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubHandler
+
+
+def serve(port=8089, latency_ms=300, rate_limit=0.0, malformed=0.0):
+    """Start the stub in a daemon thread and return the server."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(latency_ms, rate_limit, malformed))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def use_stub(server):
+    """
+    Point the Azure OpenAI clients at a running stub. Its answers are cached
+    under their own endpoint marker, apart from the live endpoint's.
+    """
+    os.environ["AZURE_OPENAI_ENDPOINT"] = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ["AZURE_OPENAI_KEY"] = "stub"
+    os.environ["LLM_CACHE_ENDPOINT"] = "judge-stub"
+
+
+class _NullContainer:
+    """Accepts writes and drops them, so benchmarks never touch Cosmos."""
+
+    def upsert_item(self, doc, **kwargs):
+        return doc
+
+
+def bench(count, max_concurrency, requests_per_minute, latency_ms, rate_limit):
+    from pipeline.scoring import ScoringEngine
+    import asyncio
+
+    server = serve(port=0, latency_ms=latency_ms, rate_limit=rate_limit)
+    use_stub(server)
+    # Every judge call should reach the stub, and nothing lands in the cache
+    os.environ["LLM_CACHE_DISABLED"] = "1"
+
+    docs = [{"id": str(i), "conversation": f"DFW10 availability {i}", "llm_response": "Yes.", "resultCount": 3}
+            for i in range(count)]
+    engine = ScoringEngine(_NullContainer(), max_concurrency=max_concurrency,
+                           requests_per_minute=requests_per_minute)
+
+    start = time.perf_counter()
+    scored = len(asyncio.run(engine.run(docs)))
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+
+    print(f"Scored {scored}/{count} docs in {elapsed:.2f}s "
+          f"({scored / elapsed:.1f} docs/s, concurrency={max_concurrency}, "
+          f"retries={engine.retry_count}, failed={engine.failed_count})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local Azure OpenAI stub for offline scoring benchmarks.")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="Probability of answering 429")
+    parser.add_argument("--malformed", type=float, default=0.0,
+                        help="Probability of a malformed batched categorization reply")
+    parser.add_argument("--bench", type=int, default=0, help="Score N fake docs against an in-process stub")
+    parser.add_argument("--max-concurrency", type=int, default=8)
+    parser.add_argument("--judge-rpm", type=int, default=6000)
+    args = parser.parse_args()
+
+    if args.bench:
+        bench(args.bench, args.max_concurrency, args.judge_rpm, args.latency_ms, args.rate_limit)
+    else:
+        server = serve(args.port, args.latency_ms, args.rate_limit, args.malformed)
+        print(f"Judge stub listening on http://127.0.0.1:{server.server_address[1]}")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            server.shutdown()
@@ -0,0 +1,131 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+from pipeline.state import state_path
+
+DEFAULT_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "50000"))
+
+
+def prompt_version(template: str) -> str:
+    """Short hash of a prompt template; editing the template changes it."""
+    return hashlib.sha256(template.encode("utf-8")).hexdigest()[:12]
+
+
+def cache_endpoint() -> str:
+    """
+    The endpoint results are cached under: LLM_CACHE_ENDPOINT (set by the
+    judge stub), else AZURE_OPENAI_ENDPOINT.
+    """
+    return os.getenv("LLM_CACHE_ENDPOINT") or os.getenv("AZURE_OPENAI_ENDPOINT") or ""
+
+
+def normalize_text(text, lower=False) -> str:
+    """Collapse whitespace (and optionally case) so trivially different inputs share a key."""
+    text = re.sub(r"\s+", " ", str(text or "")).strip()
+    return text.lower() if lower else text
+
+
+class LLMCache:
+    """
+    Persistent, content-addressed cache for LLM results.
+
+    Keys are a SHA-256 over the call kind, prompt template version, model
+    deployment, endpoint (see cache_endpoint) and the prompt inputs, so any
+    change to those produces a miss; stub answers never serve a live run.
+    Entries written under an older template version are purged the first time
+    a kind is used with a new version. The cache is bounded to max_entries;
+    the least recently used entries are evicted first.
+    """
+
+    def __init__(self, path=None, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path or state_path("llm_cache", ".sqlite")
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._checked_versions = set()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                prompt_version TEXT NOT NULL,
+                value TEXT NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+
+    @staticmethod
+    def make_key(kind, version, deployment, **inputs) -> str:
+        payload = json.dumps([kind, version, deployment, cache_endpoint(), inputs], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _purge_stale(self, kind, version):
+        if (kind, version) in self._checked_versions:
+            return
+        self._checked_versions.add((kind, version))
+        removed = self._conn.execute(
+            "DELETE FROM entries WHERE kind = ? AND prompt_version != ?", (kind, version)
+        ).rowcount
+        if removed:
+            print(f"LLM cache: dropped {removed} {kind} entries from an older prompt")
+
+    def get(self, kind, version, deployment, **inputs):
+        key = self.make_key(kind, version, deployment, **inputs)
+        with self._lock:
+            self._purge_stale(kind, version)
+            row = self._conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+            return json.loads(row[0])
+
+    def set(self, kind, version, deployment, value, **inputs):
+        key = self.make_key(kind, version, deployment, **inputs)
+        with self._lock:
+            self._purge_stale(kind, version)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, kind, prompt_version, value, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, kind, version, json.dumps(value), time.time())
+            )
+            self._writes += 1
+            # Counting rows is a table scan, so only check the bound periodically
+            if self._writes % 100 == 1:
+                self._evict()
+
+    def _evict(self):
+        count = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY last_used LIMIT ?)",
+                (overflow,)
+            )
+
+    def stats(self) -> str:
+        return f"{self.hits} hits, {self.misses} misses"
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Process-wide cache, or None when LLM_CACHE_DISABLED is set."""
+    global _cache
+    if os.getenv("LLM_CACHE_DISABLED"):
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMCache()
+        return _cache
@@ -0,0 +1,188 @@
+from datetime import datetime, timedelta
+
+from pipeline.accumulators import build_adoption_metrics
+from pipeline.quantiles import DDSketch, quantile_stats
+from pipeline.instrumentation import cosmos_hook
+
+# Adoption metrics computed inside Cosmos: only aggregate rows (one per user,
+# one per time bucket, one value per window) cross the wire instead of every
+# conversation document.
+#
+# The Python SDK refuses GROUP BY on cross-partition queries, so grouped
+# queries run once per feed range and the partial groups are merged here.
+# DISTINCT and SELECT VALUE aggregates are supported cross-partition and are
+# issued directly.
+
+# Same fallback chain as `doc.get('user_id') or doc.get('user_name') or 'anonymous'`
+USER_EXPR = (
+    '((IS_DEFINED(c.user_id) AND NOT IS_NULL(c.user_id) AND c.user_id != "") ? c.user_id : '
+    '((IS_DEFINED(c.user_name) AND NOT IS_NULL(c.user_name) AND c.user_name != "") ? c.user_name : "anonymous"))'
+)
+
+RESPONSE_TIME = "c.llm_telemetry.response_time_ms"
+
+
+def bucket_seconds(now=None) -> int:
+    """
+    Width of the _ts buckets that days and hours are derived from. Hourly
+    buckets line up with local hours only when the UTC offset is a whole
+    number of hours; otherwise fall back to 15 minutes.
+    """
+    offset = (now or datetime.now()).astimezone().utcoffset()
+    return 3600 if offset.total_seconds() % 3600 == 0 else 900
+
+
+def user_counts_query():
+    return f"""
+        SELECT {USER_EXPR} AS user, COUNT(1) AS queries, MAX(c._ts) AS lastTs
+        FROM c
+        WHERE c._ts > 0
+        GROUP BY {USER_EXPR}
+        """
+
+
+def bucket_counts_query(bucket, since=False):
+    since_filter = " AND c._ts >= @since_ts" if since else ""
+    return f"""
+        SELECT FLOOR(c._ts / {bucket}) AS bucket, COUNT(1) AS queries
+        FROM c
+        WHERE c._ts > 0{since_filter}
+        GROUP BY FLOOR(c._ts / {bucket})
+        """
+
+
+def distinct_users_query():
+    return f"SELECT DISTINCT VALUE {USER_EXPR} FROM c WHERE c._ts >= @since_ts"
+
+
+def response_time_queries():
+    """SUM, COUNT, MIN and MAX of positive response times."""
+    where = f"WHERE c._ts > 0 AND {RESPONSE_TIME} > 0"
+    return {
+        "SUM": f"SELECT VALUE SUM({RESPONSE_TIME}) FROM c {where}",
+        "COUNT": f"SELECT VALUE COUNT(1) FROM c {where}",
+        "MIN": f"SELECT VALUE MIN({RESPONSE_TIME}) FROM c {where}",
+        "MAX": f"SELECT VALUE MAX({RESPONSE_TIME}) FROM c {where}",
+    }
+
+
+def response_time_bins_query(log_gamma):
+    """DDSketch bin counts of positive response times (see pipeline.quantiles)."""
+    bin_expr = f"CEILING(LOG({RESPONSE_TIME}) / {log_gamma!r})"
+    return f"""
+        SELECT {bin_expr} AS bin, COUNT(1) AS queries
+        FROM c
+        WHERE c._ts > 0 AND {RESPONSE_TIME} > 0
+        GROUP BY {bin_expr}
+        """
+
+
+def grouped_rows(container, query, parameters=None):
+    """Run a GROUP BY query on every feed range and yield the partial groups."""
+    for feed_range in container.read_feed_ranges():
+        yield from container.query_items(query, parameters=parameters, feed_range=feed_range,
+                                         response_hook=cosmos_hook())
+
+
+def _value(container, query, parameters=None):
+    values = list(container.query_items(query, parameters=parameters, enable_cross_partition_query=True,
+                                        response_hook=cosmos_hook()))
+    return values[0] if values else None
+
+
+def _since(ts):
+    return [{"name": "@since_ts", "value": ts}]
+
+
+def fetch_adoption_aggregates(container, now=None):
+    """Run the aggregate queries and merge per-feed-range partials."""
+    now = now or datetime.now()
+    bucket = bucket_seconds(now)
+    week_ts = (now - timedelta(days=7)).timestamp()
+    month_ts = (now - timedelta(days=30)).timestamp()
+
+    users = {}
+    for row in grouped_rows(container, user_counts_query()):
+        queries, last_ts = users.get(row['user'], (0, 0))
+        users[row['user']] = (queries + row['queries'], max(last_ts, row['lastTs']))
+
+    buckets = {}
+    for row in grouped_rows(container, bucket_counts_query(bucket)):
+        key = int(row['bucket'])
+        buckets[key] = buckets.get(key, 0) + row['queries']
+
+    trend_buckets = {}
+    for row in grouped_rows(container, bucket_counts_query(bucket, since=True), _since(month_ts)):
+        key = int(row['bucket'])
+        trend_buckets[key] = trend_buckets.get(key, 0) + row['queries']
+
+    totals = {name: _value(container, query) for name, query in response_time_queries().items()}
+    response_sketch = DDSketch()
+    for row in grouped_rows(container, response_time_bins_query(response_sketch.log_gamma)):
+        key = int(row['bin'])
+        response_sketch.bins[key] = response_sketch.bins.get(key, 0) + row['queries']
+    response_sketch.count = totals["COUNT"] or 0
+    response_sketch.sum = totals["SUM"] or 0
+    response_sketch.min, response_sketch.max = totals["MIN"], totals["MAX"]
+
+    return {
+        "bucket": bucket,
+        "users": users,
+        "buckets": buckets,
+        "trend_buckets": trend_buckets,
+        "wau": len(set(container.query_items(distinct_users_query(), parameters=_since(week_ts),
+                                             enable_cross_partition_query=True, response_hook=cosmos_hook()))),
+        "mau": len(set(container.query_items(distinct_users_query(), parameters=_since(month_ts),
+                                             enable_cross_partition_query=True, response_hook=cosmos_hook()))),
+        "response_time_total": response_sketch.sum,
+        "response_time_count": response_sketch.count,
+        "response_sketch": response_sketch,
+    }
+
+
+def adoption_metrics_from_aggregates(aggregates):
+    """
+    Turn aggregate rows into the same dict AdoptionAccumulator.finalize()
+    builds. Users and hours are ordered by their newest query so ties break
+    the way the document-by-document path breaks them.
+    """
+    bucket = aggregates["bucket"]
+
+    users = sorted(aggregates["users"].items(), key=lambda x: -x[1][1])
+    user_query_counts = {user: queries for user, (queries, _) in users}
+
+    hour_counts = {}
+    for key in sorted(aggregates["buckets"], reverse=True):
+        hour = datetime.fromtimestamp(key * bucket).hour
+        hour_counts[hour] = hour_counts.get(hour, 0) + aggregates["buckets"][key]
+
+    daily_counts = {}
+    for key, count in aggregates["trend_buckets"].items():
+        day_key = datetime.fromtimestamp(key * bucket).strftime('%Y-%m-%d')
+        daily_counts[day_key] = daily_counts.get(day_key, 0) + count
+
+    return build_adoption_metrics(
+        total_queries=sum(aggregates["buckets"].values()),
+        wau=aggregates["wau"],
+        mau=aggregates["mau"],
+        user_query_counts=user_query_counts,
+        response_time_total=aggregates["response_time_total"],
+        response_time_count=aggregates["response_time_count"],
+        hour_counts=hour_counts,
+        daily_counts=daily_counts,
+        response_time_stats=quantile_stats(aggregates["response_sketch"], digits=0)
+    )
+
+
+def pushdown_adoption_metrics(container, now=None) -> dict:
+    """Adoption metrics computed from server-side aggregates."""
+    aggregates = fetch_adoption_aggregates(container, now=now)
+    print(f"Aggregated {sum(aggregates['buckets'].values())} queries server-side "
+          f"({len(aggregates['users'])} user rows, {len(aggregates['buckets'])} time buckets)")
+    return adoption_metrics_from_aggregates(aggregates)
+
+
+def adoption_parity(pushdown, python) -> list:
+    """Keys whose values differ between two adoption dicts (generatedAt ignored)."""
+    keys = (set(pushdown) | set(python)) - {"metadata"}
+    return sorted(key for key in keys if pushdown.get(key) != python.get(key))
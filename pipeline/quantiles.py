@@ -0,0 +1,120 @@
+"""
+Mergeable quantile sketch (DDSketch) for latency and response-time stats.
+
+Values are counted in logarithmic bins, so any quantile is returned within
+relative_accuracy of a true sample value (1% by default) using memory that
+grows with the log of the value range, not with the number of values.
+Sketches with the same accuracy merge by adding bin counts, so daily or
+per-shard sketches combine into any window. count, sum, min and max are
+tracked exactly.
+"""
+import math
+
+import numpy as np
+
+DEFAULT_RELATIVE_ACCURACY = 0.01
+
+QUANTILES = {"p50": 0.50, "p90": 0.90, "p95": 0.95, "p99": 0.99}
+
+
+class DDSketch:
+    """Quantile sketch over positive values; non-positive values are ignored."""
+
+    def __init__(self, relative_accuracy=DEFAULT_RELATIVE_ACCURACY):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.bins = {}
+        self.count = 0
+        self.sum = 0
+        self.min = None
+        self.max = None
+
+    def key(self, value) -> int:
+        return math.ceil(math.log(value) / self.log_gamma)
+
+    def add(self, value):
+        if not value or value <= 0:
+            return
+        k = self.key(value)
+        self.bins[k] = self.bins.get(k, 0) + 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def add_many(self, values):
+        """Vectorized add for an array of values."""
+        values = np.asarray(values, dtype=np.float64)
+        values = values[values > 0]
+        if not len(values):
+            return
+        keys = np.ceil(np.log(values) / self.log_gamma).astype(np.int64)
+        first_key = int(keys.min())
+        counts = np.bincount(keys - first_key)
+        for i in np.flatnonzero(counts).tolist():
+            self.bins[first_key + i] = self.bins.get(first_key + i, 0) + int(counts[i])
+        self.count += len(values)
+        self.sum += float(values.sum())
+        low, high = float(values.min()), float(values.max())
+        self.min = low if self.min is None else min(self.min, low)
+        self.max = high if self.max is None else max(self.max, high)
+
+    def merge(self, other):
+        """Fold another sketch with the same accuracy into this one."""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge DDSketches with different relative accuracy")
+        for k, c in other.bins.items():
+            self.bins[k] = self.bins.get(k, 0) + c
+        self.count += other.count
+        self.sum += other.sum
+        if other.count:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+
+    def quantile(self, q):
+        """Value at quantile q (0..1), or 0 for an empty sketch."""
+        if not self.count:
+            return 0
+        rank = q * (self.count - 1)
+        seen = 0
+        for k in sorted(self.bins):
+            seen += self.bins[k]
+            if seen > rank:
+                value = 2 * self.gamma ** k / (self.gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            "relativeAccuracy": self.relative_accuracy,
+            "bins": {str(k): c for k, c in self.bins.items()},
+            "count": self.count, "sum": self.sum, "min": self.min, "max": self.max
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data["relativeAccuracy"])
+        sketch.bins = {int(k): c for k, c in data["bins"].items()}
+        sketch.count, sketch.sum = data["count"], data["sum"]
+        sketch.min, sketch.max = data["min"], data["max"]
+        return sketch
+
+
+def quantile_stats(sketch, digits=2) -> dict:
+    """p50/p90/p95/p99 of a sketch, rounded."""
+    return {name: round(sketch.quantile(q), digits) for name, q in QUANTILES.items()}
+
+
+def latency_stats(sketch, target=None, digits=2) -> dict:
+    """min/max/avg plus quantiles, the latencyStats block of the dashboard JSON."""
+    stats = {
+        "min": round(sketch.min, digits) if sketch.count else 0,
+        "max": round(sketch.max, digits) if sketch.count else 0,
+        "avg": round(sketch.sum / sketch.count, digits) if sketch.count else 0,
+        **quantile_stats(sketch, digits)
+    }
+    if target is not None:
+        stats["target"] = target
+    return stats
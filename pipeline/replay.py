@@ -0,0 +1,538 @@
+"""
+Offline data source: in-memory containers replayed from JSONL fixtures.
+
+ReplayContainer answers the subset of the Cosmos ContainerProxy API the
+pipeline uses (query_items with by_page, read_item, upsert_item, patch_item,
+execute_item_batch of patches, read, read_feed_ranges and the change feed)
+from a list of documents, so every stage can run and be
+profiled without a Cosmos account. Queries are evaluated by a small
+interpreter that understands exactly the shapes the pipeline issues:
+projections or * (a column may be IS_DEFINED(c.field) AS alias), IS_DEFINED, comparisons on fields, ARRAY_CONTAINS and
+ORDER BY c._ts, plus the aggregates of pipeline.pushdown (GROUP BY on one
+feed range, COUNT/SUM/MIN/MAX, SELECT VALUE and DISTINCT VALUE over field
+paths, FLOOR and CEILING(LOG()) buckets and the user_id/user_name fallback
+expression). Anything else raises ValueError. Writes stay in memory;
+fixture files are never modified. Like the live clients, writes answer
+without the document (an empty dict, and batch results without
+resourceBody) unless the call passes no_response=False; see
+pipeline.cosmos_clients.NO_RESPONSE_ON_WRITE.
+
+Documents are spread over PIPELINE_REPLAY_PARTITIONS feed ranges (default 1)
+by a hash of their partition key, PIPELINE_REPLAY_PARTITION_KEY (default
+/id), so feed-range reads (pipeline.feedranges) and batched score writes
+(pipeline.scoring.ScoreWriter) can be exercised offline.
+
+A fixture directory holds one JSONL file per role (see ROLES); generate one
+with pipeline.synthetic. Point the pipeline at it with
+
+    python transform_to_dashboard.py --replay fixtures/ --judge-stub
+"""
+import os
+import re
+import json
+import math
+import time
+import zlib
+import threading
+
+from pipeline.cosmos_clients import NO_RESPONSE_ON_WRITE, get_container
+
+# Fixture file for each container the pipeline reads
+ROLES = {
+    "staging_conversation": "staging_conversation.jsonl",
+    "prod_conversation": "prod_conversation.jsonl",
+    "prod_feedback": "prod_feedback.jsonl",
+}
+
+_QUERY = re.compile(
+    r"^SELECT (?P<select>.+?) FROM c(?: WHERE (?P<where>.+?))?(?: GROUP BY (?P<group>.+?))?"
+    r"(?: ORDER BY c\._ts(?: (?P<order>ASC|DESC))?)?$",
+    re.IGNORECASE
+)
+_IS_DEFINED = re.compile(r"^IS_DEFINED\(c\.([\w.]+)\)$", re.IGNORECASE)
+_ARRAY_CONTAINS = re.compile(r"^ARRAY_CONTAINS\((@\w+), c\.([\w.]+)\)$", re.IGNORECASE)
+_COMPARISON = re.compile(r"^c\.([\w.]+) (>=|<=|!=|=|>|<) (@\w+|-?\d+(?:\.\d+)?)$")
+
+# Scalar expressions and aggregates of the pushdown queries
+_PATH = re.compile(r"^c\.([\w.]+)$")
+_STRING = re.compile(r'^"([^"]*)"$')
+_NUMBER = r"(\d+(?:\.\d+)?(?:e-?\d+)?)"
+_FLOOR = re.compile(r"^FLOOR\(c\.([\w.]+) / " + _NUMBER + r"\)$", re.IGNORECASE)
+_LOG_BIN = re.compile(r"^CEILING\(LOG\(c\.([\w.]+)\) / " + _NUMBER + r"\)$", re.IGNORECASE)
+_COALESCE = re.compile(
+    r'^\(\(IS_DEFINED\(c\.(\w+)\) AND NOT IS_NULL\(c\.\1\) AND c\.\1 != ""\) \? c\.\1 : (.+)\)$',
+    re.IGNORECASE
+)
+_AGGREGATE = re.compile(r"^(COUNT|SUM|MIN|MAX)\((.+)\)$", re.IGNORECASE)
+_ALIAS = re.compile(r"^(?P<expr>.+) AS (?P<alias>\w+)$", re.IGNORECASE)
+
+_MISSING = object()
+
+_OPERATORS = {
+    ">=": lambda a, b: a >= b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    "<": lambda a, b: a < b,
+    "=": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+}
+
+
+def _lookup(doc, path):
+    value = doc
+    for part in path.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+
+def _compile_where(where, parameters):
+    """predicate(doc) for a WHERE clause of AND-ed conditions."""
+    values = {p["name"]: p["value"] for p in parameters or []}
+
+    def param(token):
+        if token.startswith('@'):
+            if token not in values:
+                raise ValueError(f"Missing query parameter {token}")
+            return values[token]
+        return float(token) if '.' in token else int(token)
+
+    tests = []
+    for condition in re.split(r" AND ", where or "", flags=re.IGNORECASE):
+        if not condition:
+            continue
+        defined = _IS_DEFINED.match(condition)
+        contains = _ARRAY_CONTAINS.match(condition)
+        comparison = _COMPARISON.match(condition)
+        if defined:
+            path = defined.group(1)
+            tests.append(lambda doc, path=path: _lookup(doc, path) is not _MISSING)
+        elif contains:
+            members, path = set(param(contains.group(1))), contains.group(2)
+            tests.append(lambda doc, members=members, path=path: _lookup(doc, path) in members)
+        elif comparison:
+            path, op, operand = comparison.group(1), _OPERATORS[comparison.group(2)], param(comparison.group(3))
+
+            def compare(doc, path=path, op=op, operand=operand):
+                value = _lookup(doc, path)
+                try:
+                    return value is not _MISSING and op(value, operand)
+                except TypeError:
+                    return False
+            tests.append(compare)
+        else:
+            raise ValueError(f"Replay container cannot evaluate condition: {condition}")
+    return lambda doc: all(test(doc) for test in tests)
+
+
+def _match(query):
+    text = " ".join(query.split())
+    match = _QUERY.match(text)
+    if not match:
+        raise ValueError(f"Replay container cannot evaluate query: {text}")
+    return text, match
+
+
+def compile_query(query, parameters=None):
+    """
+    Compile a pipeline query into (predicate, projection, order). order is
+    None, "ASC" or "DESC"; projection is None for SELECT *.
+    """
+    text, match = _match(query)
+    predicate = _compile_where(match.group("where"), parameters)
+
+    select = match.group("select").strip()
+    projection = None
+    if select != '*':
+        projection = []
+        for field in _select_items(select):
+            aliased = _ALIAS.match(field)
+            defined = aliased and _IS_DEFINED.match(aliased.group("expr").strip())
+            if defined:
+                projection.append((aliased.group("alias"),
+                                   lambda doc, path=defined.group(1): _lookup(doc, path) is not _MISSING))
+            elif field.startswith('c.'):
+                projection.append((field[2:].rsplit('.', 1)[-1], lambda doc, path=field[2:]: _lookup(doc, path)))
+            else:
+                raise ValueError(f"Replay container cannot evaluate projection: {field}")
+
+    order = (match.group("order") or "ASC").upper() if "ORDER BY" in text.upper() else None
+    return predicate, projection, order
+
+
+def _number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _expression(text):
+    """value(doc) for a scalar expression of the pushdown queries; _MISSING where Cosmos gives undefined."""
+    text = text.strip()
+    path = _PATH.match(text)
+    string = _STRING.match(text)
+    floor = _FLOOR.match(text)
+    log_bin = _LOG_BIN.match(text)
+    coalesce = _COALESCE.match(text)
+    if path:
+        return lambda doc, path=path.group(1): _lookup(doc, path)
+    if string:
+        return lambda doc, value=string.group(1): value
+    if text == "1":
+        return lambda doc: 1
+    if floor:
+        path, width = floor.group(1), float(floor.group(2))
+
+        def bucket(doc):
+            value = _lookup(doc, path)
+            return math.floor(value / width) if _number(value) else _MISSING
+        return bucket
+    if log_bin:
+        path, log_gamma = log_bin.group(1), float(log_bin.group(2))
+
+        def log_bucket(doc):
+            value = _lookup(doc, path)
+            return math.ceil(math.log(value) / log_gamma) if _number(value) and value > 0 else _MISSING
+        return log_bucket
+    if coalesce:
+        field, fallback = coalesce.group(1), _expression(coalesce.group(2))
+
+        def first_set(doc):
+            value = doc.get(field, _MISSING)
+            return fallback(doc) if value is _MISSING or value is None or value == "" else value
+        return first_set
+    raise ValueError(f"Replay container cannot evaluate expression: {text}")
+
+
+def _aggregate(text):
+    """aggregate(docs) for COUNT/SUM/MIN/MAX(expression), or None if `text` is not an aggregate."""
+    match = _AGGREGATE.match(text.strip())
+    if not match:
+        return None
+    name, value = match.group(1).upper(), _expression(match.group(2))
+
+    def aggregate(docs):
+        values = [v for v in map(value, docs) if v is not _MISSING]
+        if name == "COUNT":
+            return len(values)
+        numbers = [v for v in values if _number(v)]
+        if name == "SUM":
+            return sum(numbers)
+        return (min if name == "MIN" else max)(numbers) if numbers else _MISSING
+    return aggregate
+
+
+def _select_items(select):
+    """Split a SELECT list on the commas outside parentheses."""
+    items, depth, start = [], 0, 0
+    for i, char in enumerate(select):
+        depth += {"(": 1, ")": -1}.get(char, 0)
+        if char == ',' and depth == 0:
+            items.append(select[start:i].strip())
+            start = i + 1
+    items.append(select[start:].strip())
+    return items
+
+
+def compile_aggregate(query, parameters=None):
+    """
+    Compile a pushdown aggregate query into (predicate, evaluate, grouped),
+    where evaluate(docs) returns the result rows of the matching documents,
+    or return None for a plain document query (see compile_query).
+    """
+    _, match = _match(query)
+    select, group = match.group("select").strip(), match.group("group")
+    predicate = _compile_where(match.group("where"), parameters)
+
+    if select.upper().startswith("DISTINCT VALUE "):
+        value = _expression(select[len("DISTINCT VALUE "):])
+
+        def distinct(docs):
+            values = (value(doc) for doc in docs)
+            return list(dict.fromkeys(v for v in values if v is not _MISSING))
+        return predicate, distinct, False
+
+    if select.upper().startswith("VALUE "):
+        aggregate = _aggregate(select[len("VALUE "):])
+        if aggregate is None:
+            raise ValueError(f"Replay container cannot evaluate SELECT VALUE: {select}")
+
+        def single(docs):
+            result = aggregate(docs)
+            return [] if result is _MISSING else [result]
+        return predicate, single, False
+
+    if not group:
+        return None
+
+    key = _expression(group)
+    columns = []
+    for item in _select_items(select):
+        aliased = _ALIAS.match(item)
+        if not aliased:
+            raise ValueError(f"Replay container needs an alias for grouped column: {item}")
+        expr = aliased.group("expr").strip()
+        aggregate = _aggregate(expr)
+        if aggregate is None and " ".join(expr.split()) != " ".join(group.split()):
+            raise ValueError(f"Replay container cannot group by {group} and select {expr}")
+        columns.append((aliased.group("alias"), aggregate))
+
+    def grouped(docs):
+        groups = {}
+        for doc in docs:
+            groups.setdefault(key(doc), []).append(doc)
+        rows = []
+        for group_key, group_docs in groups.items():
+            row = {}
+            for alias, aggregate in columns:
+                value = group_key if aggregate is None else aggregate(group_docs)
+                if value is not _MISSING:
+                    row[alias] = value
+            rows.append(row)
+        return rows
+    return predicate, grouped, True
+
+
+def _project(doc, projection):
+    if projection is None:
+        return dict(doc)
+    projected = {}
+    for name, column in projection:
+        value = column(doc)
+        if value is not _MISSING:
+            projected[name] = value
+    return projected
+
+
+class _ReplayPager:
+    """Page iterator with a continuation_token, like ItemPaged.by_page()."""
+
+    def __init__(self, results, page_size, continuation=None):
+        self.results = results
+        self.page_size = page_size or len(results) or 1
+        self.position = int(continuation or 0)
+        self.continuation_token = None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.position >= len(self.results):
+            raise StopIteration
+        page = self.results[self.position:self.position + self.page_size]
+        self.position += len(page)
+        self.continuation_token = str(self.position) if self.position < len(self.results) else None
+        return iter(page)
+
+
+class _ReplayItems:
+    """Result of ReplayContainer.query_items: iterable, with by_page()."""
+
+    def __init__(self, results, page_size):
+        self.results = results
+        self.page_size = page_size
+
+    def __iter__(self):
+        return iter(self.results)
+
+    def by_page(self, continuation_token=None):
+        return _ReplayPager(self.results, self.page_size, continuation_token)
+
+
+class _ReplayConnection:
+    def __init__(self):
+        self.last_response_headers = {}
+
+
+class ReplayContainer:
+    """In-memory stand-in for a Cosmos container (see module docstring)."""
+
+    def __init__(self, docs=(), name="replay", partitions=1, partition_key="/id",
+                 no_response_on_write=NO_RESPONSE_ON_WRITE):
+        self.name = name
+        self.no_response_on_write = no_response_on_write
+        self.partitions = max(1, partitions)
+        self.partition_key_path = partition_key
+        self.docs = {}
+        self.changes = []  # change feed: ids in write order
+        self.client_connection = _ReplayConnection()
+        self._lock = threading.Lock()
+        for doc in docs:
+            self._store(doc)
+
+    @classmethod
+    def from_jsonl(cls, path, partitions=1, partition_key="/id"):
+        with open(path) as f:
+            return cls((json.loads(line) for line in f if line.strip()), name=os.path.basename(path),
+                       partitions=partitions, partition_key=partition_key)
+
+    def _key(self, doc):
+        value = _lookup(doc, self.partition_key_path.strip('/').replace('/', '.'))
+        return None if value is _MISSING else value
+
+    def _partition(self, doc) -> int:
+        return zlib.crc32(str(self._key(doc)).encode()) % self.partitions
+
+    def read(self, response_hook=None, **kwargs):
+        properties = {"id": self.name, "partitionKey": {"paths": [self.partition_key_path], "kind": "Hash"}}
+        if response_hook:
+            response_hook({'x-ms-request-charge': '0'}, properties)
+        return properties
+
+    def _patched(self, item, partition_key, patch_operations):
+        """The patched copy of a stored document; KeyError if it is not in that partition."""
+        doc = self.docs.get(item)
+        if doc is None or self._key(doc) != partition_key:
+            raise KeyError(f"Replay container has no document {item!r} with partition key {partition_key!r}")
+        doc = dict(doc)
+        for operation in patch_operations:
+            path = operation["path"].strip('/')
+            if '/' in path or operation["op"] not in ("set", "add", "replace", "remove"):
+                raise ValueError(f"Replay container cannot apply patch operation: {operation}")
+            if operation["op"] == "remove":
+                doc.pop(path, None)
+            else:
+                doc[path] = operation["value"]
+        doc['_ts'] = int(time.time())
+        return doc
+
+    def _returns_body(self, kwargs) -> bool:
+        """Whether a write echoes the stored document: the call's no_response, else the client's setting."""
+        no_response = kwargs.get('no_response')
+        return not (self.no_response_on_write if no_response is None else no_response)
+
+    def _store(self, doc):
+        self.docs[doc['id']] = doc
+        self.changes.append(doc['id'])
+
+    def query_items(self, query, parameters=None, enable_cross_partition_query=None, max_item_count=None,
+                    feed_range=None, response_hook=None, **kwargs):
+        aggregate = compile_aggregate(query, parameters)
+        with self._lock:
+            docs = list(self.docs.values())
+        if feed_range is not None:
+            docs = [doc for doc in docs if self._partition(doc) == feed_range["partition"]]
+        if aggregate is not None:
+            predicate, evaluate, grouped = aggregate
+            if grouped and enable_cross_partition_query:
+                # As in the Python SDK, which only runs GROUP BY against one feed range
+                raise ValueError("Cross-partition GROUP BY is not supported; query each feed range")
+            results = evaluate([doc for doc in docs if predicate(doc)])
+        else:
+            predicate, projection, order = compile_query(query, parameters)
+            matched = [doc for doc in docs if predicate(doc)]
+            if order:
+                matched.sort(key=lambda doc: doc.get('_ts', 0), reverse=order == "DESC")
+            results = [_project(doc, projection) for doc in matched]
+        if response_hook:
+            # Replayed reads are free and arrive as one page
+            response_hook({'x-ms-request-charge': '0'}, {'Documents': results})
+        return _ReplayItems(results, max_item_count)
+
+    def upsert_item(self, body, response_hook=None, **kwargs):
+        doc = dict(body)
+        # Cosmos stamps every write with the server time
+        doc['_ts'] = int(time.time())
+        with self._lock:
+            self._store(doc)
+        body = dict(doc) if self._returns_body(kwargs) else {}
+        if response_hook:
+            response_hook({'x-ms-request-charge': '0'}, body)
+        return body
+
+    def patch_item(self, item, partition_key, patch_operations, response_hook=None, **kwargs):
+        with self._lock:
+            doc = self._patched(item, partition_key, patch_operations)
+            self._store(doc)
+        body = dict(doc) if self._returns_body(kwargs) else {}
+        if response_hook:
+            response_hook({'x-ms-request-charge': '0'}, body)
+        return body
+
+    def execute_item_batch(self, batch_operations, partition_key, response_hook=None, **kwargs):
+        """Patches applied all-or-nothing, like a transactional batch."""
+        with self._lock:
+            docs = []
+            for operation in batch_operations:
+                kind, args = operation[0], operation[1]
+                if kind != "patch":
+                    raise ValueError(f"Replay container cannot execute batch operation: {kind}")
+                docs.append(self._patched(args[0], partition_key, args[1]))
+            for doc in docs:
+                self._store(doc)
+        if self._returns_body(kwargs):
+            results = [{"statusCode": 200, "resourceBody": dict(doc)} for doc in docs]
+        else:
+            results = [{"statusCode": 200} for _ in docs]
+        if response_hook:
+            response_hook({'x-ms-request-charge': '0'}, results)
+        return results
+
+    def read_item(self, item, partition_key, response_hook=None, **kwargs):
+        with self._lock:
+            doc = self.docs.get(item)
+        if doc is None or self._key(doc) != partition_key:
+            raise KeyError(f"Replay container has no document {item!r} with partition key {partition_key!r}")
+        if response_hook:
+            response_hook({'x-ms-request-charge': '0'}, doc)
+        return dict(doc)
+
+    def read_feed_ranges(self, **kwargs):
+        if self.partitions == 1:
+            return [None]
+        return [{"partition": i} for i in range(self.partitions)]
+
+    def query_items_change_feed(self, is_start_from_beginning=False, continuation=None, max_item_count=None,
+                                **kwargs):
+        # Lazy like the SDK's pager: the etag only lands in the (possibly
+        # shared) client's last_response_headers once the results are read
+        def pages():
+            with self._lock:
+                start = int(continuation) if continuation else (0 if is_start_from_beginning else len(self.changes))
+                end = len(self.changes) if not max_item_count else min(len(self.changes), start + max_item_count)
+                ids = self.changes[start:end]
+                # Later writes to the same document supersede earlier ones
+                docs = [dict(self.docs[doc_id]) for doc_id in dict.fromkeys(ids)]
+                self.client_connection.last_response_headers = {'etag': str(end)}
+            yield from docs
+
+        return pages()
+
+
+# =============================================================================
+# SOURCE SELECTION
+# =============================================================================
+
+_replays = {}
+_replays_lock = threading.Lock()
+
+
+def replay_dir():
+    """Fixture directory the pipeline replays from, or None for live Cosmos."""
+    return os.getenv("PIPELINE_REPLAY_DIR") or None
+
+
+def replay_container(directory, role) -> ReplayContainer:
+    """Shared ReplayContainer for a role's fixture file, loaded once per process."""
+    path = os.path.join(directory, ROLES[role])
+    partitions = int(os.getenv("PIPELINE_REPLAY_PARTITIONS", "1"))
+    partition_key = os.getenv("PIPELINE_REPLAY_PARTITION_KEY", "/id")
+    with _replays_lock:
+        container = _replays.get(path)
+        if container is None:
+            if os.path.exists(path):
+                container = ReplayContainer.from_jsonl(path, partitions, partition_key)
+            else:
+                container = ReplayContainer(name=role, partitions=partitions, partition_key=partition_key)
+            _replays[path] = container
+        return container
+
+
+def open_container(role, endpoint, key, database, container):
+    """
+    The container for `role`: the replay fixture when PIPELINE_REPLAY_DIR is
+    set, otherwise the live container from the shared client registry.
+    """
+    directory = replay_dir()
+    if directory:
+        return replay_container(directory, role)
+    return get_container(endpoint, key, database, container)
@@ -0,0 +1,381 @@
+import json
+import sqlite3
+from datetime import datetime, timedelta
+
+from pipeline.state import state_path
+from pipeline.accumulators import RewriterAccumulator, FeedbackAccumulator, build_adoption_metrics
+from pipeline.quantiles import DDSketch, quantile_stats
+
+# Day-partitioned rollups of the three dashboard sources, in SQLite next to
+# the other pipeline state.
+#
+# Every partition is one local day ('%Y-%m-%d'; '' for documents without
+# _ts) and holds rows keyed by dimension and key (user, hour, entity,
+# feedback type, category, rewritten/passthrough group ...) with a count, a
+# total, the newest _ts and the key's first-seen position within the day.
+# The per-day item lists shown on the dashboard and DDSketch latency sketches
+# live in their own tables. A refresh rebuilds only the days an incremental
+# fetch touched, and the dashboard JSON is then assembled from rollups with
+# a handful of indexed queries, however long the history is. The item lists
+# are not loaded: the metrics carry them as generators over a cursor, which
+# write_artifact pages into the shards as it reads them.
+#
+# Output matches the document-by-document path, with one exception: the
+# first (partial) day of the 30-day trends is cut at minute resolution
+# instead of to the second.
+
+# Bump when the rows a builder writes change; stored partitions of an older
+# version are rebuilt from the snapshot on the next refresh.
+ROLLUP_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rollups (
+    source TEXT, day TEXT, dimension TEXT, key TEXT,
+    count INTEGER, total REAL, max_ts INTEGER, seq INTEGER,
+    PRIMARY KEY (source, dimension, day, key)
+);
+CREATE TABLE IF NOT EXISTS items (
+    source TEXT, list TEXT, day TEXT, seq INTEGER, sort_key TEXT, item TEXT,
+    PRIMARY KEY (source, list, day, seq)
+);
+CREATE TABLE IF NOT EXISTS sketches (
+    source TEXT, day TEXT, name TEXT, data TEXT,
+    PRIMARY KEY (source, name, day)
+);
+CREATE TABLE IF NOT EXISTS doc_days (
+    source TEXT, id TEXT, day TEXT,
+    PRIMARY KEY (source, id)
+);
+CREATE TABLE IF NOT EXISTS versions (
+    source TEXT PRIMARY KEY, version INTEGER
+);
+"""
+
+# Newest day first, then earliest position within that day: the order in
+# which a key first appears when documents are read newest first
+FIRST_SEEN = "MAX(day || printf('%09d', 999999999 - seq))"
+
+_day_cache = {}
+
+
+def day_of(ts) -> str:
+    """Local day partition of a _ts ('' when missing)."""
+    if not ts:
+        return ''
+    bucket = ts // 900
+    day = _day_cache.get(bucket)
+    if day is None:
+        day = _day_cache[bucket] = datetime.fromtimestamp(bucket * 900).strftime('%Y-%m-%d')
+    return day
+
+
+def partition_docs(docs, days=None) -> dict:
+    """Group documents by day partition, keeping their order; only `days` if given."""
+    by_day = {}
+    for doc in docs:
+        day = day_of(doc.get('_ts', 0))
+        if days is None or day in days:
+            by_day.setdefault(day, []).append(doc)
+    return by_day
+
+
+class _DayRows:
+    """Rows for one day partition, keyed by (dimension, key) in first-seen order."""
+
+    def __init__(self):
+        self.rows = {}
+
+    def bump(self, dimension, key, ts=0, count=1, total=0):
+        row = self.rows.get((dimension, key))
+        if row is None:
+            row = self.rows[(dimension, key)] = [0, 0, 0, len(self.rows)]
+        row[0] += count
+        row[1] += total
+        row[2] = max(row[2], ts or 0)
+
+
+# =============================================================================
+# PER-DAY BUILDERS
+# =============================================================================
+# Each returns (rows, items, sketches) for one day's documents, newest first.
+
+def _rewriter_day(docs):
+    accumulator = RewriterAccumulator()
+    accumulator.add_page(docs)
+
+    rows = _DayRows()
+    for name, group in accumulator.groups.items():
+        rows.bump('group', name, count=group["count"], total=group["results"])
+        rows.bump('zeros', name, count=group["zeros"])
+        rows.bump('scored', name, count=group["scored"])
+        for score in ("relevance", "groundedness", "completeness"):
+            rows.bump(score, name, count=0, total=group[score])
+    rows.bump('expansion', '', count=0, total=accumulator.expansion_total)
+    for entity, count in accumulator.entity_counts.items():
+        rows.bump('entity', entity, count=count)
+
+    items = [('rewrittenQueries', seq, '', item) for seq, item in enumerate(accumulator.rewritten_queries)]
+    items += [('zeroResultQueries', seq, '', item) for seq, item in enumerate(accumulator.zero_result_queries)]
+    return rows, items, {'latency': accumulator.latency_sketch}
+
+
+def _adoption_day(docs):
+    rows = _DayRows()
+    response_sketch = DDSketch()
+    for doc in docs:
+        ts = doc.get('_ts', 0)
+        if not ts:
+            continue
+        user_id = doc.get('user_id') or doc.get('user_name') or 'anonymous'
+        rows.bump('queries', '', ts)
+        rows.bump('user', user_id, ts)
+        rows.bump('hour', str(datetime.fromtimestamp(ts).hour), ts)
+        rows.bump('queries_minute', str(ts // 60), ts)
+        response_time = (doc.get('llm_telemetry') or {}).get('response_time_ms', 0)
+        if response_time and response_time > 0:
+            rows.bump('response', '', ts, total=response_time)
+            response_sketch.add(response_time)
+    return rows, [], {'response_time': response_sketch}
+
+
+def _feedback_day(docs):
+    accumulator = FeedbackAccumulator()
+    accumulator.add_page(docs)
+
+    rows = _DayRows()
+    rows.bump('feedback', 'total', count=accumulator.total)
+    rows.bump('feedback', 'thumbsUp', count=accumulator.thumbs_up)
+    rows.bump('feedback', 'thumbsDown', count=accumulator.thumbs_down)
+    for category, count in accumulator.category_counts.items():
+        rows.bump('category', category, count=count)
+    for f in docs:
+        ts = f.get('_ts', 0)
+        if ts:
+            sentiment = 'positive' if f.get('feedbackType') == 'thumbsUp' else 'negative'
+            rows.bump(sentiment, '', ts)
+            rows.bump(sentiment + '_minute', str(ts // 60), ts)
+
+    items = [('feedbackItems', -neg_seq, timestamp, item) for timestamp, neg_seq, item in accumulator.items_heap]
+    return rows, items, {}
+
+
+BUILDERS = {
+    "rewriter": _rewriter_day,
+    "adoption": _adoption_day,
+    "feedback": _feedback_day,
+}
+
+
+# =============================================================================
+# STORE
+# =============================================================================
+
+class RollupStore:
+    """SQLite rollup store. Open one per thread; the file is shared in WAL mode."""
+
+    def __init__(self, path=None):
+        self.path = path or state_path("rollups", ".sqlite")
+        self.conn = sqlite3.connect(self.path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def changed_days(self, source, delta) -> set:
+        """Days holding the changed documents now, plus the days they were in before."""
+        days = {day_of(doc.get('_ts', 0)) for doc in delta}
+        ids = [doc.get('id') for doc in delta if doc.get('id') is not None]
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            days.update(day for (day,) in self.conn.execute(
+                f"SELECT DISTINCT day FROM doc_days WHERE source = ? AND id IN ({placeholders})",
+                [source] + chunk
+            ))
+        return days
+
+    def is_current(self, source) -> bool:
+        """True when `source` has rollups written by this ROLLUP_VERSION."""
+        version = self.conn.execute("SELECT version FROM versions WHERE source = ?", (source,)).fetchone()
+        return bool(version) and version[0] == ROLLUP_VERSION
+
+    def refresh(self, source, docs, delta=None, prepare=None) -> int:
+        """
+        Bring the rollups for `source` up to date with `docs` (all known
+        documents, or at least every document in the partitions `delta`
+        touches; ties in _ts keep their given order). With `delta`, only the day partitions those
+        documents touch are rebuilt; without it, or when the stored rollups
+        are from an older ROLLUP_VERSION, everything is. prepare(docs), if
+        given, runs on just the documents being rolled up (e.g. to categorize
+        them). Returns the number of partitions rebuilt.
+        """
+        full = delta is None or not self.is_current(source)
+        days = None if full else self.changed_days(source, delta)
+
+        by_day = partition_docs(docs, days)
+        for day_docs in by_day.values():
+            day_docs.sort(key=lambda d: d.get('_ts', 0), reverse=True)
+        if prepare:
+            prepare([doc for day_docs in by_day.values() for doc in day_docs])
+
+        build = BUILDERS[source]
+        with self.conn:
+            if full:
+                for table in ("rollups", "items", "sketches", "doc_days"):
+                    self.conn.execute(f"DELETE FROM {table} WHERE source = ?", (source,))
+            else:
+                for table in ("rollups", "items", "sketches"):
+                    self.conn.executemany(f"DELETE FROM {table} WHERE source = ? AND day = ?",
+                                          [(source, day) for day in days])
+
+            for day, day_docs in by_day.items():
+                rows, items, sketches = build(day_docs)
+                self.conn.executemany(
+                    "INSERT INTO rollups VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(source, day, dimension, key, count, total, max_ts, seq)
+                     for (dimension, key), (count, total, max_ts, seq) in rows.rows.items()]
+                )
+                self.conn.executemany(
+                    "INSERT INTO items VALUES (?, ?, ?, ?, ?, ?)",
+                    [(source, name, day, seq, sort_key, json.dumps(item)) for name, seq, sort_key, item in items]
+                )
+                self.conn.executemany(
+                    "INSERT INTO sketches VALUES (?, ?, ?, ?)",
+                    [(source, day, name, json.dumps(sketch.to_dict())) for name, sketch in sketches.items()
+                     if sketch.count]
+                )
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO doc_days VALUES (?, ?, ?)",
+                    [(source, doc['id'], day) for doc in day_docs if doc.get('id') is not None]
+                )
+
+            self.conn.execute("INSERT OR REPLACE INTO versions VALUES (?, ?)", (source, ROLLUP_VERSION))
+
+        print(f"Rollups {source}: rebuilt {len(by_day)} day partition(s){' (full)' if full else ''}")
+        return len(by_day)
+
+    # -------------------------------------------------------------------------
+    # Readers
+    # -------------------------------------------------------------------------
+
+    def _totals(self, source, dimension):
+        """{key: (count, total)} summed over all days, in first-seen order."""
+        return {key: (count, total) for key, count, total, _ in self.conn.execute(
+            f"SELECT key, SUM(count), SUM(total), {FIRST_SEEN} AS first_seen FROM rollups "
+            "WHERE source = ? AND dimension = ? GROUP BY key ORDER BY first_seen DESC",
+            (source, dimension)
+        )}
+
+    def _sketch(self, source, name):
+        merged = DDSketch()
+        for (data,) in self.conn.execute("SELECT data FROM sketches WHERE source = ? AND name = ?", (source, name)):
+            merged.merge(DDSketch.from_dict(json.loads(data)))
+        return merged
+
+    def _items(self, source, name, by_sort_key=False):
+        """
+        The items of list `name` in dashboard order, yielded as they are read.
+        The cursor is on a connection of its own, opened on first use, so the
+        store may be closed before the list is consumed.
+        """
+        order = "sort_key DESC, day DESC, seq" if by_sort_key else "day DESC, seq"
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            for (item,) in conn.execute(
+                f"SELECT item FROM items WHERE source = ? AND list = ? ORDER BY {order}", (source, name)
+            ):
+                yield json.loads(item)
+        finally:
+            conn.close()
+
+    def _daily_since(self, source, dimension, cutoff):
+        """
+        Per-day counts of `dimension` for documents at or after `cutoff`. Whole
+        days come from the day rows; the day containing the cutoff is summed
+        from its minute rows.
+        """
+        cutoff_ts = cutoff.timestamp()
+        first_day = cutoff.strftime('%Y-%m-%d')
+        daily = {day: count for day, count in self.conn.execute(
+            "SELECT day, SUM(count) FROM rollups WHERE source = ? AND dimension = ? AND day > ? GROUP BY day",
+            (source, dimension, first_day)
+        )}
+        partial = self.conn.execute(
+            "SELECT SUM(count) FROM rollups WHERE source = ? AND dimension = ? AND day = ? "
+            "AND CAST(key AS INTEGER) * 60 >= ?",
+            (source, dimension + '_minute', first_day, cutoff_ts)
+        ).fetchone()[0]
+        if partial:
+            daily[first_day] = partial
+        return daily
+
+    def rewriter_metrics(self) -> dict:
+        """Rewriter metrics; rewrittenQueries and zeroResultQueries are generators (see _items)."""
+        accumulator = RewriterAccumulator()
+        for dimension, field, column in (('group', 'count', 0), ('group', 'results', 1), ('zeros', 'zeros', 0),
+                                         ('scored', 'scored', 0), ('relevance', 'relevance', 1),
+                                         ('groundedness', 'groundedness', 1), ('completeness', 'completeness', 1)):
+            for name, values in self._totals("rewriter", dimension).items():
+                accumulator.groups[name][field] = values[column]
+        accumulator.total = sum(group["count"] for group in accumulator.groups.values())
+        accumulator.expansion_total = sum(total for _, total in self._totals("rewriter", 'expansion').values())
+        accumulator.entity_counts = {entity: count for entity, (count, _) in self._totals("rewriter", 'entity').items()}
+        accumulator.latency_sketch = self._sketch("rewriter", 'latency')
+        metrics = accumulator.finalize()
+        if accumulator.total:
+            metrics["rewrittenQueries"] = self._items("rewriter", 'rewrittenQueries')
+            metrics["zeroResultQueries"] = self._items("rewriter", 'zeroResultQueries')
+        return metrics
+
+    def adoption_metrics(self, now=None) -> dict:
+        now = now or datetime.now()
+        week_ts = (now - timedelta(days=7)).timestamp()
+        month_ago = now - timedelta(days=30)
+
+        def distinct_users(since_ts=0):
+            return self.conn.execute(
+                "SELECT COUNT(DISTINCT key) FROM rollups WHERE source = 'adoption' AND dimension = 'user' "
+                "AND max_ts >= ?", (since_ts,)
+            ).fetchone()[0]
+
+        top_users = {user: count for user, count, _ in self.conn.execute(
+            f"SELECT key, SUM(count) AS queries, {FIRST_SEEN} AS first_seen FROM rollups "
+            "WHERE source = 'adoption' AND dimension = 'user' GROUP BY key "
+            "ORDER BY queries DESC, first_seen DESC LIMIT 10"
+        )}
+        response = self._totals("adoption", 'response').get('', (0, 0))
+        response_sketch = self._sketch("adoption", 'response_time')
+
+        return build_adoption_metrics(
+            total_queries=sum(count for count, _ in self._totals("adoption", 'queries').values()),
+            wau=distinct_users(week_ts),
+            mau=distinct_users(month_ago.timestamp()),
+            user_query_counts=top_users,
+            response_time_total=response[1],
+            response_time_count=response[0],
+            hour_counts={int(hour): count for hour, (count, _) in self._totals("adoption", 'hour').items()},
+            daily_counts=self._daily_since("adoption", 'queries', month_ago),
+            response_time_stats=quantile_stats(response_sketch, digits=0),
+            total_users=distinct_users()
+        )
+
+    def feedback_metrics(self, categorized=True, now=None) -> dict:
+        """Feedback metrics; feedbackItems is a generator (see _items)."""
+        accumulator = FeedbackAccumulator(categorized=categorized, now=now)
+        totals = self._totals("feedback", 'feedback')
+        accumulator.total = totals.get('total', (0, 0))[0]
+        accumulator.thumbs_up = totals.get('thumbsUp', (0, 0))[0]
+        accumulator.thumbs_down = totals.get('thumbsDown', (0, 0))[0]
+        accumulator.category_counts = {category: count for category, (count, _)
+                                       in self._totals("feedback", 'category').items()}
+
+        positive = self._daily_since("feedback", 'positive', accumulator.month_ago)
+        negative = self._daily_since("feedback", 'negative', accumulator.month_ago)
+        accumulator.daily_feedback = {day: {"positive": positive.get(day, 0), "negative": negative.get(day, 0)}
+                                      for day in set(positive) | set(negative)}
+
+        metrics = accumulator.finalize()
+        if accumulator.total:
+            metrics["feedbackItems"] = self._items("feedback", 'feedbackItems', by_sort_key=True)
+        return metrics
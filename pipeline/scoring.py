@@ -0,0 +1,376 @@
+import os
+import json
+import time
+import random
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from pipeline.llm_cache import get_cache, prompt_version, normalize_text
+from pipeline.instrumentation import step, record, cosmos_hook, record_llm_usage
+
+JUDGE_API_VERSION = "2024-10-21"
+
+JUDGE_PROMPT = """You are an expert evaluator for a data center AI assistant.
+
+Score this response on three dimensions (1-5 scale):
+
+QUERY: {query}
+ANSWER: {answer}
+DOCUMENTS RETRIEVED: {result_count}
+
+Score each dimension:
+1. RELEVANCE: Does the answer address what was asked? (1=off-topic, 5=perfectly relevant)
+2. GROUNDEDNESS: Does the answer seem based on retrieved documents, not hallucinated? (1=made up, 5=well-grounded)
+3. COMPLETENESS: Is the answer thorough enough? (1=too brief, 5=comprehensive)
+
+Respond in this exact JSON format only:
+{{"relevance": X, "groundedness": X, "completeness": X, "reasoning": "brief explanation"}}
+"""
+
+JUDGE_PROMPT_VERSION = prompt_version(JUDGE_PROMPT)
+
+
+def build_judge_prompt(query: str, answer: str, result_count: int) -> str:
+    return JUDGE_PROMPT.format(query=query, answer=answer, result_count=result_count)
+
+
+def judge_deployment() -> str:
+    return os.getenv("AZURE_OPENAI_DEPLOYMENT", "gpt-4.1")
+
+
+def _judge_cache_inputs(query, answer, result_count):
+    return {"query": normalize_text(query), "answer": normalize_text(answer), "result_count": result_count}
+
+
+def cached_judge_scores(query, answer, result_count):
+    """Previously computed scores for these inputs, or None."""
+    cache = get_cache()
+    if cache is None:
+        return None
+    return cache.get("judge", JUDGE_PROMPT_VERSION, judge_deployment(),
+                     **_judge_cache_inputs(query, answer, result_count))
+
+
+def store_judge_scores(query, answer, result_count, scores):
+    cache = get_cache()
+    if cache is not None:
+        cache.set("judge", JUDGE_PROMPT_VERSION, judge_deployment(), scores,
+                  **_judge_cache_inputs(query, answer, result_count))
+
+
+def needs_scoring(doc) -> bool:
+    """True for documents with a query and answer but no evaluation scores yet."""
+    return not doc.get('evaluation_scores') and bool(doc.get('conversation')) and bool(doc.get('llm_response'))
+
+
+# =============================================================================
+# RATE LIMITING
+# =============================================================================
+
+class TokenBucket:
+    """Async token bucket: `rate` requests per second with bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+# =============================================================================
+# SCORE PERSISTENCE
+# =============================================================================
+
+# Most operations Cosmos accepts in one transactional batch
+MAX_BATCH_OPERATIONS = 100
+
+
+def score_patch(scores) -> list:
+    """Partial document update that sets /evaluation_scores and nothing else."""
+    return [{"op": "set", "path": "/evaluation_scores", "value": scores}]
+
+
+def partition_key_paths(container):
+    """
+    The container's partition key paths, each split into its field names
+    (['user_id'] for /user_id), or None if they cannot be read.
+    """
+    try:
+        properties = container.read(response_hook=cosmos_hook())
+    except Exception as e:
+        print(f"Could not read the partition key of {getattr(container, 'id', 'container')}: {e}")
+        return None
+    return [path.strip('/').split('/') for path in properties["partitionKey"]["paths"]]
+
+
+class ScoreWriter:
+    """
+    Writes evaluation scores back with partial document updates: a patch of
+    /evaluation_scores instead of an upsert that resends the whole
+    conversation, answer text included.
+
+    The documents of one write are grouped by partition key, and every group
+    of two or more goes out as one transactional batch of patches. A batch
+    is all-or-nothing, so when one fails (say a document was deleted since
+    it was read) its documents are patched one at a time and only the bad
+    ones are lost. Documents without their partition key fields, and
+    containers without patch support (older SDKs, the benchmark's null
+    container), fall back to upserting the document.
+
+    The clients are created with no_response_on_write, but score writes
+    pass no_response=False: the stored document they get back carries the
+    _ts the write gave it, which callers merge instead of refetching.
+    """
+
+    def __init__(self, container):
+        self.container = container
+        self.key_paths = partition_key_paths(container) if hasattr(container, 'patch_item') else None
+
+    def partition_key(self, doc):
+        """The document's partition key value (a list for hierarchical keys), or None if it lacks one."""
+        values = []
+        for path in self.key_paths:
+            value = doc
+            for name in path:
+                if not isinstance(value, dict) or name not in value:
+                    return None
+                value = value[name]
+            values.append(value)
+        return values[0] if len(values) == 1 else values
+
+    def write(self, docs) -> list:
+        """
+        Persist the evaluation_scores of `docs`. Returns the written documents
+        as Cosmos stored them (with the _ts the write gave them), or as sent
+        where a write came back without a body.
+        """
+        if self.key_paths is None:
+            return self._upsert(docs)
+        groups = {}
+        unkeyed = []
+        for doc in docs:
+            key = self.partition_key(doc)
+            if key is None:
+                unkeyed.append(doc)
+            else:
+                groups.setdefault(json.dumps(key), (key, []))[1].append(doc)
+
+        written = self._upsert(unkeyed)
+        for key, group in groups.values():
+            for start in range(0, len(group), MAX_BATCH_OPERATIONS):
+                written.extend(self._patch(key, group[start:start + MAX_BATCH_OPERATIONS]))
+        return written
+
+    def _patch(self, key, docs) -> list:
+        if len(docs) > 1:
+            operations = [("patch", (doc['id'], score_patch(doc['evaluation_scores']))) for doc in docs]
+            try:
+                results = self.container.execute_item_batch(operations, partition_key=key, no_response=False,
+                                                             response_hook=cosmos_hook(write=True, items=len(docs)))
+                return [result.get("resourceBody") or doc for result, doc in zip(results, docs)]
+            except Exception as e:
+                print(f"Batch of {len(docs)} score writes failed, patching one by one: {e}")
+        written = []
+        for doc in docs:
+            try:
+                written.append(self.container.patch_item(doc['id'], partition_key=key,
+                                                         patch_operations=score_patch(doc['evaluation_scores']),
+                                                         no_response=False,
+                                                         response_hook=cosmos_hook(write=True)) or doc)
+            except Exception as e:
+                print(f"Failed to update doc: {e}")
+        return written
+
+    def _upsert(self, docs) -> list:
+        written = []
+        for doc in docs:
+            try:
+                written.append(self.container.upsert_item(doc, no_response=False,
+                                                          response_hook=cosmos_hook(write=True)) or doc)
+            except Exception as e:
+                print(f"Failed to update doc: {e}")
+        return written
+
+    def verify(self, docs) -> list:
+        """
+        Point-read each of `docs` and return the ids whose stored
+        evaluation_scores differ from the document's (or could not be read).
+        """
+        if self.key_paths is None:
+            print(f"Cannot verify {len(docs)} score writes: the container's partition key is unknown")
+            return []
+        mismatched = []
+        for doc in docs:
+            try:
+                stored = self.container.read_item(doc['id'], partition_key=self.partition_key(doc),
+                                                  response_hook=cosmos_hook())
+            except Exception as e:
+                print(f"Failed to read back doc {doc['id']}: {e}")
+                stored = {}
+            if stored.get('evaluation_scores') != doc.get('evaluation_scores'):
+                mismatched.append(doc['id'])
+        return mismatched
+
+
+# =============================================================================
+# SCORING ENGINE
+# =============================================================================
+
+class ScoringEngine:
+    """
+    Scores documents concurrently with one shared AsyncAzureOpenAI client.
+
+    Concurrency is capped by a semaphore and request starts are paced by a
+    token bucket. 429s, timeouts and 5xx responses are retried with
+    exponential backoff (honouring Retry-After). Scores are written back to
+    Cosmos by a ScoreWriter in batches on a small thread pool so the event
+    loop never blocks on the synchronous SDK. Documents that still fail
+    after all retries are left unscored so the next run picks them up again.
+    """
+
+    def __init__(self, container, max_concurrency=8, requests_per_minute=300,
+                 max_retries=6, write_batch_size=MAX_BATCH_OPERATIONS, write_workers=4):
+        self.container = container
+        self.writer = ScoreWriter(container)
+        self.max_concurrency = max_concurrency
+        self.requests_per_minute = requests_per_minute
+        self.max_retries = max_retries
+        self.write_batch_size = write_batch_size
+        self.write_workers = write_workers
+        self.written = []
+        self.failed_count = 0
+        self.retry_count = 0
+        self.cache_hits = 0
+
+    def _make_client(self):
+        from openai import AsyncAzureOpenAI
+
+        return AsyncAzureOpenAI(
+            azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+            api_key=os.getenv("AZURE_OPENAI_KEY"),
+            api_version=JUDGE_API_VERSION,
+            max_retries=0
+        )
+
+    async def _judge(self, client, doc):
+        import openai
+
+        query, answer, result_count = doc.get('conversation', ''), doc.get('llm_response', ''), doc.get('resultCount', 0)
+        cached = cached_judge_scores(query, answer, result_count)
+        if cached is not None:
+            self.cache_hits += 1
+            record(cache_hits=1)
+            return cached
+
+        prompt = build_judge_prompt(query, answer, result_count)
+
+        for attempt in range(self.max_retries + 1):
+            await self._bucket.acquire()
+            try:
+                response = await client.chat.completions.create(
+                    model=judge_deployment(),
+                    messages=[{"role": "user", "content": prompt}],
+                    temperature=0,
+                    max_tokens=200
+                )
+                record_llm_usage(response)
+                scores = json.loads(response.choices[0].message.content)
+                store_judge_scores(query, answer, result_count, scores)
+                return scores
+            except (openai.RateLimitError, openai.APITimeoutError,
+                    openai.APIConnectionError, openai.InternalServerError) as e:
+                if attempt == self.max_retries:
+                    print(f"Scoring error: {e}")
+                    return None
+                self.retry_count += 1
+                record(retries=1)
+                await asyncio.sleep(self._backoff(e, attempt))
+            except Exception as e:
+                print(f"Scoring error: {e}")
+                return None
+
+    def _backoff(self, error, attempt):
+        response = getattr(error, 'response', None)
+        retry_after = response.headers.get('retry-after') if response is not None else None
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        return min(60.0, 0.5 * 2 ** attempt) * (0.5 + random.random())
+
+    async def _flush(self, force=False):
+        while len(self._pending) >= self.write_batch_size or (force and self._pending):
+            batch = self._pending[:self.write_batch_size]
+            del self._pending[:self.write_batch_size]
+            # copy_context keeps the write RUs on the step that started scoring
+            written = await asyncio.get_running_loop().run_in_executor(
+                self._pool, contextvars.copy_context().run, self.writer.write, batch
+            )
+            self.written.extend(written)
+
+    async def _score_one(self, client, doc):
+        async with self._semaphore:
+            scores = await self._judge(client, doc)
+        if scores is None:
+            self.failed_count += 1
+            return
+        doc['evaluation_scores'] = scores
+        self._pending.append(doc)
+        await self._flush()
+
+    @property
+    def scored_count(self) -> int:
+        return len(self.written)
+
+    async def run(self, docs) -> list:
+        """Score and persist the given documents. Returns them as written (see ScoreWriter.write)."""
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._bucket = TokenBucket(self.requests_per_minute / 60.0, capacity=self.max_concurrency)
+        self._pending = []
+
+        client = self._make_client()
+        self._pool = ThreadPoolExecutor(max_workers=self.write_workers)
+        try:
+            await asyncio.gather(*(self._score_one(client, doc) for doc in docs))
+            await self._flush(force=True)
+        finally:
+            await client.close()
+            self._pool.shutdown(wait=True)
+
+        return self.written
+
+
+def score_documents(docs, container, max_concurrency=8, requests_per_minute=300, verify=False) -> list:
+    """
+    Synchronous entry point: score `docs` concurrently and write them back.
+    Returns the written documents as stored (see ScoreWriter.write). With
+    verify, each write is checked by a point read of just that document.
+    """
+    if not docs:
+        return []
+    engine = ScoringEngine(container, max_concurrency=max_concurrency, requests_per_minute=requests_per_minute)
+    written = asyncio.run(engine.run(docs))
+    print(f"Scoring: {engine.cache_hits} from cache, {engine.failed_count} failed, {engine.retry_count} retries")
+    if verify and written:
+        with step("verify"):
+            mismatched = engine.writer.verify(written)
+        if mismatched:
+            print(f"✗ {len(mismatched)} of {len(written)} score writes not found on read-back: "
+                  f"{', '.join(mismatched[:10])}")
+        else:
+            print(f"✓ Verified {len(written)} score writes by point read")
+    return written
@@ -0,0 +1,94 @@
+"""
+Metric computation split across processes by _ts range.
+
+The fetches return documents newest first (ORDER BY c._ts DESC), so every
+contiguous run of the list is a _ts range. compute_sharded cuts the list into
+one such run per worker, never between two documents with the same _ts,
+folds each run into a fresh accumulator in a worker process and merges the
+accumulators back in list order. merge() leaves exactly the state one
+accumulator fed the whole list would have, so finalize() gives the same JSON
+as the single-process path.
+
+Workers are forked and find their documents in a module-level job table
+they inherit, so documents are never pickled; only the accumulators travel
+back. A process is only forked while it runs a single thread: a child forked
+while another thread holds a lock (stdout, a connection pool, the
+allocator) inherits the lock held and can deadlock. Where fork is
+unavailable, or other threads are running, the runs are folded in process;
+--workers therefore runs the pipeline stages sequentially.
+"""
+import os
+import itertools
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# Below this many documents per shard a worker costs more than it saves
+MIN_SHARD_DOCS = 50000
+
+# job id -> (documents, accumulator factory); read by forked workers
+_jobs = {}
+_job_ids = itertools.count()
+_jobs_lock = threading.Lock()
+
+
+def shard_bounds(docs, shards) -> list:
+    """
+    (start, end) index ranges splitting docs into `shards` runs of about equal
+    length. A cut moves forward past documents sharing the _ts at the cut, so
+    each _ts value falls in one shard.
+    """
+    bounds = []
+    start = 0
+    for i in range(1, shards + 1):
+        end = len(docs) * i // shards
+        while 0 < end < len(docs) and docs[end].get('_ts') == docs[end - 1].get('_ts'):
+            end += 1
+        if end > start:
+            bounds.append((start, end))
+            start = end
+    return bounds
+
+
+def _can_fork() -> bool:
+    return "fork" in multiprocessing.get_all_start_methods() and threading.active_count() == 1
+
+
+def _fold(job_id, start, end):
+    docs, factory = _jobs[job_id]
+    accumulator = factory()
+    accumulator.add_page(docs[start:end])
+    return accumulator
+
+
+def compute_sharded(docs, factory, workers=1, base=None):
+    """
+    Fold docs into accumulators from factory() across up to `workers`
+    processes (0 = one per core) and return them merged, into `base` when
+    given (e.g. an accumulator holding state from earlier runs).
+    """
+    workers = workers or os.cpu_count() or 1
+    shards = max(1, min(workers, len(docs) // MIN_SHARD_DOCS))
+    result = base if base is not None else factory()
+    if shards > 1 and not _can_fork():
+        print(f"Computing {len(docs)} documents in one process: forking is only safe without other threads "
+              f"running")
+        shards = 1
+    if shards == 1:
+        result.add_page(docs)
+        return result
+
+    with _jobs_lock:
+        job_id = next(_job_ids)
+        _jobs[job_id] = (docs, factory)
+    try:
+        with ProcessPoolExecutor(max_workers=shards, mp_context=multiprocessing.get_context("fork")) as pool:
+            futures = [pool.submit(_fold, job_id, start, end) for start, end in shard_bounds(docs, shards)]
+            parts = [future.result() for future in futures]
+    finally:
+        with _jobs_lock:
+            del _jobs[job_id]
+
+    for part in parts:
+        result.merge(part)
+    return result
@@ -0,0 +1,75 @@
+import io
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from pipeline.instrumentation import step
+
+
+class _StageOutput:
+    """
+    sys.stdout replacement that buffers writes per stage thread, so concurrent
+    stages don't interleave their progress lines. Writes from any other thread
+    pass straight through.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.buffers = {}
+        self.captured = {}
+
+    def write(self, text):
+        buffer = self.buffers.get(threading.get_ident())
+        if buffer is None:
+            return self.stream.write(text)
+        return buffer.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+def _run_stage(name, fn, output=None):
+    if output is not None:
+        output.buffers[threading.get_ident()] = io.StringIO()
+    try:
+        with step(name):
+            return fn()
+    except Exception as e:
+        # Stages handle their own errors; this is the last line of defence
+        print(f"✗ Stage {name} failed: {e}")
+        return None
+    finally:
+        if output is not None:
+            captured = output.buffers.pop(threading.get_ident()).getvalue()
+            output.captured[name] = captured
+
+
+def run_stages(stages, parallel=True):
+    """
+    Run (name, fn) stages and return their results in order.
+
+    With parallel=True all stages run at once on a thread pool, so wall time
+    approaches the slowest stage. Each stage's console output is buffered and
+    replayed in stage order as soon as that stage and all earlier ones are
+    done, so the log reads exactly like a sequential run.
+    """
+    if not parallel or len(stages) < 2:
+        return [_run_stage(name, fn) for name, fn in stages]
+
+    output = _StageOutput(sys.stdout)
+    sys.stdout = output
+    try:
+        with ThreadPoolExecutor(max_workers=len(stages), thread_name_prefix="stage") as pool:
+            futures = [pool.submit(_run_stage, name, fn, output) for name, fn in stages]
+            results = []
+            for (name, _), future in zip(stages, futures):
+                results.append(future.result())
+                output.stream.write(output.captured.pop(name, ""))
+                output.stream.flush()
+    finally:
+        sys.stdout = output.stream
+
+    return results
@@ -0,0 +1,184 @@
+import os
+import json
+
+# Local state lives next to the repo so reruns on the same machine can pick up
+# where the last run stopped. Override with PIPELINE_STATE_DIR.
+STATE_DIR = os.getenv(
+    "PIPELINE_STATE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".pipeline_state")
+)
+
+
+def state_path(name: str, suffix: str) -> str:
+    """Return the path of a state file, creating the state directory if needed."""
+    os.makedirs(STATE_DIR, exist_ok=True)
+    return os.path.join(STATE_DIR, f"{name}{suffix}")
+
+
+# =============================================================================
+# WATERMARKS
+# =============================================================================
+
+def load_watermark(name: str) -> dict:
+    """Load the stored high-water mark for a container, or None."""
+    path = state_path(name, ".watermark.json")
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_watermark(name: str, ts: int, signature: str):
+    """Persist the high-water mark and the query signature it was taken with."""
+    path = state_path(name, ".watermark.json")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({"ts": ts, "signature": signature}, f)
+    os.replace(tmp_path, path)
+
+
+# =============================================================================
+# SNAPSHOTS
+# =============================================================================
+
+def load_snapshot(name: str) -> dict:
+    """Load previously seen documents keyed by id."""
+    path = state_path(name, ".snapshot.jsonl")
+    snapshot = {}
+    if not os.path.exists(path):
+        return snapshot
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                doc = json.loads(line)
+                snapshot[doc['id']] = doc
+    return snapshot
+
+
+def save_snapshot(name: str, snapshot: dict):
+    """Write the snapshot as JSONL, replacing the old file atomically."""
+    path = state_path(name, ".snapshot.jsonl")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        for doc in snapshot.values():
+            f.write(json.dumps(doc, separators=(',', ':')))
+            f.write("\n")
+    os.replace(tmp_path, path)
+
+
+def merge_documents(snapshot: dict, delta: list) -> int:
+    """Merge fetched documents into the snapshot by id. Returns how many were new."""
+    new_count = 0
+    for doc in delta:
+        doc_id = doc.get('id')
+        if doc_id is None:
+            continue
+        if doc_id not in snapshot:
+            new_count += 1
+        snapshot[doc_id] = doc
+    return new_count
+
+
+def merge_into_snapshot(name: str, docs: list) -> int:
+    """
+    Merge documents changed by this run (e.g. just scored) into the stored
+    snapshot without fetching them again. The watermark is left alone, so
+    the next incremental fetch still sees them. Returns how many were new.
+    """
+    snapshot = load_snapshot(name)
+    new_count = merge_documents(snapshot, docs)
+    save_snapshot(name, snapshot)
+    return new_count
+
+
+# =============================================================================
+# INCREMENTAL FETCH
+# =============================================================================
+
+def fetch_incremental(name: str, fetch_fn, signature: str, full: bool = False, on_delta=None) -> list:
+    """
+    Fetch only documents changed since the last run and merge them into the
+    local snapshot.
+
+    fetch_fn(since_ts) must return the documents with _ts >= since_ts (all
+    documents when since_ts is None). The watermark is inclusive so writes that
+    land in the same second as the previous run are not lost; duplicates are
+    collapsed by id. A changed query signature (e.g. a new projection) or
+    full=True rebuilds the snapshot from scratch. Deleted documents are only
+    dropped on a full rebuild.
+
+    on_delta(delta, rebuilt), if given, is called with the fetched documents
+    and whether the snapshot was rebuilt from scratch, so derived state (e.g.
+    pipeline.rollups) can update just what changed.
+
+    Returns all known documents ordered by _ts descending, like the ordered
+    fetch functions themselves (so unordered fetches need no sort of their own).
+    """
+    watermark = None if full else load_watermark(name)
+    if watermark and watermark.get("signature") != signature:
+        print(f"Query for {name} changed, rebuilding snapshot")
+        watermark = None
+
+    snapshot = load_snapshot(name) if watermark else {}
+    since_ts = watermark["ts"] if watermark else None
+
+    delta = fetch_fn(since_ts)
+    new_count = merge_documents(snapshot, delta)
+
+    high_water = max((doc.get('_ts', 0) for doc in delta), default=since_ts or 0)
+    save_snapshot(name, snapshot)
+    save_watermark(name, max(high_water, since_ts or 0), signature)
+
+    if since_ts is not None:
+        print(f"Incremental {name}: {len(delta)} changed ({new_count} new), {len(snapshot)} total")
+    if on_delta:
+        on_delta(delta, since_ts is None)
+
+    return sorted(snapshot.values(), key=lambda d: d.get('_ts', 0), reverse=True)
+
+
+# =============================================================================
+# STREAMING CHECKPOINTS
+# =============================================================================
+
+# Checkpoints are JSON; "accumulator" holds the accumulator's to_state().
+# Bump when that state changes shape: checkpoints of another version are
+# ignored and the stream starts over.
+CHECKPOINT_VERSION = 1
+
+
+def load_checkpoint(name: str, signature: str) -> dict:
+    """Load a streaming checkpoint if one exists for the same query and CHECKPOINT_VERSION."""
+    path = state_path(name, ".checkpoint.json")
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            checkpoint = json.load(f)
+    except ValueError as e:
+        print(f"Ignoring unreadable checkpoint for {name}: {e}")
+        return None
+    if checkpoint.get("version") != CHECKPOINT_VERSION or checkpoint.get("signature") != signature:
+        return None
+    return checkpoint
+
+
+def save_checkpoint(name: str, signature: str, continuation: str, accumulator, pages: int):
+    """Persist the continuation token together with the accumulator state."""
+    path = state_path(name, ".checkpoint.json")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({
+            "version": CHECKPOINT_VERSION,
+            "signature": signature,
+            "continuation": continuation,
+            "accumulator": accumulator.to_state(),
+            "pages": pages
+        }, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+
+def clear_checkpoint(name: str):
+    path = state_path(name, ".checkpoint.json")
+    if os.path.exists(path):
+        os.remove(path)
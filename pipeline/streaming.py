@@ -0,0 +1,72 @@
+from pipeline.state import load_checkpoint, save_checkpoint, clear_checkpoint
+from pipeline.instrumentation import record, cosmos_hook
+
+DEFAULT_PAGE_SIZE = 500
+
+
+def iter_query_pages(container, query, parameters=None, page_size=DEFAULT_PAGE_SIZE, continuation=None):
+    """
+    Yield (page, continuation_token) for a Cosmos query, one server page at a
+    time. The token returned with a page resumes the query after that page.
+    """
+    iterator = container.query_items(
+        query,
+        parameters=parameters,
+        enable_cross_partition_query=True,
+        max_item_count=page_size,
+        response_hook=cosmos_hook()
+    )
+    pager = iterator.by_page(continuation)
+    for page in pager:
+        page = list(page)
+        record(documents=len(page))
+        yield page, pager.continuation_token
+
+
+def stream_into(name, container, query, accumulator, parameters=None, on_page=None,
+                page_size=DEFAULT_PAGE_SIZE, resume=True):
+    """
+    Feed a query into an accumulator page by page and return the accumulator.
+
+    on_page(page) may enrich a page before it is accumulated (scoring,
+    categorization) and must return the page to add. After every page the
+    continuation token and accumulator are checkpointed, so a crashed run
+    resumes from the last completed page instead of the start. The checkpoint
+    is removed once the query is drained.
+    """
+    continuation = None
+    pages = 0
+
+    checkpoint = load_checkpoint(name, query) if resume else None
+    if checkpoint:
+        try:
+            accumulator = type(accumulator).from_state(checkpoint["accumulator"])
+        except (KeyError, TypeError, ValueError, OSError) as e:
+            print(f"Ignoring unreadable checkpoint for {name}: {e}")
+            checkpoint = None
+    if checkpoint:
+        continuation = checkpoint["continuation"]
+        pages = checkpoint["pages"]
+        print(f"Resuming {name} from checkpoint after {pages} pages")
+
+    docs = 0
+    try:
+        for page, token in iter_query_pages(container, query, parameters, page_size, continuation):
+            if on_page:
+                page = on_page(page)
+            accumulator.add_page(page)
+            pages += 1
+            docs += len(page)
+            if token:
+                save_checkpoint(name, query, token, accumulator, pages)
+    except Exception:
+        if checkpoint and not docs:
+            # The service refused the stored token (expired, or the query shape
+            # does not support resuming); start over rather than fail forever.
+            print(f"Checkpoint for {name} could not be resumed, restarting")
+            clear_checkpoint(name)
+        raise
+
+    clear_checkpoint(name)
+    print(f"Streamed {docs} documents in {pages} pages for {name}")
+    return accumulator
@@ -0,0 +1,210 @@
+"""
+Synthetic conversation, rewrite-telemetry and feedback documents.
+
+Documents have the shape and rough proportions of the real containers:
+activity skewed towards a minority of heavy users and business hours, most
+queries naming a site, product or power figure, about 60% of staging
+queries rewritten, a share of them still unscored, and thumbs-down feedback
+carrying more comments than thumbs-up. Generation is seeded and runs in
+NumPy-drawn chunks, so 10M rows take minutes rather than hours and the same
+seed and `now` always give the same documents.
+
+    python -m pipeline.synthetic fixtures/ --rows 1000000
+    python transform_to_dashboard.py --replay fixtures/ --judge-stub
+"""
+import os
+import json
+import time
+import argparse
+from datetime import datetime, timezone
+
+import numpy as np
+
+from pipeline.replay import ROLES
+
+CHUNK = 10000
+
+SITES = ["DFW10", "DFW29", "IAD38", "IAD71", "ORD11", "SJC37", "LHR20", "AMS17", "FRA14", "SIN11", "NRT12", "SYD10"]
+METROS = ["Dallas", "Ashburn", "Chicago", "Silicon Valley", "London", "Amsterdam", "Frankfurt", "Singapore"]
+PRODUCTS = ["ServiceFabric", "Metro Connect", "cross connect", "Service Exchange", "PlatformDIGITAL"]
+CLOUDS = ["Azure", "AWS", "Google Cloud", "Oracle Cloud"]
+
+QUERY_TEMPLATES = [
+    "What is the available power at {site}?",
+    "How many MW are available in {metro}?",
+    "{mw} MW of capacity in {metro} by next year?",
+    "Which sites in {metro} support {product}?",
+    "Pricing for a {product} at {site}",
+    "Does {site} have an on-ramp to {cloud}?",
+    "List NSPs present at {site}",
+    "What is {product}?",
+    "Cabinet availability at {site}",
+    "Latency from {site} to {cloud}",
+    "Who is the site manager for {site}?",
+    "Tell me a joke",
+    "How do I submit an expense report?",
+]
+
+COMMENTS = {
+    "thumbsUp": ["Great answer", "Exactly what I needed", "Helpful, thanks", "Accurate capacity numbers for {site}"],
+    "thumbsDown": ["Wrong MW figure for {site}", "Didn't know about {product}", "Missing the {metro} sites",
+                   "Answer was too vague", "No results for {site}", "Outdated pricing", "Not relevant"],
+}
+
+# Share of activity per local hour: a working-day hump over a quiet night
+HOUR_WEIGHTS = np.array([1, 1, 1, 1, 1, 2, 4, 8, 14, 18, 20, 19, 15, 18, 20, 18, 14, 9, 5, 3, 2, 2, 1, 1],
+                        dtype=np.float64)
+HOUR_WEIGHTS /= HOUR_WEIGHTS.sum()
+
+
+def _fill(template, rng_values):
+    site, metro, product, cloud, mw = rng_values
+    return template.format(site=SITES[site], metro=METROS[metro], product=PRODUCTS[product],
+                           cloud=CLOUDS[cloud], mw=mw)
+
+
+def _timestamps(rng, n, now_ts, days):
+    """_ts values over the last `days` days, weighted towards business hours."""
+    midnight = now_ts - now_ts % 86400
+    day_offsets = rng.integers(0, days, n)
+    hours = rng.choice(24, n, p=HOUR_WEIGHTS)
+    ts = midnight - day_offsets * 86400 + hours * 3600 + rng.integers(0, 3600, n)
+    return np.minimum(ts, now_ts)
+
+
+def _users(rng, n, users):
+    """User indexes with a long tail: a few users send most queries."""
+    return np.minimum((users * rng.random(n) ** 3).astype(np.int64), users - 1)
+
+
+def _iso(ts):
+    return datetime.fromtimestamp(ts, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+def conversation_docs(rows, seed=0, days=90, now=None, users=None, staging=True):
+    """
+    Yield `rows` conversation documents. Staging documents carry
+    query_rewrite_telemetry and (mostly) evaluation_scores; production ones
+    carry user ids and llm_telemetry only.
+    """
+    rng = np.random.default_rng(seed)
+    now_ts = int((now or datetime.now()).timestamp())
+    users = users or max(10, rows // 40)
+    prefix = "stg" if staging else "prd"
+
+    for start in range(0, rows, CHUNK):
+        n = min(CHUNK, rows - start)
+        ts = _timestamps(rng, n, now_ts, days)
+        user = _users(rng, n, users)
+        template = rng.integers(0, len(QUERY_TEMPLATES), n)
+        fills = np.stack([rng.integers(0, len(SITES), n), rng.integers(0, len(METROS), n),
+                          rng.integers(0, len(PRODUCTS), n), rng.integers(0, len(CLOUDS), n),
+                          rng.integers(1, 40, n)], axis=1)
+        results = np.where(rng.random(n) < 0.12, 0, rng.integers(1, 25, n))
+        response_ms = rng.lognormal(7.6, 0.45, n)
+        expansions = np.where(rng.random(n) < 0.6, rng.integers(1, 6, n), 0)
+        rewrite_ms = rng.gamma(4.0, 8.0, n)
+        scored = rng.random(n) < 0.85
+        scores = rng.integers(2, 6, (n, 3))
+
+        for i in range(n):
+            row = start + i
+            query = _fill(QUERY_TEMPLATES[template[i]], fills[i].tolist())
+            doc = {
+                "id": f"{prefix}-{seed}-{row:09d}",
+                "conversation_id": f"{row * 2654435761 % 16 ** 8:08x}-{seed}-{row}",
+                "user_id": f"user{int(user[i]):06d}@example.com",
+                "user_name": f"User {int(user[i])}",
+                "timestamp": _iso(int(ts[i])),
+                "_ts": int(ts[i]),
+                "conversation": query,
+                "llm_response": f"Based on the retrieved documents: {query.rstrip('?')}.",
+                "resultCount": int(results[i]),
+                "llm_telemetry": {"response_time_ms": round(float(response_ms[i]), 1)},
+            }
+            if staging:
+                expansion_count = int(expansions[i])
+                entities = [SITES[fills[i][0]], PRODUCTS[fills[i][2]]][:expansion_count]
+                doc["query_rewrite_telemetry"] = {
+                    "expansion_count": expansion_count,
+                    "matched_entities": entities,
+                    "expanded_query": f"{query} OR {' OR '.join(entities)}" if entities else query,
+                    "rewrite_time_ms": round(float(rewrite_ms[i]), 2) if expansion_count else 0,
+                    "ab_group": "treatment" if expansion_count else "control",
+                }
+                if scored[i]:
+                    relevance, groundedness, completeness = scores[i].tolist()
+                    doc["evaluation_scores"] = {"relevance": relevance, "groundedness": groundedness,
+                                                "completeness": completeness, "reasoning": "synthetic"}
+            yield doc
+
+
+def feedback_docs(rows, seed=0, days=90, now=None, users=None):
+    """Yield `rows` feedback documents; about 70% thumbs up."""
+    rng = np.random.default_rng(seed + 1)
+    now_ts = int((now or datetime.now()).timestamp())
+    users = users or max(10, rows)
+
+    for start in range(0, rows, CHUNK):
+        n = min(CHUNK, rows - start)
+        ts = _timestamps(rng, n, now_ts, days)
+        user = _users(rng, n, users)
+        positive = rng.random(n) < 0.7
+        has_comment = rng.random(n) < np.where(positive, 0.3, 0.8)
+        comment_pick = rng.integers(0, 1 << 16, n)
+        fills = np.stack([rng.integers(0, len(SITES), n), rng.integers(0, len(METROS), n),
+                          rng.integers(0, len(PRODUCTS), n), rng.integers(0, len(CLOUDS), n),
+                          rng.integers(1, 40, n)], axis=1)
+
+        for i in range(n):
+            row = start + i
+            feedback_type = "thumbsUp" if positive[i] else "thumbsDown"
+            comments = COMMENTS[feedback_type]
+            yield {
+                "id": f"fb-{seed}-{row:09d}",
+                "feedbackType": feedback_type,
+                "timestamp": _iso(int(ts[i])),
+                "_ts": int(ts[i]),
+                "userName": f"User {int(user[i])}",
+                "comment": _fill(comments[comment_pick[i] % len(comments)], fills[i].tolist()) if has_comment[i] else "",
+                "conversationId": f"{row * 40503 % 16 ** 8:08x}-{seed}-{row}",
+            }
+
+
+def write_jsonl(path, docs) -> int:
+    count = 0
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        for doc in docs:
+            f.write(json.dumps(doc, separators=(',', ':')))
+            f.write("\n")
+            count += 1
+    os.replace(tmp_path, path)
+    return count
+
+
+def write_fixtures(directory, rows, feedback_ratio=0.05, seed=0, days=90, now=None) -> dict:
+    """Write a replay fixture (see pipeline.replay.ROLES); returns rows written per role."""
+    os.makedirs(directory, exist_ok=True)
+    now = now or datetime.now()
+    generators = {
+        "staging_conversation": conversation_docs(rows, seed, days, now, staging=True),
+        "prod_conversation": conversation_docs(rows, seed + 2, days, now, staging=False),
+        "prod_feedback": feedback_docs(max(1, int(rows * feedback_ratio)), seed, days, now),
+    }
+    return {role: write_jsonl(os.path.join(directory, ROLES[role]), docs) for role, docs in generators.items()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic replay fixture for offline pipeline runs.")
+    parser.add_argument("directory")
+    parser.add_argument("--rows", type=int, default=10000, help="Conversation documents per container")
+    parser.add_argument("--feedback-ratio", type=float, default=0.05, help="Feedback documents per conversation")
+    parser.add_argument("--days", type=int, default=90, help="History length in days")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    counts = write_fixtures(args.directory, args.rows, args.feedback_ratio, args.seed, args.days)
+    print(f"Wrote {', '.join(f'{n} {role}' for role, n in counts.items())} "
+          f"to {args.directory} in {time.perf_counter() - start:.1f}s")
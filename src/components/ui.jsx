@@ -189,3 +189,30 @@ export const PageHeader = ({ title, subtitle, icon: Icon, badge }) => (
     </div>
   </header>
 );
+
+// Load More Component (for lists from useShardedList)
+export const LoadMore = ({ list, shown }) => {
+  if (list.error) {
+    return (
+      <p className="text-center text-sm mt-4" style={{ color: COLORS.red }}>
+        Could not load more items: {list.error.message}
+      </p>
+    );
+  }
+  if (!list.hasMore) return null;
+  return (
+    <div className="flex flex-col items-center gap-2 mt-4">
+      <p className="text-sm" style={{ color: COLORS.textMuted }}>
+        {shown} shown, {list.items.length} of {list.total} loaded
+      </p>
+      <button
+        onClick={list.loadMore}
+        disabled={list.loading}
+        className="px-4 py-2 rounded-lg text-sm font-medium transition-all hover:opacity-80 disabled:opacity-50"
+        style={{ background: 'rgba(124, 58, 237, 0.2)', color: COLORS.purple }}
+      >
+        {list.loading ? 'Loading...' : 'Load more'}
+      </button>
+    </div>
+  );
+};
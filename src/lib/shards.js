@@ -0,0 +1,103 @@
+import { useCallback, useEffect, useState } from 'react';
+
+// Long lists (rewritten queries, zero-result queries, feedback items) are
+// written by pipeline/artifacts.py as page files under public/shards/. The
+// summary JSONs the pages import only carry a manifest per list:
+// { total, pageSize, pageCount, path: 'shards/data/zeroResultQueries-{page}.json', facets }
+
+const pageRequests = new Map();
+
+const shardUrl = (entry, page) =>
+  `${import.meta.env.BASE_URL}${entry.path.replace('{page}', String(page).padStart(4, '0'))}`;
+
+// One request per page file, shared between pages of the app
+const fetchPage = (entry, page) => {
+  const url = shardUrl(entry, page);
+  if (!pageRequests.has(url)) {
+    const request = fetch(url)
+      .then((response) => {
+        if (!response.ok) throw new Error(`${response.status} loading ${url}`);
+        return response.json();
+      })
+      .catch((error) => {
+        pageRequests.delete(url);
+        throw error;
+      });
+    pageRequests.set(url, request);
+  }
+  return pageRequests.get(url);
+};
+
+// Items of a sharded list, loaded a page at a time (the first on mount).
+// Summaries written before sharding carry the whole list inline instead.
+export const useShardedList = (summary, name) => {
+  const entry = summary?.shards?.[name];
+  const inline = summary?.[name] || [];
+  const [items, setItems] = useState([]);
+  const [loadedPages, setLoadedPages] = useState(0);
+  const [loading, setLoading] = useState(false);
+  const [error, setError] = useState(null);
+
+  const loadMore = useCallback(() => {
+    if (!entry || loading || loadedPages >= entry.pageCount) return;
+    setLoading(true);
+    setError(null);
+    fetchPage(entry, loadedPages)
+      .then((page) => {
+        setItems((previous) => previous.concat(page));
+        setLoadedPages(loadedPages + 1);
+      })
+      .catch(setError)
+      .finally(() => setLoading(false));
+  }, [entry, loading, loadedPages]);
+
+  useEffect(() => {
+    loadMore();
+    // The summary is a static import; the first page only needs loading once
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, []);
+
+  if (!entry) {
+    return {
+      items: inline, total: inline.length, pageSize: inline.length, facets: null,
+      hasMore: false, loading: false, error: null, loadMore,
+    };
+  }
+  return {
+    items,
+    total: entry.total,
+    pageSize: entry.pageSize,
+    facets: entry.facets,
+    hasMore: loadedPages < entry.pageCount,
+    loading,
+    error,
+    loadMore,
+  };
+};
+
+// Count of items with field === value: from the manifest facets when there
+// are any (facet keys are strings; booleans are 'true'/'false'), otherwise
+// from the items at hand.
+export const facetCount = (list, field, value) => {
+  if (list.facets?.[field]) {
+    return list.facets[field][String(value)] || 0;
+  }
+  return list.items.filter((item) => item[field] === value).length;
+};
+
+// Filters and search only see the pages loaded so far. While one is active,
+// keep loading pages until `shown` matches fill a page's worth of the view or
+// the list runs out, so a rare match is not hidden in a page never fetched.
+export const useFillFiltered = (list, shown, filtering) => {
+  const { pageSize, hasMore, loading, error, loadMore } = list;
+  useEffect(() => {
+    if (filtering && shown < pageSize && hasMore && !loading && !error) loadMore();
+  }, [filtering, shown, pageSize, hasMore, loading, error, loadMore]);
+};
+
+// "12 of 480 queries shown", or, while a filter has only seen part of the
+// list, how much of it was searched
+export const shownLabel = (list, shown, noun) =>
+  list.hasMore && shown < list.items.length
+    ? `${shown} matching in the first ${list.items.length} of ${list.total} ${noun} (partial)`
+    : `${shown} of ${list.total} ${noun} shown`;
@@ -9,7 +9,8 @@ import {
   Target
 } from 'lucide-react';
 import { COLORS } from '../App';
-import { Card, KPICard, Badge, PageHeader, TitleWithInfo } from '../components/ui';
+import { Card, KPICard, Badge, PageHeader, TitleWithInfo, LoadMore } from '../components/ui';
+import { useShardedList, useFillFiltered, facetCount, shownLabel } from '../lib/shards';
 
 // Import data
 import data from '../data.json';
@@ -19,7 +20,8 @@ const ContentHealth = () => {
   const [filterRewritten, setFilterRewritten] = useState('all'); // 'all', 'yes', 'no'
   const [expandedRows, setExpandedRows] = useState(new Set());
 
-  const zeroResultQueries = data.zeroResultQueries || [];
+  const zeroResultList = useShardedList(data, 'zeroResultQueries');
+  const zeroResultQueries = zeroResultList.items;
 
   // Filter queries
   const filteredQueries = useMemo(() => {
@@ -34,10 +36,11 @@ const ContentHealth = () => {
       return true;
     });
   }, [filterRewritten, searchTerm, zeroResultQueries]);
+  useFillFiltered(zeroResultList, filteredQueries.length, filterRewritten !== 'all' || searchTerm !== '');
 
-  // Stats
-  const rewrittenZeros = zeroResultQueries.filter(q => q.wasRewritten).length;
-  const passthroughZeros = zeroResultQueries.filter(q => !q.wasRewritten).length;
+  // Stats (over the whole list, not just the loaded pages)
+  const rewrittenZeros = facetCount(zeroResultList, 'wasRewritten', true);
+  const passthroughZeros = facetCount(zeroResultList, 'wasRewritten', false);
 
   // Toggle row expansion
   const toggleRow = (id) => {
@@ -59,7 +62,7 @@ const ContentHealth = () => {
         badge={
           <Badge variant="warning">
             <AlertTriangle size={12} />
-            {zeroResultQueries.length} gaps identified
+            {zeroResultList.total} gaps identified
           </Badge>
         }
       />
@@ -68,7 +71,7 @@ const ContentHealth = () => {
       <div className="grid grid-cols-1 sm:grid-cols-2 lg:grid-cols-4 gap-6">
         <KPICard
           title="Zero-Result Queries"
-          value={zeroResultQueries.length}
+          value={zeroResultList.total}
           subtitle="Total content gaps"
           icon={XCircle}
           delay={100}
@@ -110,7 +113,7 @@ const ContentHealth = () => {
               Zero-Result Queries
             </TitleWithInfo>
             <p className="text-sm mt-1" style={{ color: COLORS.textMuted }}>
-              {filteredQueries.length} of {zeroResultQueries.length} queries shown
+              {shownLabel(zeroResultList, filteredQueries.length, 'queries')}
             </p>
           </div>
           
@@ -157,7 +160,7 @@ const ContentHealth = () => {
         
         {/* Queries List */}
         <div className="space-y-2">
-          {filteredQueries.slice(0, 30).map((item, index) => (
+          {filteredQueries.map((item, index) => (
             <div 
               key={item.id || index}
               className="rounded-lg border border-white/5 overflow-hidden transition-all"
@@ -272,13 +275,9 @@ const ContentHealth = () => {
           ))}
         </div>
         
-        {filteredQueries.length > 30 && (
-          <p className="text-center text-sm mt-4" style={{ color: COLORS.textMuted }}>
-            Showing 30 of {filteredQueries.length} items. Use filters to narrow results.
-          </p>
-        )}
+        <LoadMore list={zeroResultList} shown={filteredQueries.length} />
         
-        {filteredQueries.length === 0 && (
+        {filteredQueries.length === 0 && !zeroResultList.loading && !zeroResultList.hasMore && (
           <div className="text-center py-12">
             <Database size={48} className="mx-auto mb-4" style={{ color: COLORS.textMuted }} />
             <p style={{ color: COLORS.textMuted }}>No zero-result queries match your filters.</p>
@@ -21,7 +21,8 @@ import {
   ChevronUp
 } from 'lucide-react';
 import { COLORS } from '../App';
-import { Card, KPICard, Badge, PageHeader, TitleWithInfo, CustomChartTooltip } from '../components/ui';
+import { Card, KPICard, Badge, PageHeader, TitleWithInfo, CustomChartTooltip, LoadMore } from '../components/ui';
+import { useShardedList, useFillFiltered, shownLabel } from '../lib/shards';
 
 // Import data
 import feedbackData from '../feedback.json';
@@ -31,6 +32,8 @@ const Feedback = () => {
   const [filterType, setFilterType] = useState('all'); // 'all', 'thumbsUp', 'thumbsDown'
   const [filterCategory, setFilterCategory] = useState('all');
   const [expandedRows, setExpandedRows] = useState(new Set());
+  const feedbackList = useShardedList(feedbackData, 'feedbackItems');
+  const feedbackItems = feedbackList.items;
   const CATEGORY_COLORS = {
   'ServiceFabric': COLORS.purple,
   'Capacity': COLORS.cyan,
@@ -41,15 +44,15 @@ const Feedback = () => {
   'Other': '#6b7280',
   'Uncategorized': '#6b7280',
 };
-  // Get unique categories
+  // Get unique categories (from the breakdown, which covers every item)
   const categories = useMemo(() => {
-    const cats = new Set((feedbackData.feedbackItems || []).map(f => f.category));
+    const cats = new Set((feedbackData.categoryBreakdown || []).map(c => c.category));
     return ['all', ...Array.from(cats)];
   }, []);
 
   // Filter feedback items
   const filteredFeedback = useMemo(() => {
-    return (feedbackData.feedbackItems || []).filter(item => {
+    return feedbackItems.filter(item => {
       // Filter by type
       if (filterType !== 'all' && item.feedbackType !== filterType) return false;
       
@@ -61,7 +64,9 @@ const Feedback = () => {
       
       return true;
     });
-  }, [filterType, filterCategory, searchTerm]);
+  }, [filterType, filterCategory, searchTerm, feedbackItems]);
+  useFillFiltered(feedbackList, filteredFeedback.length,
+    filterType !== 'all' || filterCategory !== 'all' || searchTerm !== '');
 
   // Category chart data
   const categoryChartData = (feedbackData.categoryBreakdown || []).map(item => ({
@@ -235,7 +240,7 @@ const Feedback = () => {
               Feedback Details
             </TitleWithInfo>
             <p className="text-sm mt-1" style={{ color: COLORS.textMuted }}>
-              {filteredFeedback.length} of {feedbackData.feedbackItems?.length || 0} items shown
+              {shownLabel(feedbackList, filteredFeedback.length, 'items')}
             </p>
           </div>
           
@@ -300,7 +305,7 @@ const Feedback = () => {
         
         {/* Table */}
         <div className="space-y-2">
-          {filteredFeedback.slice(0, 50).map((item, index) => (
+          {filteredFeedback.map((item, index) => (
             <div 
               key={item.id || index}
               className="rounded-lg border border-white/5 overflow-hidden transition-all"
@@ -408,11 +413,7 @@ const Feedback = () => {
           ))}
         </div>
         
-        {filteredFeedback.length > 50 && (
-          <p className="text-center text-sm mt-4" style={{ color: COLORS.textMuted }}>
-            Showing 50 of {filteredFeedback.length} items. Use filters to narrow results.
-          </p>
-        )}
+        <LoadMore list={feedbackList} shown={filteredFeedback.length} />
       </Card>
     </div>
   );
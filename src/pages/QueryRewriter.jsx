@@ -19,13 +19,15 @@ import {
   Clock
 } from 'lucide-react';
 import { COLORS } from '../App';
-import { Card, KPICard, Badge, PageHeader, TitleWithInfo, CustomChartTooltip, ScoreBar } from '../components/ui';
+import { Card, KPICard, Badge, PageHeader, TitleWithInfo, CustomChartTooltip, ScoreBar, LoadMore } from '../components/ui';
+import { useShardedList, shownLabel } from '../lib/shards';
 
 // Import data
 import data from '../data.json';
 
 const QueryRewriter = () => {
-  const { summary, effectiveness, latencyStats, qualityScores, topEntities, rewrittenQueries } = data;
+  const { summary, effectiveness, latencyStats, qualityScores, topEntities } = data;
+  const rewrittenList = useShardedList(data, 'rewrittenQueries');
   const ENTITY_COLORS = [COLORS.purple, COLORS.cyan, COLORS.orange, COLORS.pink, COLORS.red];
 
   // Transform entity data for pie chart
@@ -361,7 +363,7 @@ const QueryRewriter = () => {
           Rewritten Queries
         </TitleWithInfo>
         <p className="text-sm mt-1 mb-6" style={{ color: COLORS.textMuted }}>
-          {(rewrittenQueries || []).length} queries with entity expansion
+          {shownLabel(rewrittenList, rewrittenList.items.length, 'queries with entity expansion')}
         </p>
         
         <div className="overflow-x-auto">
@@ -376,7 +378,7 @@ const QueryRewriter = () => {
               </tr>
             </thead>
             <tbody>
-              {(rewrittenQueries || []).slice(0, 20).map((row, index) => (
+              {rewrittenList.items.map((row, index) => (
                 <tr 
                   key={row.id || index} 
                   className="border-b border-white/5 transition-colors hover:bg-white/5"
@@ -434,6 +436,7 @@ const QueryRewriter = () => {
             </tbody>
           </table>
         </div>
+        <LoadMore list={rewrittenList} shown={rewrittenList.items.length} />
       </Card>
     </div>
   );
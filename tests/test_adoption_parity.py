@@ -0,0 +1,45 @@
+"""
+The pushdown adoption engine (server-side aggregates, pipeline.pushdown) must
+produce the same metrics as the document-by-document AdoptionAccumulator.
+Both run here on one synthetic fixture, the pushdown queries evaluated by the
+replay container over several feed ranges.
+"""
+from datetime import datetime
+
+import pytest
+
+from pipeline.accumulators import AdoptionAccumulator
+from pipeline.pushdown import adoption_parity, pushdown_adoption_metrics
+from pipeline.replay import ReplayContainer
+from pipeline.synthetic import conversation_docs
+
+
+def _fixture(now):
+    docs = list(conversation_docs(3000, seed=7, days=45, now=now, staging=False))
+    # The user fallback chain (user_id, then user_name, then "anonymous") and
+    # documents without a usable response time
+    docs[0].pop("user_id")
+    docs[1]["user_id"] = ""
+    docs[2]["user_id"] = None
+    for doc in docs[3:6]:
+        doc.pop("user_id")
+        doc.pop("user_name")
+    docs[6].pop("llm_telemetry")
+    docs[7]["llm_telemetry"]["response_time_ms"] = 0
+    return docs
+
+
+@pytest.mark.parametrize("partitions", [1, 4])
+def test_pushdown_matches_document_path(partitions):
+    now = datetime.now()
+    docs = _fixture(now)
+
+    container = ReplayContainer(docs, partitions=partitions)
+    pushdown = pushdown_adoption_metrics(container, now=now)
+
+    accumulator = AdoptionAccumulator(now=now)
+    accumulator.add_page(sorted(docs, key=lambda doc: doc["_ts"], reverse=True))
+    python = accumulator.finalize()
+
+    assert adoption_parity(pushdown, python) == []
+    assert pushdown["totalQueries"] == len(docs)
@@ -0,0 +1,81 @@
+"""
+Dashboard artifacts (pipeline.artifacts) are rewritten only when their
+content changes, metadata.generatedAt aside, always by an atomic rename,
+and their list shards and manifest follow the lists they were cut from.
+"""
+import os
+import gzip
+import json
+
+from pipeline.artifacts import _compressors, write_artifact, write_if_changed
+
+OLD = 1_000_000_000
+
+
+def _metrics(generated_at, count=450):
+    return {
+        "metadata": {"generatedAt": generated_at, "totalQueries": count},
+        "zeroResultQueries": [{"query": f"query {i}", "wasRewritten": i % 3 == 0} for i in range(count)],
+    }
+
+
+def _read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def _age(path):
+    """Backdate a file, so a rewrite shows in its mtime."""
+    os.utime(path, (OLD, OLD))
+
+
+def test_unchanged_content_is_not_rewritten(tmp_path):
+    path = str(tmp_path / "data.json")
+    compressors = {".gz": _compressors()[".gz"]}
+    assert write_if_changed(path, _metrics("2026-01-01T00:00:00"), compressors)
+    assert gzip.decompress(_read(path + ".gz")) == _read(path)
+    _age(path)
+
+    # Only generatedAt differs: the file, its old timestamp and its mtime stay
+    assert not write_if_changed(path, _metrics("2026-01-02T00:00:00"), compressors)
+    assert os.stat(path).st_mtime == OLD
+    assert json.loads(_read(path))["metadata"]["generatedAt"] == "2026-01-01T00:00:00"
+
+    assert write_if_changed(path, _metrics("2026-01-02T00:00:00", count=451), compressors)
+    assert os.stat(path).st_mtime != OLD
+    assert gzip.decompress(_read(path + ".gz")) == _read(path)
+    assert sorted(os.listdir(tmp_path)) == ["data.json", "data.json.gz"]
+
+
+def test_missing_sibling_is_added_without_rewriting_the_file(tmp_path):
+    path = str(tmp_path / "data.json")
+    write_if_changed(path, _metrics("2026-01-01T00:00:00"))
+    _age(path)
+
+    assert write_if_changed(path, _metrics("2026-01-02T00:00:00"), {".gz": _compressors()[".gz"]})
+    assert os.stat(path).st_mtime == OLD
+    assert gzip.decompress(_read(path + ".gz")) == _read(path)
+
+
+def test_shards_and_manifest_follow_the_list(tmp_path):
+    src_dir, shard_dir = str(tmp_path / "src"), str(tmp_path / "shards")
+    assert write_artifact(src_dir, "data.json", _metrics("2026-01-01T00:00:00"), shard_dir, page_size=200)
+
+    summary = json.loads(_read(os.path.join(src_dir, "data.json")))
+    manifest = summary["shards"]["zeroResultQueries"]
+    assert "zeroResultQueries" not in summary
+    assert (manifest["total"], manifest["pageSize"], manifest["pageCount"]) == (450, 200, 3)
+    assert manifest["facets"] == {"wasRewritten": {"true": 150, "false": 300}}
+    artifact_dir = os.path.join(shard_dir, "data")
+    assert json.loads(_read(os.path.join(artifact_dir, "manifest.json"))) == summary["shards"]
+    pages = [json.loads(_read(os.path.join(artifact_dir, f"zeroResultQueries-{page:04d}.json"))) for page in range(3)]
+    assert sum(pages, []) == _metrics("")["zeroResultQueries"]
+
+    # A rerun over the same data writes nothing
+    assert write_artifact(src_dir, "data.json", _metrics("2026-01-02T00:00:00"), shard_dir, page_size=200) == 0
+
+    # A shorter list drops the pages it no longer needs, with their siblings
+    write_artifact(src_dir, "data.json", _metrics("2026-01-03T00:00:00", count=150), shard_dir, page_size=200)
+    assert not [name for name in os.listdir(artifact_dir) if name.startswith("zeroResultQueries-0001")]
+    assert not [name for name in os.listdir(artifact_dir) if name.endswith(".tmp")]
+    assert json.loads(_read(os.path.join(src_dir, "data.json")))["shards"]["zeroResultQueries"]["pageCount"] == 1
@@ -0,0 +1,153 @@
+"""
+The change-feed daemon (pipeline.changefeed) must end up with the same
+dashboard metrics as calculating them directly from the latest version of
+every document, however the feed is paged and whichever client the
+containers share.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+import pipeline.changefeed as changefeed
+import pipeline.state
+from pipeline.accumulators import AdoptionAccumulator, FeedbackAccumulator, RewriterAccumulator
+from pipeline.artifacts import SHARDED_LISTS
+from pipeline.changefeed import FEEDS, CosmosChangeFeedSource, FakeChangeFeedSource, MetricsDaemon
+from pipeline.replay import ReplayContainer
+from pipeline.synthetic import conversation_docs, feedback_docs
+
+
+@pytest.fixture
+def outputs(tmp_path, monkeypatch):
+    """State under tmp_path; collects the metrics the daemon writes, by output file."""
+    monkeypatch.setattr(pipeline.state, "STATE_DIR", str(tmp_path / "state"))
+    written = {}
+    write_artifact = changefeed.write_artifact
+
+    def capture(src_dir, filename, metrics, *args):
+        # Rollup metrics carry their lists as generators
+        metrics = {key: list(value) if key in SHARDED_LISTS else value for key, value in metrics.items()}
+        written[filename] = metrics
+        return write_artifact(src_dir, filename, metrics, *args)
+
+    monkeypatch.setattr(changefeed, "write_artifact", capture)
+    return written
+
+
+def _fixture():
+    now = datetime.now() - timedelta(days=1)
+    return {
+        "rewriter": list(conversation_docs(400, seed=3, days=20, now=now)),
+        "adoption": list(conversation_docs(600, seed=4, days=20, now=now, staging=False)),
+        "feedback": list(feedback_docs(300, seed=5, days=20, now=now)),
+    }
+
+
+def _updates(fixture):
+    """Newer versions of some documents already on the feeds."""
+    latest = max(doc["_ts"] for docs in fixture.values() for doc in docs)
+    updates = {
+        "rewriter": [dict(doc, resultCount=0) for doc in fixture["rewriter"][:20]],
+        "adoption": [dict(doc, user_id="returning@example.com") for doc in fixture["adoption"][:30]],
+        "feedback": [dict(doc, feedbackType="thumbsDown") for doc in fixture["feedback"][:15]],
+    }
+    for offset, doc in enumerate(doc for docs in updates.values() for doc in docs):
+        doc["_ts"] = latest + 1 + offset
+    return updates
+
+
+def _latest(*batches):
+    """
+    Latest version of each document across batches, newest first; ties in
+    _ts put the last written first, as the daemon's document table does.
+    """
+    docs = {}
+    for batch in batches:
+        for doc in batch:
+            docs.pop(doc["id"], None)
+            docs[doc["id"]] = doc
+    return sorted(reversed(list(docs.values())), key=lambda doc: doc["_ts"], reverse=True)
+
+
+def _direct(feed, docs):
+    """Metrics calculated straight from documents given newest first, as a fetch reads them."""
+    docs = [doc for doc in docs if FEEDS[feed]["keep"](doc)]
+    accumulator = {
+        "rewriter": RewriterAccumulator,
+        "adoption": AdoptionAccumulator,
+        "feedback": lambda: FeedbackAccumulator(categorized=False),
+    }[feed]()
+    accumulator.add_page(docs)
+    return accumulator.finalize()
+
+
+def _assert_matches(written, expected):
+    for feed, docs in expected.items():
+        metrics = written[FEEDS[feed]["output"]]
+        direct = _direct(feed, docs)
+        metrics["metadata"].pop("generatedAt")
+        direct["metadata"].pop("generatedAt")
+        assert metrics == direct, feed
+
+
+def _drain(daemon, max_polls=50):
+    for _ in range(max_polls):
+        if not daemon.poll():
+            break
+    else:
+        pytest.fail("the change feed never caught up")
+    daemon.flush()
+
+
+def test_daemon_on_fake_feed_matches_direct_calculation(tmp_path, outputs):
+    fixture = _fixture()
+    updates = _updates(fixture)
+    sources = {feed: FakeChangeFeedSource() for feed in fixture}
+    for feed, source in sources.items():
+        source.publish(fixture[feed])
+
+    daemon = MetricsDaemon(sources, str(tmp_path / "src"), debounce=0)
+    _drain(daemon)
+    _assert_matches(outputs, {feed: _latest(docs) for feed, docs in fixture.items()})
+
+    for feed, source in sources.items():
+        source.publish(updates[feed])
+    assert daemon.poll() == sum(len(docs) for docs in updates.values())
+    daemon.flush()
+    daemon.close()
+    _assert_matches(outputs, {feed: _latest(fixture[feed], updates[feed]) for feed in fixture})
+
+    # A restart resumes from the checkpointed continuations
+    restarted = MetricsDaemon(sources, str(tmp_path / "src"), debounce=0)
+    assert restarted.poll() == 0
+    restarted.close()
+
+
+def test_daemon_on_containers_sharing_a_client(tmp_path, outputs):
+    fixture = _fixture()
+    updates = _updates(fixture)
+    containers = {feed: ReplayContainer(docs, name=feed) for feed, docs in fixture.items()}
+    # Production conversations and feedback live on one account, so one
+    # client (and one last_response_headers) serves both containers
+    containers["feedback"].client_connection = containers["adoption"].client_connection
+    sources = {feed: CosmosChangeFeedSource(container, page_size=70) for feed, container in containers.items()}
+
+    daemon = MetricsDaemon(sources, str(tmp_path / "src"), debounce=0)
+    assert daemon.poll() == 70 * len(sources)
+    assert daemon.tokens == {feed: "70" for feed in sources}
+    _drain(daemon)
+    assert daemon.tokens == {feed: str(len(docs)) for feed, docs in fixture.items()}
+    _assert_matches(outputs, {feed: _latest(docs) for feed, docs in fixture.items()})
+
+    for feed, container in containers.items():
+        for doc in updates[feed]:
+            container.upsert_item(doc)
+    _drain(daemon)
+    daemon.close()
+    # Upserts are stamped with the server time
+    stored = {feed: [containers[feed].docs[doc["id"]] for doc in updates[feed]] for feed in fixture}
+    _assert_matches(outputs, {feed: _latest(fixture[feed], stored[feed]) for feed in fixture})
+
+    restarted = MetricsDaemon(sources, str(tmp_path / "src"), debounce=0)
+    assert restarted.poll() == 0
+    restarted.close()
@@ -0,0 +1,71 @@
+"""
+HyperLogLog day sketches (pipeline.hll): counts within the documented error,
+windows merged from day sketches equal to a sketch of the window's users,
+and all-time counts that survive pruning and a save/load round trip.
+"""
+from datetime import datetime
+
+import numpy as np
+
+import pipeline.state
+from pipeline.accumulators import AdoptionAccumulator
+from pipeline.hll import DaySketches, HyperLogLog, hash_user, load_day_sketches, save_day_sketches
+from pipeline.synthetic import conversation_docs
+
+NOW = datetime.now()
+DAYS = ["2026-01-01", "2026-01-02", "2026-01-03", "2026-01-04"]
+
+
+def _hashes(users):
+    return np.array([hash_user(user) for user in users], dtype=np.uint64)
+
+
+def _day_sketches():
+    """Overlapping user sets per day, and the sketches built from them."""
+    users = {day: [f"user{i}@example.com" for i in range(n * 3000, n * 3000 + 5000)] for n, day in enumerate(DAYS)}
+    sketches = DaySketches()
+    for day, day_users in users.items():
+        sketches.add_hashes(day, _hashes(day_users))
+    return users, sketches
+
+
+def test_count_is_within_the_error_bound():
+    sketch = HyperLogLog()
+    sketch.add_hashes(_hashes(f"user{i}" for i in range(50000)))
+    # Four standard errors
+    assert abs(sketch.count() - 50000) <= 4 * sketch.relative_error * 50000
+
+
+def test_window_equals_a_sketch_of_its_users():
+    users, sketches = _day_sketches()
+    for start, end in ((DAYS[1], DAYS[2]), (DAYS[0], None), (None, DAYS[1])):
+        window = HyperLogLog()
+        window.add_hashes(_hashes({user for day, day_users in users.items()
+                                   if (start is None or day >= start) and (end is None or day <= end)
+                                   for user in day_users}))
+        assert np.array_equal(sketches.window(start, end).registers, window.registers)
+
+
+def test_pruned_and_saved_sketches_keep_all_time_counts(tmp_path, monkeypatch):
+    monkeypatch.setattr(pipeline.state, "STATE_DIR", str(tmp_path))
+    _, sketches = _day_sketches()
+    total, recent = sketches.count(), sketches.count(DAYS[2])
+
+    sketches.prune(DAYS[2])
+    assert sorted(sketches.days) == DAYS[2:]
+    save_day_sketches("adoption", sketches)
+    loaded = load_day_sketches("adoption")
+
+    assert (loaded.count(), loaded.count(DAYS[2])) == (total, recent)
+
+
+def test_hll_adoption_total_users_tracks_the_exact_count():
+    docs = sorted(conversation_docs(20000, seed=31, days=60, now=NOW, users=5000, staging=False),
+                  key=lambda doc: doc["_ts"], reverse=True)
+    exact = AdoptionAccumulator(now=NOW)
+    hll = AdoptionAccumulator(now=NOW, distinct="hll")
+    exact.add_page(docs)
+    hll.add_page(docs)
+
+    exact_users, hll_users = exact.finalize()["totalUsers"], hll.finalize()["totalUsers"]
+    assert abs(hll_users - exact_users) <= 4 * hll.day_sketches.window().relative_error * exact_users
@@ -0,0 +1,85 @@
+"""
+An incremental fetch (pipeline.state.fetch_incremental) reads only the
+documents changed since the stored watermark and must end up with the same
+documents, newest first, as fetching the whole container again.
+"""
+from datetime import datetime
+
+import pytest
+
+import pipeline.state
+from pipeline.replay import ReplayContainer
+from pipeline.state import fetch_incremental, load_watermark, merge_into_snapshot
+from pipeline.synthetic import conversation_docs
+from transform_to_dashboard import REWRITER_SELECT, fetch_rewriter_queries
+
+
+@pytest.fixture(autouse=True)
+def state_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(pipeline.state, "STATE_DIR", str(tmp_path))
+
+
+def _fetcher(container, calls):
+    def fetch(since_ts):
+        calls.append(since_ts)
+        return fetch_rewriter_queries(container, since_ts=since_ts)
+    return fetch
+
+
+def _ids_and_ts(docs):
+    return [(doc["id"], doc["_ts"]) for doc in docs]
+
+
+def test_incremental_fetch_matches_a_full_fetch():
+    docs = list(conversation_docs(500, seed=21, days=20, now=datetime.now()))
+    container = ReplayContainer(docs)
+    calls, deltas = [], []
+    on_delta = lambda delta, rebuilt: deltas.append((len(delta), rebuilt))
+
+    first = fetch_incremental("rewriter", _fetcher(container, calls), REWRITER_SELECT, on_delta=on_delta)
+    watermark = load_watermark("rewriter")["ts"]
+    assert calls == [None]
+    assert watermark == max(doc["_ts"] for doc in docs)
+    assert _ids_and_ts(first) == _ids_and_ts(fetch_rewriter_queries(container))
+
+    # Changed documents, a new one, and one written in the watermark's second
+    for doc in docs[:10]:
+        container.upsert_item(dict(doc, resultCount=0))
+    container.upsert_item(dict(docs[0], id="new-doc"))
+    container.docs[docs[20]["id"]]["_ts"] = watermark
+
+    second = fetch_incremental("rewriter", _fetcher(container, calls), REWRITER_SELECT, on_delta=on_delta)
+    assert calls[1] == watermark
+    # The watermark is inclusive: documents of its second come again
+    changed = sum(1 for doc in container.docs.values() if doc["_ts"] >= watermark)
+    assert changed >= 12
+    assert deltas == [(len(first), True), (changed, False)]
+    assert len(second) == len(first) + 1
+    assert sorted(_ids_and_ts(second)) == sorted(_ids_and_ts(fetch_rewriter_queries(container)))
+    assert [doc["_ts"] for doc in second] == sorted((doc["_ts"] for doc in second), reverse=True)
+    assert {doc["id"]: doc for doc in second}[docs[0]["id"]]["resultCount"] == 0
+
+
+def test_changed_signature_rebuilds_the_snapshot():
+    container = ReplayContainer(conversation_docs(100, seed=22, days=10, now=datetime.now()))
+    calls = []
+    fetch_incremental("rewriter", _fetcher(container, calls), REWRITER_SELECT)
+    fetch_incremental("rewriter", _fetcher(container, calls), REWRITER_SELECT + " ")
+    fetch_incremental("rewriter", _fetcher(container, calls), REWRITER_SELECT + " ", full=True)
+    assert calls == [None, None, None]
+
+
+def test_merged_documents_leave_the_watermark_alone():
+    docs = list(conversation_docs(100, seed=23, days=10, now=datetime.now()))
+    container = ReplayContainer(docs)
+    fetch_incremental("rewriter", _fetcher(container, []), REWRITER_SELECT)
+    watermark = load_watermark("rewriter")
+
+    scored = container.upsert_item(dict(docs[5], evaluation_scores={"relevance": 5}), no_response=False)
+    assert merge_into_snapshot("rewriter", [scored]) == 0
+    assert load_watermark("rewriter") == watermark
+
+    # The next incremental fetch brings the same version again and keeps one copy
+    merged = fetch_incremental("rewriter", _fetcher(container, []), REWRITER_SELECT)
+    assert [doc["id"] for doc in merged].count(docs[5]["id"]) == 1
+    assert merged[0]["evaluation_scores"] == {"relevance": 5}
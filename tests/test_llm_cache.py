@@ -0,0 +1,66 @@
+"""
+The persistent LLM cache (pipeline.llm_cache): hits across runs for inputs
+that normalize alike, misses once the prompt template or endpoint changes,
+and least-recently-used eviction past max_entries.
+"""
+import pytest
+
+import pipeline.llm_cache as llm_cache
+from pipeline.llm_cache import LLMCache, prompt_version
+from pipeline.scoring import cached_judge_scores, store_judge_scores
+
+SCORES = {"relevance": 5, "groundedness": 4, "completeness": 3, "reasoning": "ok"}
+
+
+@pytest.fixture(autouse=True)
+def endpoint(monkeypatch):
+    monkeypatch.delenv("LLM_CACHE_ENDPOINT", raising=False)
+    monkeypatch.delenv("LLM_CACHE_DISABLED", raising=False)
+    monkeypatch.setenv("AZURE_OPENAI_ENDPOINT", "https://example.openai.azure.com/")
+
+
+def test_judge_scores_are_served_from_the_cache_across_runs(tmp_path, monkeypatch):
+    path = str(tmp_path / "llm_cache.sqlite")
+    monkeypatch.setattr(llm_cache, "_cache", LLMCache(path))
+    assert cached_judge_scores("DFW10 availability", "Yes.", 3) is None
+    store_judge_scores("DFW10 availability", "Yes.", 3, SCORES)
+
+    # A later run, with whitespace differences only
+    monkeypatch.setattr(llm_cache, "_cache", LLMCache(path))
+    assert cached_judge_scores("  DFW10   availability ", "Yes.\n", 3) == SCORES
+    assert cached_judge_scores("DFW10 availability", "Yes.", 4) is None
+    assert llm_cache._cache.stats() == "1 hits, 1 misses"
+
+
+def test_new_prompt_version_drops_older_entries(tmp_path):
+    cache = LLMCache(str(tmp_path / "llm_cache.sqlite"))
+    old, new = prompt_version("Score {query}"), prompt_version("Score {query} carefully")
+    cache.set("judge", old, "gpt-4.1", SCORES, query="q")
+    cache.set("category", old, "gpt-4.1", "Capacity", comment="c")
+
+    assert cache.get("judge", new, "gpt-4.1", query="q") is None
+    assert cache.get("judge", old, "gpt-4.1", query="q") is None
+    # Other kinds keep their entries
+    assert cache.get("category", old, "gpt-4.1", comment="c") == "Capacity"
+
+
+def test_stub_answers_never_serve_the_live_endpoint(tmp_path, monkeypatch):
+    cache = LLMCache(str(tmp_path / "llm_cache.sqlite"))
+    monkeypatch.setenv("LLM_CACHE_ENDPOINT", "judge-stub")
+    cache.set("judge", "v1", "gpt-4.1", SCORES, query="q")
+    assert cache.get("judge", "v1", "gpt-4.1", query="q") == SCORES
+
+    monkeypatch.delenv("LLM_CACHE_ENDPOINT")
+    assert cache.get("judge", "v1", "gpt-4.1", query="q") is None
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = LLMCache(str(tmp_path / "llm_cache.sqlite"), max_entries=10)
+    for i in range(100):
+        cache.set("judge", "v1", "gpt-4.1", i, query=str(i))
+    assert cache.get("judge", "v1", "gpt-4.1", query="0") == 0
+
+    # The bound is checked every 100 writes
+    cache.set("judge", "v1", "gpt-4.1", 100, query="100")
+    kept = [i for i in range(101) if cache.get("judge", "v1", "gpt-4.1", query=str(i)) is not None]
+    assert kept == [0] + list(range(92, 101))
@@ -0,0 +1,67 @@
+"""
+The quantile sketch (pipeline.quantiles.DDSketch) returns every quantile
+within relative_accuracy of the exact sample value, and merged or
+serialized sketches answer exactly like one built from all the values.
+"""
+import numpy as np
+import pytest
+
+from pipeline.quantiles import QUANTILES, DDSketch, latency_stats
+
+
+def _latencies(count, seed):
+    return np.random.default_rng(seed).lognormal(mean=7, sigma=1.2, size=count)
+
+
+def _exact(values, q):
+    return np.sort(values)[int(q * (len(values) - 1))]
+
+
+@pytest.mark.parametrize("relative_accuracy", [0.01, 0.05])
+def test_quantiles_are_within_the_relative_accuracy(relative_accuracy):
+    values = _latencies(20000, seed=41)
+    sketch = DDSketch(relative_accuracy)
+    sketch.add_many(values)
+    for q in (0.0, 0.25, *QUANTILES.values(), 1.0):
+        exact = _exact(values, q)
+        assert abs(sketch.quantile(q) - exact) <= relative_accuracy * exact
+
+
+def test_add_and_add_many_agree_and_skip_non_positive_values():
+    values = [0, -3, None, 120.5, 80, 80, 4000]
+    one_by_one, vectorized = DDSketch(), DDSketch()
+    for value in values:
+        one_by_one.add(value)
+    vectorized.add_many([value or 0 for value in values])
+    assert one_by_one.to_dict() == vectorized.to_dict()
+    assert one_by_one.count == 4
+
+
+def test_single_value_and_empty_sketch():
+    sketch = DDSketch()
+    assert latency_stats(sketch) == {"min": 0, "max": 0, "avg": 0, "p50": 0, "p90": 0, "p95": 0, "p99": 0}
+    sketch.add(1234.5)
+    # Quantiles are clamped to min/max, so one value comes back exactly
+    assert latency_stats(sketch, target=2000) == {"min": 1234.5, "max": 1234.5, "avg": 1234.5, "p50": 1234.5,
+                                                   "p90": 1234.5, "p95": 1234.5, "p99": 1234.5, "target": 2000}
+
+
+def test_merged_and_restored_sketches_match_a_combined_one():
+    days = [_latencies(5000, seed) for seed in range(5)]
+    combined = DDSketch()
+    combined.add_many(np.concatenate(days))
+    merged = DDSketch()
+    for values in days:
+        day = DDSketch()
+        day.add_many(values)
+        merged.merge(DDSketch.from_dict(day.to_dict()))
+
+    assert merged.bins == combined.bins
+    assert [merged.quantile(q) for q in QUANTILES.values()] == [combined.quantile(q) for q in QUANTILES.values()]
+    assert (merged.count, merged.min, merged.max) == (combined.count, combined.min, combined.max)
+    assert merged.sum == pytest.approx(combined.sum)
+
+
+def test_sketches_of_different_accuracy_do_not_merge():
+    with pytest.raises(ValueError):
+        DDSketch(0.01).merge(DDSketch(0.02))
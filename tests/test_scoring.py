@@ -0,0 +1,147 @@
+"""
+The scoring engine (pipeline.scoring) against the in-process judge stub:
+throttled requests are retried until every document is scored, and request
+starts are paced by the token bucket. Score writes patch only
+evaluation_scores, batched per partition key, and a failed batch falls back
+to patching its documents one by one.
+"""
+import asyncio
+import time
+
+import pytest
+
+import pipeline.scoring as scoring
+from pipeline.judge_stub import serve
+from pipeline.replay import ReplayContainer
+from pipeline.scoring import ScoreWriter, ScoringEngine, TokenBucket, needs_scoring
+
+SCORES = {"relevance": 5, "groundedness": 4, "completeness": 3}
+
+
+def _docs(count):
+    return [{"id": f"doc-{i}", "conversation": f"DFW10 availability {i}", "llm_response": "Yes.",
+             "resultCount": 3} for i in range(count)]
+
+
+@pytest.fixture
+def judge(monkeypatch):
+    """Starts a judge stub; call with its rate_limit (share of requests answered 429)."""
+    servers = []
+
+    def start(rate_limit=0.0):
+        server = serve(port=0, latency_ms=1, rate_limit=rate_limit)
+        servers.append(server)
+        monkeypatch.setenv("AZURE_OPENAI_ENDPOINT", f"http://127.0.0.1:{server.server_address[1]}")
+        monkeypatch.setenv("AZURE_OPENAI_KEY", "stub")
+        monkeypatch.setenv("LLM_CACHE_DISABLED", "1")
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+
+
+def test_throttled_requests_are_retried(judge):
+    judge(rate_limit=0.3)
+    docs = _docs(30)
+    container = ReplayContainer(docs)
+    engine = ScoringEngine(container, max_concurrency=8, requests_per_minute=60000, write_batch_size=7)
+
+    written = asyncio.run(engine.run([dict(doc) for doc in docs]))
+
+    assert engine.retry_count > 0
+    assert engine.failed_count == 0
+    assert sorted(doc["id"] for doc in written) == sorted(doc["id"] for doc in docs)
+    assert not any(needs_scoring(doc) for doc in container.docs.values())
+    assert all(set(doc["evaluation_scores"]) >= {"relevance", "groundedness", "completeness"}
+               for doc in container.docs.values())
+
+
+def test_exhausted_retries_leave_documents_unscored(judge):
+    judge(rate_limit=1.0)
+    container = ReplayContainer(_docs(3))
+    engine = ScoringEngine(container, max_concurrency=3, requests_per_minute=60000, max_retries=1)
+
+    assert asyncio.run(engine.run(_docs(3))) == []
+    assert engine.failed_count == 3
+    assert all(needs_scoring(doc) for doc in container.docs.values())
+
+
+def test_token_bucket_paces_requests():
+    async def take(bucket, count):
+        start = time.monotonic()
+        for _ in range(count):
+            await bucket.acquire()
+        return time.monotonic() - start
+
+    # The burst of `capacity` is free; the next ten wait 1/rate each
+    assert asyncio.run(take(TokenBucket(rate=50, capacity=5), 5)) < 0.05
+    assert asyncio.run(take(TokenBucket(rate=50, capacity=5), 15)) >= 10 / 50 * 0.9
+
+
+def _user_docs():
+    """Twelve stored conversations of two users, and their scored copies."""
+    stored = [dict(doc, user_id=f"user{i % 2}@example.com") for i, doc in enumerate(_docs(12))]
+    # Fields changed locally must not reach the container
+    scored = [dict(doc, evaluation_scores=dict(SCORES), llm_response="changed") for doc in stored]
+    return stored, scored
+
+
+def _calls(container, monkeypatch):
+    """Counts the container's write calls by method name."""
+    calls = {"execute_item_batch": 0, "patch_item": 0, "upsert_item": 0}
+    for name in calls:
+        def counted(*args, _name=name, _method=getattr(container, name), **kwargs):
+            calls[_name] += 1
+            return _method(*args, **kwargs)
+        monkeypatch.setattr(container, name, counted)
+    return calls
+
+
+def test_scores_are_patched_in_batches_per_partition_key(monkeypatch):
+    monkeypatch.setattr(scoring, "MAX_BATCH_OPERATIONS", 4)
+    stored, scored = _user_docs()
+    container = ReplayContainer(stored, partition_key="/user_id")
+    calls = _calls(container, monkeypatch)
+    writer = ScoreWriter(container)
+
+    written = writer.write(scored)
+
+    # Six documents per user in batches of four
+    assert calls == {"execute_item_batch": 4, "patch_item": 0, "upsert_item": 0}
+    assert sorted(doc["id"] for doc in written) == sorted(doc["id"] for doc in stored)
+    assert all("_ts" in doc for doc in written)
+    assert [container.docs[doc["id"]] for doc in stored] == \
+        [dict(doc, evaluation_scores=SCORES, _ts=container.docs[doc["id"]]["_ts"]) for doc in stored]
+    assert writer.verify(scored) == []
+
+
+def test_failed_batch_falls_back_to_one_by_one(monkeypatch):
+    stored, scored = _user_docs()
+    container = ReplayContainer(stored, partition_key="/user_id")
+    # Deleted since it was read
+    del container.docs[stored[0]["id"]]
+    calls = _calls(container, monkeypatch)
+    writer = ScoreWriter(container)
+
+    written = writer.write(scored)
+
+    # user0's batch fails and its six documents are patched one at a time
+    assert calls == {"execute_item_batch": 2, "patch_item": 6, "upsert_item": 0}
+    assert sorted(doc["id"] for doc in written) == sorted(doc["id"] for doc in stored[1:])
+    assert all(container.docs[doc["id"]]["evaluation_scores"] == SCORES for doc in stored[1:])
+    assert stored[0]["id"] not in container.docs
+    assert writer.verify(scored) == [stored[0]["id"]]
+
+
+def test_documents_without_their_partition_key_are_upserted(monkeypatch):
+    stored, scored = _user_docs()
+    unkeyed = {key: value for key, value in scored[0].items() if key != "user_id"}
+    container = ReplayContainer(stored, partition_key="/user_id")
+    calls = _calls(container, monkeypatch)
+
+    written = ScoreWriter(container).write([unkeyed, scored[1], scored[3]])
+
+    assert calls == {"execute_item_batch": 1, "patch_item": 0, "upsert_item": 1}
+    assert [doc["id"] for doc in written] == [unkeyed["id"], scored[1]["id"], scored[3]["id"]]
+    assert container.docs[unkeyed["id"]]["evaluation_scores"] == SCORES
@@ -0,0 +1,55 @@
+"""
+Metrics computed across worker processes (pipeline.sharding) must serialize
+to exactly the bytes of the single-process JSON.
+"""
+from datetime import datetime
+
+import pytest
+
+import pipeline.sharding as sharding
+from pipeline.accumulators import AdoptionAccumulator, FeedbackAccumulator, RewriterAccumulator
+from pipeline.artifacts import dumps
+from pipeline.sharding import compute_sharded
+from pipeline.synthetic import conversation_docs, feedback_docs
+from transform_to_dashboard import parse_args
+
+NOW = datetime.now()
+
+
+def _newest_first(docs):
+    return sorted(docs, key=lambda doc: doc["_ts"], reverse=True)
+
+
+FACTORIES = {
+    "rewriter": (lambda: _newest_first(conversation_docs(4000, seed=11, days=30, now=NOW)),
+                 RewriterAccumulator),
+    "adoption": (lambda: _newest_first(conversation_docs(4000, seed=12, days=60, now=NOW, staging=False)),
+                 lambda: AdoptionAccumulator(now=NOW)),
+    "adoption-hll": (lambda: _newest_first(conversation_docs(4000, seed=12, days=60, now=NOW, staging=False)),
+                     lambda: AdoptionAccumulator(now=NOW, distinct="hll")),
+    "feedback": (lambda: _newest_first(feedback_docs(3000, seed=13, days=60, now=NOW)),
+                 lambda: FeedbackAccumulator(categorized=False, now=NOW)),
+}
+
+
+def _json(accumulator):
+    metrics = accumulator.finalize()
+    metrics["metadata"].pop("generatedAt")
+    return dumps(metrics)
+
+
+@pytest.mark.parametrize("name", sorted(FACTORIES))
+def test_sharded_json_is_identical(name, monkeypatch):
+    monkeypatch.setattr(sharding, "MIN_SHARD_DOCS", 500)
+    assert sharding._can_fork()
+    docs, factory = FACTORIES[name]
+    docs = docs()
+
+    single = _json(compute_sharded(docs, factory, workers=1))
+    assert _json(compute_sharded(docs, factory, workers=4)) == single
+
+
+def test_workers_imply_sequential_stages():
+    assert parse_args(["--workers", "4"]).sequential
+    assert parse_args(["--workers", "0"]).sequential
+    assert not parse_args([]).sequential
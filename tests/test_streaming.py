@@ -0,0 +1,95 @@
+"""
+A streamed run keeps capped heaps in its checkpoints and the whole query
+lists in list spools; after a crash and resume the spooled lists must still
+equal what an uncapped accumulator builds. Checkpoints are JSON: every
+accumulator must resume from its to_state() exactly where it stopped.
+"""
+import json
+from datetime import datetime
+
+import pytest
+
+import pipeline.state
+from pipeline.accumulators import AdoptionAccumulator, FeedbackAccumulator, RewriterAccumulator
+from pipeline.artifacts import ListSpool
+from pipeline.replay import ReplayContainer
+from pipeline.streaming import stream_into
+from pipeline.synthetic import conversation_docs, feedback_docs
+
+QUERY = "SELECT * FROM c WHERE IS_DEFINED(c.query_rewrite_telemetry) ORDER BY c._ts DESC"
+LISTS = ("rewrittenQueries", "zeroResultQueries")
+
+
+def _accumulator(tmp_path):
+    return RewriterAccumulator(query_limit=50, zero_limit=30,
+                               spools={name: ListSpool(str(tmp_path / f"{name}.spool.jsonl")) for name in LISTS})
+
+
+def test_resumed_stream_spools_whole_lists(tmp_path, monkeypatch):
+    monkeypatch.setattr(pipeline.state, "STATE_DIR", str(tmp_path))
+    docs = list(conversation_docs(3000, seed=1, days=30, now=datetime.now()))
+    container = ReplayContainer(docs)
+
+    pages = []
+
+    def crash(page):
+        pages.append(page)
+        if len(pages) == 4:
+            raise RuntimeError("crash")
+        return page
+
+    with pytest.raises(RuntimeError):
+        stream_into("rewriter", container, QUERY, _accumulator(tmp_path), on_page=crash, page_size=250)
+    # Entries appended after the last checkpoint are dropped on resume
+    with open(tmp_path / "zeroResultQueries.spool.jsonl", "ab") as f:
+        f.write(b'[0, 0, {"id": "stale"}]\n')
+
+    accumulator = stream_into("rewriter", container, QUERY, _accumulator(tmp_path), page_size=250)
+
+    uncapped = RewriterAccumulator()
+    uncapped.add_page(sorted(docs, key=lambda doc: doc["_ts"], reverse=True))
+    assert list(accumulator.spools["rewrittenQueries"].items()) == uncapped.rewritten_queries
+    assert list(accumulator.spools["zeroResultQueries"].items()) == uncapped.zero_result_queries
+    assert accumulator.rewritten_queries == uncapped.rewritten_queries[:50]
+    assert accumulator.finalize()["summary"] == uncapped.finalize()["summary"]
+
+
+CHECKPOINTED = {
+    "rewriter": (lambda now: conversation_docs(2000, seed=2, days=30, now=now),
+                 lambda now: RewriterAccumulator(query_limit=40, zero_limit=20)),
+    "adoption": (lambda now: conversation_docs(2000, seed=3, days=60, now=now, staging=False),
+                 lambda now: AdoptionAccumulator(now=now)),
+    "adoption-hll": (lambda now: conversation_docs(2000, seed=3, days=60, now=now, staging=False),
+                     lambda now: AdoptionAccumulator(now=now, distinct="hll", max_users=20)),
+    "feedback": (lambda now: feedback_docs(1500, seed=4, days=60, now=now),
+                 lambda now: FeedbackAccumulator(categorized=False, items_limit=25, now=now)),
+}
+
+
+@pytest.mark.parametrize("name", sorted(CHECKPOINTED))
+def test_accumulator_state_round_trips_through_json(name):
+    now = datetime.now()
+    docs, factory = CHECKPOINTED[name]
+    docs = sorted(docs(now), key=lambda doc: doc["_ts"], reverse=True)
+
+    uninterrupted = factory(now)
+    uninterrupted.add_page(docs)
+
+    resumed = factory(now)
+    resumed.add_page(docs[:700])
+    resumed = type(resumed).from_state(json.loads(json.dumps(resumed.to_state())))
+    resumed.add_page(docs[700:])
+
+    expected, actual = uninterrupted.finalize(), resumed.finalize()
+    expected["metadata"].pop("generatedAt")
+    actual["metadata"].pop("generatedAt")
+    assert actual == expected
+
+
+def test_checkpoint_of_another_version_is_ignored(tmp_path, monkeypatch):
+    monkeypatch.setattr(pipeline.state, "STATE_DIR", str(tmp_path))
+    pipeline.state.save_checkpoint("rewriter", QUERY, "250", RewriterAccumulator(), 1)
+    assert pipeline.state.load_checkpoint("rewriter", QUERY)["continuation"] == "250"
+
+    monkeypatch.setattr(pipeline.state, "CHECKPOINT_VERSION", pipeline.state.CHECKPOINT_VERSION + 1)
+    assert pipeline.state.load_checkpoint("rewriter", QUERY) is None
@@ -1,71 +1,52 @@
 import os
-import json
+import argparse
 from datetime import datetime, timedelta
-from collections import defaultdict
-from azure.cosmos import CosmosClient
 from dotenv import load_dotenv
+from pipeline.state import fetch_incremental, merge_into_snapshot
+from pipeline import state
+from pipeline.replay import open_container
+from pipeline.streaming import stream_into
+from pipeline.feedranges import query_all
+from pipeline.stages import run_stages
+from pipeline.sharding import compute_sharded
+from pipeline.instrumentation import step, record, cosmos_hook, write_report, summary_lines
+from pipeline.accumulators import RewriterAccumulator, AdoptionAccumulator, FeedbackAccumulator
+from pipeline.hll import load_day_sketches, save_day_sketches
+from pipeline.rollups import RollupStore
+from pipeline.changefeed import CosmosChangeFeedSource, MetricsDaemon
+from pipeline.artifacts import write_artifact, default_shard_dir, DEFAULT_PAGE_SIZE, ListSpool
+from pipeline.pushdown import pushdown_adoption_metrics, adoption_parity
+from pipeline.scoring import needs_scoring, score_documents
+from pipeline.llm_cache import get_cache, normalize_text
+from pipeline.categorizer import (
+    CATEGORY_PROMPT_VERSION, DEFAULT_FAST_PATH_THRESHOLD, KeywordClassifier, categorize_comments,
+    collect_entity_vocabulary, save_entity_vocabulary, load_entity_vocabulary, record_labels
+)
 
 load_dotenv()
 
-# =============================================================================
-# ANSWER SCORER (embedded to avoid import issues)
-# =============================================================================
-
-def score_answer(query: str, answer: str, result_count: int) -> dict:
-    """
-    Score an answer using LLM-as-judge (reference-free).
-    Returns relevance, groundedness, completeness scores (1-5).
-    """
-    from openai import AzureOpenAI
-    
-    client = AzureOpenAI(
-        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
-        api_key=os.getenv("AZURE_OPENAI_KEY"),
-        api_version="2024-10-21"
-    )
-    
-    prompt = f"""You are an expert evaluator for a data center AI assistant.
-
-Score this response on three dimensions (1-5 scale):
-
-QUERY: {query}
-ANSWER: {answer}
-DOCUMENTS RETRIEVED: {result_count}
-
-Score each dimension:
-1. RELEVANCE: Does the answer address what was asked? (1=off-topic, 5=perfectly relevant)
-2. GROUNDEDNESS: Does the answer seem based on retrieved documents, not hallucinated? (1=made up, 5=well-grounded)
-3. COMPLETENESS: Is the answer thorough enough? (1=too brief, 5=comprehensive)
-
-Respond in this exact JSON format only:
-{{"relevance": X, "groundedness": X, "completeness": X, "reasoning": "brief explanation"}}
-"""
-
-    try:
-        response = client.chat.completions.create(
-            model=os.getenv("AZURE_OPENAI_DEPLOYMENT", "gpt-4.1"),
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0,
-            max_tokens=200
-        )
-        
-        result = json.loads(response.choices[0].message.content)
-        return result
-        
-    except Exception as e:
-        print(f"Scoring error: {e}")
-        return {"relevance": 0, "groundedness": 0, "completeness": 0, "reasoning": f"Error: {e}"}
-
-
 # =============================================================================
 # AI FEEDBACK CATEGORIZER
 # =============================================================================
 
-def categorize_feedback_with_ai(feedback_items: list) -> list:
+def categorize_feedback_with_ai(feedback_items: list, batch_size: int = 20,
+                                fast_path_threshold: float = DEFAULT_FAST_PATH_THRESHOLD,
+                                vocabulary: dict = None) -> list:
     """
     Use GPT to categorize feedback comments into themes.
     Categories: ServiceFabric, Capacity, Connectivity, General Info, Out-of-Scope, Other
+    Comments with obvious signal words or ontology entities are labelled locally
+    when the keyword classifier is at least fast_path_threshold confident
+    (None disables this); its ontology entities come from `vocabulary`, or
+    the saved entity vocabulary when not given. The rest go to GPT
+    batch_size at a time (see pipeline.categorizer); results are cached by
+    normalized comment, so reruns only pay for new comments.
     """
+    with step("categorize"):
+        return _categorize_feedback(feedback_items, batch_size, fast_path_threshold, vocabulary)
+
+
+def _categorize_feedback(feedback_items, batch_size, fast_path_threshold, vocabulary):
     from openai import AzureOpenAI
     
     client = AzureOpenAI(
@@ -73,132 +54,107 @@ def categorize_feedback_with_ai(feedback_items: list) -> list:
         api_key=os.getenv("AZURE_OPENAI_KEY"),
         api_version="2024-10-21"
     )
+    cache = get_cache()
+    deployment = os.getenv("AZURE_OPENAI_DEPLOYMENT", "gpt-4.1")
     
-    categorized = []
+    if vocabulary is None and fast_path_threshold is not None:
+        vocabulary = load_entity_vocabulary()
+    classifier = KeywordClassifier(vocabulary) if fast_path_threshold is not None else None
+    fast_path_count = 0
     
+    # Group items by normalized comment so duplicates cost one label
+    pending = {}
     for item in feedback_items:
         comment = item.get('comment', '')
         
         if not comment or len(comment) < 3:
             item['category'] = 'Other'
-            categorized.append(item)
             continue
         
-        prompt = f"""Categorize this data center chatbot query into ONE category:
-
-QUERY: {comment}
-
-Categories:
-- ServiceFabric: Questions about ServiceFabric/SF product
-- Capacity: Questions about power, space, MW, kW, availability
-- Connectivity: Questions about network, Metro Connect, NSPs, cloud
-- Facilities: Questions about specific sites, locations, data centers
-- General Info: General questions about Digital Realty
-- Out-of-Scope: Not related to data centers (HR, jokes, document creation)
-- Other: Doesn't fit above categories
-
-Respond with ONLY the category name, nothing else."""
-
-        try:
-            response = client.chat.completions.create(
-                model=os.getenv("AZURE_OPENAI_DEPLOYMENT", "gpt-4.1"),
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0,
-                max_tokens=20
-            )
-            
-            category = response.choices[0].message.content.strip()
-            # Validate category
-            valid_categories = ['ServiceFabric', 'Capacity', 'Connectivity', 'Facilities', 'General Info', 'Out-of-Scope', 'Other']
-            if category not in valid_categories:
-                category = 'Other'
-            
-            item['category'] = category
-            
-        except Exception as e:
-            print(f"Categorization error: {e}")
-            item['category'] = 'Other'
+        if classifier:
+            category, confidence = classifier.classify(comment)
+            if category and confidence >= fast_path_threshold:
+                item['category'] = category
+                fast_path_count += 1
+                continue
+        
+        key = normalize_text(comment, lower=True)
+        cached = cache.get("category", CATEGORY_PROMPT_VERSION, deployment, comment=key) if cache else None
+        if cached is not None:
+            item['category'] = cached
+            record(cache_hits=1)
+        else:
+            pending.setdefault(key, []).append(item)
+    
+    if pending:
+        comments = [items[0].get('comment', '') for items in pending.values()]
+        labels = categorize_comments(client, deployment, comments, batch_size=batch_size)
         
-        categorized.append(item)
+        for (key, items), category in zip(pending.items(), labels):
+            for item in items:
+                item['category'] = category or 'Other'
+            # A failed request (None) is shown as Other but never cached or
+            # recorded, so the next run asks again
+            if cache and category is not None:
+                cache.set("category", CATEGORY_PROMPT_VERSION, deployment, category, comment=key)
+        
+        record_labels((comment, category) for comment, category in zip(comments, labels) if category is not None)
+    
+    if classifier:
+        print(f"Fast path labelled {fast_path_count}/{len(feedback_items)} comments locally")
+    if cache:
+        print(f"Categorization cache: {cache.stats()}")
     
-    return categorized
+    return feedback_items
 
 
 # =============================================================================
 # COSMOS DB CONNECTIONS
 # =============================================================================
 
+# Clients come from a registry keyed by endpoint, so the two prod containers
+# share one client and connection pool. With --replay every connect returns
+# an in-memory fixture container instead (see pipeline.replay).
+
 def connect_to_cosmos_staging():
     """Connect to Cosmos DB (Staging) for query rewriter data."""
-    client = CosmosClient(
-        os.getenv("COSMOS_ENDPOINT"),
-        credential=os.getenv("COSMOS_KEY")
-    )
-    database = client.get_database_client("history")
-    container = database.get_container_client("conversation")
-    return container
+    return open_container("staging_conversation", os.getenv("COSMOS_ENDPOINT"), os.getenv("COSMOS_KEY"),
+                          "history", "conversation")
 
 
 def connect_to_cosmos_prod():
     """Connect to Production Cosmos DB for adoption metrics."""
-    client = CosmosClient(
-        os.getenv("COSMOS_PROD_ENDPOINT"),
-        credential=os.getenv("COSMOS_PROD_KEY")
-    )
-    database = client.get_database_client("history")
-    container = database.get_container_client("conversation")
-    return container
+    return open_container("prod_conversation", os.getenv("COSMOS_PROD_ENDPOINT"), os.getenv("COSMOS_PROD_KEY"),
+                          "history", "conversation")
 
 
 def connect_to_cosmos_prod_feedback():
     """Connect to Production Cosmos DB feedback container."""
-    client = CosmosClient(
-        os.getenv("COSMOS_PROD_ENDPOINT"),
-        credential=os.getenv("COSMOS_PROD_KEY")
-    )
-    database = client.get_database_client("history")
-    container = database.get_container_client("feedback")
-    return container
+    return open_container("prod_feedback", os.getenv("COSMOS_PROD_ENDPOINT"), os.getenv("COSMOS_PROD_KEY"),
+                          "history", "feedback")
 
 
 # =============================================================================
 # DATA FETCHING
 # =============================================================================
 
-def fetch_rewriter_queries(container):
-    """Fetch all queries that have query rewrite telemetry."""
-    query = """
-    SELECT * FROM c 
-    WHERE IS_DEFINED(c.query_rewrite_telemetry)
-    ORDER BY c._ts DESC
-    """
-    results = list(container.query_items(query, enable_cross_partition_query=True))
-    print(f"Fetched {len(results)} queries with rewrite telemetry")
-    return results
+def projection(fields, computed=None):
+    """SELECT list for just the given top-level document fields, plus computed columns by alias."""
+    columns = [f"c.{field}" for field in fields]
+    columns += [f"{expression} AS {alias}" for alias, expression in (computed or {}).items()]
+    return "SELECT " + ", ".join(columns) + " FROM c"
 
 
-def fetch_all_queries_for_adoption(container, days=None):
-    """Fetch all queries from production for adoption metrics."""
-    
-    if days:
-        cutoff = datetime.now() - timedelta(days=days)
-        cutoff_ts = int(cutoff.timestamp())
-        query = f"""
-        SELECT 
-            c.user_id,
-            c.user_name,
-            c.timestamp,
-            c._ts,
-            c.conversation_id,
-            c.conversation,
-            c.llm_telemetry
-        FROM c 
-        WHERE c._ts >= {cutoff_ts}
-        ORDER BY c._ts DESC
-        """
-    else:
-        query = """
-        SELECT 
+# Projections are part of the incremental snapshot signature: changing one
+# forces a full rebuild of that container's snapshot. Rewriter and feedback
+# fetch only the fields their accumulators read; the few documents that need
+# scoring are fetched in full by fetch_full_documents. hasAnswer keeps
+# documents without an llm_response from being fetched in full every run
+# only for needs_scoring to drop them.
+REWRITER_SELECT = projection(RewriterAccumulator.FIELDS, computed={"hasAnswer": "IS_DEFINED(c.llm_response)"})
+
+ADOPTION_SELECT = """SELECT 
+            c.id,
             c.user_id,
             c.user_name,
             c.timestamp,
@@ -206,33 +162,107 @@ def fetch_all_queries_for_adoption(container, days=None):
             c.conversation_id,
             c.conversation,
             c.llm_telemetry
-        FROM c 
-        ORDER BY c._ts DESC
-        """
-    
-    results = list(container.query_items(query, enable_cross_partition_query=True))
-    print(f"Fetched {len(results)} total queries for adoption")
-    return results
+        FROM c"""
+
+FEEDBACK_SELECT = projection(FeedbackAccumulator.FIELDS)
 
 
-def fetch_feedback(container, days=None):
-    """Fetch feedback from production feedback container."""
+def build_where(conditions, days=None, since_ts=None):
+    """Build a WHERE clause and query parameters from base conditions and _ts bounds."""
+    conditions = list(conditions)
+    parameters = []
     
     if days:
         cutoff = datetime.now() - timedelta(days=days)
-        cutoff_ts = int(cutoff.timestamp())
-        query = f"""
-        SELECT * FROM c 
-        WHERE c._ts >= {cutoff_ts}
-        ORDER BY c._ts DESC
+        conditions.append("c._ts >= @cutoff_ts")
+        parameters.append({"name": "@cutoff_ts", "value": int(cutoff.timestamp())})
+    
+    if since_ts:
+        conditions.append("c._ts >= @since_ts")
+        parameters.append({"name": "@since_ts", "value": int(since_ts)})
+    
+    where = "WHERE " + " AND ".join(conditions) if conditions else ""
+    return where, parameters
+
+
+# Server-side ordering costs RUs and a gateway merge-sort across partitions.
+# With ordered=False the queries drop it: the incremental snapshot is sorted
+# client-side anyway and the accumulators keep their lists newest first by
+# _ts whatever the arrival order, so only ties between equal _ts (and between
+# equal counts) may come out in a different order.
+ORDER_BY_TS = "ORDER BY c._ts DESC"
+
+
+def rewriter_query(since_ts=None, ordered=True):
+    """Query and parameters for documents with query rewrite telemetry."""
+    where, parameters = build_where(["IS_DEFINED(c.query_rewrite_telemetry)"], since_ts=since_ts)
+    query = f"""
+    {REWRITER_SELECT} 
+    {where}
+    {ORDER_BY_TS if ordered else ""}
+    """
+    return query, parameters
+
+
+def adoption_query(days=None, since_ts=None, ordered=True):
+    """Query and parameters for production conversations."""
+    where, parameters = build_where([], days=days, since_ts=since_ts)
+    query = f"""
+        {ADOPTION_SELECT} 
+        {where}
+        {ORDER_BY_TS if ordered else ""}
         """
-    else:
-        query = """
-        SELECT * FROM c 
-        ORDER BY c._ts DESC
+    return query, parameters
+
+
+def feedback_query(days=None, since_ts=None, ordered=True):
+    """Query and parameters for production feedback."""
+    where, parameters = build_where([], days=days, since_ts=since_ts)
+    query = f"""
+        {FEEDBACK_SELECT} 
+        {where}
+        {ORDER_BY_TS if ordered else ""}
         """
-    
-    results = list(container.query_items(query, enable_cross_partition_query=True))
+    return query, parameters
+
+
+def fetch_rewriter_queries(container, since_ts=None, parallelism=1, ordered=True):
+    """Fetch all queries that have query rewrite telemetry (parallelism > 1 reads feed ranges concurrently)."""
+    query, parameters = rewriter_query(since_ts=since_ts, ordered=ordered)
+    results = query_all(container, query, parameters, parallelism, newest_first=ordered)
+    record(documents=len(results))
+    print(f"Fetched {len(results)} queries with rewrite telemetry")
+    return results
+
+
+def fetch_all_queries_for_adoption(container, days=None, since_ts=None, parallelism=1, ordered=True):
+    """Fetch all queries from production for adoption metrics (parallelism > 1 reads feed ranges concurrently)."""
+    query, parameters = adoption_query(days=days, since_ts=since_ts, ordered=ordered)
+    results = query_all(container, query, parameters, parallelism, newest_first=ordered)
+    record(documents=len(results))
+    print(f"Fetched {len(results)} total queries for adoption")
+    return results
+
+
+def fetch_full_documents(container, ids, chunk_size=100):
+    """Fetch complete documents by id, chunk_size ids per query."""
+    results = []
+    for start in range(0, len(ids), chunk_size):
+        results.extend(container.query_items(
+            "SELECT * FROM c WHERE ARRAY_CONTAINS(@ids, c.id)",
+            parameters=[{"name": "@ids", "value": ids[start:start + chunk_size]}],
+            enable_cross_partition_query=True,
+            response_hook=cosmos_hook()
+        ))
+    record(documents=len(results))
+    return results
+
+
+def fetch_feedback(container, days=None, since_ts=None, parallelism=1, ordered=True):
+    """Fetch feedback from production feedback container (parallelism > 1 reads feed ranges concurrently)."""
+    query, parameters = feedback_query(days=days, since_ts=since_ts, ordered=ordered)
+    results = query_all(container, query, parameters, parallelism, newest_first=ordered)
+    record(documents=len(results))
     print(f"Fetched {len(results)} feedback items")
     return results
 
@@ -241,441 +271,580 @@ def fetch_feedback(container, days=None):
 # SCORING
 # =============================================================================
 
-def score_unscored_queries(raw_data, container):
-    """Score queries that don't have evaluation scores yet."""
-    scored_count = 0
+def score_unscored_queries(raw_data, container, max_concurrency=8, requests_per_minute=300, verify=False):
+    """
+    Score queries that don't have evaluation scores yet.
+    Runs the judge concurrently (see pipeline.scoring.ScoringEngine); scores are
+    written back to Cosmos and merged into the documents in raw_data.
+    raw_data holds projected documents, so the candidates (those with an
+    answer, per hasAnswer) are fetched in full first for the judge's
+    llm_response. Only /evaluation_scores is written
+    back, as patches batched per partition key (pipeline.scoring.ScoreWriter);
+    verify re-reads just the written documents by point read.
+    Returns the documents of raw_data that were scored and written, carrying
+    their scores and the _ts the write gave them, i.e. as a refetch would
+    return them. A document whose write came back without a body still gets
+    its scores but is not returned: without its new _ts it is left for the
+    next incremental fetch.
+    """
+    with step("score"):
+        return _score_unscored(raw_data, container, max_concurrency, requests_per_minute, verify)
+
+
+def has_answer(doc) -> bool:
+    """hasAnswer of the rewriter projection; full documents (the change feed's) carry the answer itself."""
+    return doc.get('hasAnswer', bool(doc.get('llm_response')))
+
+
+def _score_unscored(raw_data, container, max_concurrency, requests_per_minute, verify):
+    candidates = {doc['id']: doc for doc in raw_data
+                  if not doc.get('evaluation_scores') and doc.get('conversation') and has_answer(doc)}
+    if not candidates:
+        return []
     
-    for doc in raw_data:
-        if doc.get('evaluation_scores'):
-            continue
-        
-        query = doc.get('conversation', '')
-        answer = doc.get('llm_response', '')
-        result_count = doc.get('resultCount', 0)
-        
-        if not query or not answer:
-            continue
-        
-        scores = score_answer(query, answer, result_count)
-        
-        doc['evaluation_scores'] = scores
-        
-        try:
-            container.upsert_item(doc)
-            scored_count += 1
-        except Exception as e:
-            print(f"Failed to update doc: {e}")
+    unscored = [doc for doc in fetch_full_documents(container, list(candidates)) if needs_scoring(doc)]
+    if not unscored:
+        return []
+    
+    print(f"Scoring {len(unscored)} queries (max concurrency {max_concurrency})...")
+    written = score_documents(unscored, container, max_concurrency=max_concurrency,
+                              requests_per_minute=requests_per_minute, verify=verify)
     
-    return scored_count
+    enriched = []
+    for stored in written:
+        doc = candidates.get(stored['id'])
+        if doc is None:
+            continue
+        doc['evaluation_scores'] = stored['evaluation_scores']
+        if stored.get('_ts', doc.get('_ts')) != doc.get('_ts'):
+            doc['_ts'] = stored['_ts']
+            enriched.append(doc)
+    return enriched
 
 
 # =============================================================================
 # ADOPTION METRICS CALCULATION
 # =============================================================================
 
-def calculate_adoption_metrics(raw_data):
-    """Calculate WAU, MAU, retention, and usage trends."""
-    now = datetime.now()
-    
-    # Extract user IDs and timestamps
-    user_queries = []
-    for doc in raw_data:
-        user_id = doc.get('user_id') or doc.get('user_name') or 'anonymous'
-        ts = doc.get('_ts', 0)
-        query_time = datetime.fromtimestamp(ts) if ts else None
-        
-        if query_time:
-            user_queries.append({
-                'user_id': user_id,
-                'timestamp': query_time,
-                'response_time': (doc.get('llm_telemetry') or {}).get('response_time_ms', 0)
-            })
-    
-    if not user_queries:
-        return {
-            "wau": 0, "mau": 0, "stickiness": 0, "totalQueries": 0,
-            "queriesPerUser": 0, "avgResponseTimeMs": 0,
-            "peakHour": 0, "queryTrend": [], "topUsers": [], "totalUsers": 0
-        }
-    
-    # --- WAU / MAU ---
-    week_ago = now - timedelta(days=7)
-    month_ago = now - timedelta(days=30)
-    
-    wau_users = set(q['user_id'] for q in user_queries if q['timestamp'] >= week_ago)
-    mau_users = set(q['user_id'] for q in user_queries if q['timestamp'] >= month_ago)
-    
-    wau = len(wau_users)
-    mau = len(mau_users)
-    stickiness = round((wau / mau * 100), 1) if mau > 0 else 0
-    
-    # --- Daily Query Volume (last 30 days) ---
-    daily_counts = defaultdict(int)
-    for q in user_queries:
-        if q['timestamp'] >= month_ago:
-            day_key = q['timestamp'].strftime('%Y-%m-%d')
-            daily_counts[day_key] += 1
-    
-    sorted_days = sorted(daily_counts.items())
-    query_trend = [{"date": d, "count": c} for d, c in sorted_days]
-    
-    # --- Queries per User ---
-    user_query_counts = defaultdict(int)
-    for q in user_queries:
-        user_query_counts[q['user_id']] += 1
-    
-    total_users = len(set(q['user_id'] for q in user_queries))
-    queries_per_user = round(len(user_queries) / total_users, 1) if total_users > 0 else 0
-    
-    # --- Response Time Stats ---
-    response_times = [q['response_time'] for q in user_queries if q['response_time'] and q['response_time'] > 0]
-    avg_response_time = round(sum(response_times) / len(response_times), 0) if response_times else 0
-    
-    # --- Peak Hours ---
-    hour_counts = defaultdict(int)
-    for q in user_queries:
-        hour_counts[q['timestamp'].hour] += 1
-    peak_hour = max(hour_counts, key=hour_counts.get) if hour_counts else 0
-    
-    # --- Top Users (anonymized) ---
-    top_users = []
-    for user_id, count in sorted(user_query_counts.items(), key=lambda x: -x[1])[:10]:
-        display_name = user_id[:8] + "..." if len(str(user_id)) > 8 else str(user_id)
-        top_users.append({"user": display_name, "queries": count})
-    
-    return {
-        "wau": wau,
-        "mau": mau,
-        "stickiness": stickiness,
-        "totalQueries": len(user_queries),
-        "totalUsers": total_users,
-        "queriesPerUser": queries_per_user,
-        "avgResponseTimeMs": avg_response_time,
-        "peakHour": peak_hour,
-        "queryTrend": query_trend,
-        "topUsers": top_users,
-        "metadata": {
-            "generatedAt": datetime.now().isoformat(),
-            "dataSource": "production"
-        }
-    }
+def adoption_accumulator(distinct="exact"):
+    """
+    New adoption accumulator. In "hll" mode it starts from the day sketches
+    saved by earlier runs, so distinct counts merge across runs.
+    """
+    if distinct == "hll":
+        return AdoptionAccumulator(distinct="hll", day_sketches=load_day_sketches("prod_adoption"))
+    return AdoptionAccumulator()
+
+
+def finalize_adoption(accumulator):
+    if accumulator.distinct == "hll":
+        # Only the MAU window needs per-day sketches; older days fold into
+        # one sketch that still counts toward totalUsers
+        accumulator.day_sketches.prune((accumulator.now - timedelta(days=29)).strftime('%Y-%m-%d'))
+        save_day_sketches("prod_adoption", accumulator.day_sketches)
+    return accumulator.finalize()
+
+
+def calculate_adoption_metrics(raw_data, distinct="exact", workers=1):
+    """Calculate WAU, MAU, retention, and usage trends (over `workers` processes)."""
+    accumulator = adoption_accumulator(distinct)
+    compute_sharded(raw_data, lambda: AdoptionAccumulator(now=accumulator.now, distinct=distinct),
+                    workers, base=accumulator)
+    return finalize_adoption(accumulator)
 
 
 # =============================================================================
 # QUERY REWRITER METRICS (replaces A/B test)
 # =============================================================================
 
-def calculate_rewriter_metrics(raw_data):
-    """Calculate query rewriter effectiveness metrics."""
-    
-    total = len(raw_data)
-    if total == 0:
-        return {"error": "No data"}
-    
-    # Separate rewritten vs pass-through
-    rewritten = []
-    passthrough = []
-    
-    for doc in raw_data:
-        telemetry = doc.get('query_rewrite_telemetry', {})
-        expansion_count = telemetry.get('expansion_count', 0)
-        
-        if expansion_count > 0:
-            rewritten.append(doc)
-        else:
-            passthrough.append(doc)
-    
-    # Calculate rates
-    rewrite_rate = round(len(rewritten) / total * 100, 1) if total > 0 else 0
-    
-    # Zero-result rates
-    rewritten_zeros = sum(1 for d in rewritten if d.get('resultCount', 0) == 0)
-    passthrough_zeros = sum(1 for d in passthrough if d.get('resultCount', 0) == 0)
-    
-    rewritten_zero_rate = round(rewritten_zeros / len(rewritten) * 100, 1) if rewritten else 0
-    passthrough_zero_rate = round(passthrough_zeros / len(passthrough) * 100, 1) if passthrough else 0
-    
-    # Average results
-    rewritten_avg_results = round(sum(d.get('resultCount', 0) for d in rewritten) / len(rewritten), 1) if rewritten else 0
-    passthrough_avg_results = round(sum(d.get('resultCount', 0) for d in passthrough) / len(passthrough), 1) if passthrough else 0
-    
-    # Latency stats
-    latencies = []
-    for d in rewritten:
-        lat = d.get('query_rewrite_telemetry', {}).get('rewrite_time_ms', 0)
-        if lat > 0:
-            latencies.append(lat)
-    
-    # Average expansion count
-    expansion_counts = [d.get('query_rewrite_telemetry', {}).get('expansion_count', 0) for d in rewritten]
-    avg_expansion = round(sum(expansion_counts) / len(expansion_counts), 1) if expansion_counts else 0
-    
-    # Entity match frequency
-    entity_counts = defaultdict(int)
-    for d in rewritten:
-        for entity in d.get('query_rewrite_telemetry', {}).get('matched_entities', []):
-            entity_counts[entity] += 1
-    
-    top_entities = [{"entity": k, "count": v} for k, v in sorted(entity_counts.items(), key=lambda x: -x[1])[:10]]
-    
-    # Build rewritten queries list
-    rewritten_queries = []
-    for d in rewritten:
-        telemetry = d.get('query_rewrite_telemetry', {})
-        scores = d.get('evaluation_scores', {})
-        rewritten_queries.append({
-            "id": d.get('conversation_id', d.get('id', ''))[:8],
-            "query": d.get('conversation', ''),
-            "matchedEntities": telemetry.get('matched_entities', []),
-            "expansionCount": telemetry.get('expansion_count', 0),
-            "expandedQuery": telemetry.get('expanded_query', ''),
-            "rewriteTimeMs": round(telemetry.get('rewrite_time_ms', 0), 2),
-            "resultCount": d.get('resultCount', 0),
-            "scores": {
-                "relevance": scores.get('relevance', 0),
-                "groundedness": scores.get('groundedness', 0),
-                "completeness": scores.get('completeness', 0)
-            }
-        })
-    
-    # Zero result queries (content gaps)
-    zero_result_queries = []
-    for d in raw_data:
-        if d.get('resultCount', 0) == 0:
-            zero_result_queries.append({
-                "id": d.get('conversation_id', d.get('id', ''))[:8],
-                "query": d.get('conversation', ''),
-                "matchedEntities": d.get('query_rewrite_telemetry', {}).get('matched_entities', []),
-                "wasRewritten": d.get('query_rewrite_telemetry', {}).get('expansion_count', 0) > 0,
-                "timestamp": d.get('timestamp', '')
-            })
-    
-    # Calculate average scores
-    def avg_scores(docs):
-        if not docs:
-            return {"relevance": 0, "groundedness": 0, "completeness": 0}
-        scores_list = [d.get('evaluation_scores', {}) for d in docs if d.get('evaluation_scores')]
-        if not scores_list:
-            return {"relevance": 0, "groundedness": 0, "completeness": 0}
-        r = sum(s.get('relevance', 0) for s in scores_list) / len(scores_list)
-        g = sum(s.get('groundedness', 0) for s in scores_list) / len(scores_list)
-        c = sum(s.get('completeness', 0) for s in scores_list) / len(scores_list)
-        return {"relevance": round(r, 2), "groundedness": round(g, 2), "completeness": round(c, 2)}
-    
-    return {
-        "summary": {
-            "totalQueries": total,
-            "rewrittenCount": len(rewritten),
-            "passthroughCount": len(passthrough),
-            "rewriteRate": rewrite_rate,
-            "avgExpansionCount": avg_expansion
-        },
-        "effectiveness": {
-            "rewrittenZeroRate": rewritten_zero_rate,
-            "passthroughZeroRate": passthrough_zero_rate,
-            "rewrittenAvgResults": rewritten_avg_results,
-            "passthroughAvgResults": passthrough_avg_results
-        },
-        "latencyStats": {
-            "min": round(min(latencies), 2) if latencies else 0,
-            "max": round(max(latencies), 2) if latencies else 0,
-            "avg": round(sum(latencies) / len(latencies), 2) if latencies else 0,
-            "p95": round(sorted(latencies)[int(len(latencies) * 0.95)] if len(latencies) > 1 else (latencies[0] if latencies else 0), 2),
-            "target": 40
-        },
-        "qualityScores": {
-            "rewritten": avg_scores(rewritten),
-            "passthrough": avg_scores(passthrough)
-        },
-        "topEntities": top_entities,
-        "rewrittenQueries": rewritten_queries[:50],  # Limit to 50 for UI
-        "zeroResultQueries": zero_result_queries[:30],  # Limit to 30
-        "metadata": {
-            "generatedAt": datetime.now().isoformat(),
-            "dataSource": "staging"
-        }
-    }
+def calculate_rewriter_metrics(raw_data, workers=1):
+    """Calculate query rewriter effectiveness metrics (over `workers` processes)."""
+    return compute_sharded(raw_data, RewriterAccumulator, workers).finalize()
 
 
 # =============================================================================
 # FEEDBACK METRICS
 # =============================================================================
 
-def calculate_feedback_metrics(feedback_data, categorize=True):
+def calculate_feedback_metrics(feedback_data, categorize=True, batch_size=20,
+                               fast_path_threshold=DEFAULT_FAST_PATH_THRESHOLD, workers=1, vocabulary=None):
     """Calculate feedback metrics and optionally categorize with AI."""
     
-    if not feedback_data:
-        return {"error": "No feedback data"}
-    
-    total = len(feedback_data)
-    
-    # Count by type
-    thumbs_up = [f for f in feedback_data if f.get('feedbackType') == 'thumbsUp']
-    thumbs_down = [f for f in feedback_data if f.get('feedbackType') == 'thumbsDown']
-    
-    # Feedback over time (last 30 days)
-    now = datetime.now()
-    month_ago = now - timedelta(days=30)
-    
-    daily_feedback = defaultdict(lambda: {"positive": 0, "negative": 0})
-    for f in feedback_data:
-        ts = f.get('_ts', 0)
-        if ts:
-            feedback_time = datetime.fromtimestamp(ts)
-            if feedback_time >= month_ago:
-                day_key = feedback_time.strftime('%Y-%m-%d')
-                if f.get('feedbackType') == 'thumbsUp':
-                    daily_feedback[day_key]['positive'] += 1
-                else:
-                    daily_feedback[day_key]['negative'] += 1
-    
-    feedback_trend = [
-        {"date": d, "positive": v['positive'], "negative": v['negative']} 
-        for d, v in sorted(daily_feedback.items())
-    ]
-    
     # Categorize feedback with AI (optional - can be slow)
-    if categorize:
+    if feedback_data and categorize:
         print("Categorizing feedback with AI (this may take a moment)...")
-        feedback_data = categorize_feedback_with_ai(feedback_data)
-    
-    # Category breakdown
-    category_counts = defaultdict(int)
-    for f in feedback_data:
-        cat = f.get('category', 'Uncategorized')
-        category_counts[cat] += 1
-    
-    category_breakdown = [{"category": k, "count": v} for k, v in sorted(category_counts.items(), key=lambda x: -x[1])]
-    
-    # Build feedback items list
-    feedback_items = []
-    for f in feedback_data:
-        feedback_items.append({
-            "id": f.get('id', '')[:12],
-            "timestamp": f.get('timestamp', ''),
-            "userName": f.get('userName', 'Anonymous'),
-            "feedbackType": f.get('feedbackType', 'unknown'),
-            "comment": f.get('comment', ''),
-            "category": f.get('category', 'Uncategorized'),
-            "conversationId": f.get('conversationId', '')[:12]
-        })
-    
-    # Sort by timestamp descending
-    feedback_items.sort(key=lambda x: x['timestamp'], reverse=True)
-    
-    return {
-        "summary": {
-            "total": total,
-            "thumbsUp": len(thumbs_up),
-            "thumbsDown": len(thumbs_down),
-            "positiveRate": round(len(thumbs_up) / total * 100, 1) if total > 0 else 0
-        },
-        "trend": feedback_trend,
-        "categoryBreakdown": category_breakdown,
-        "feedbackItems": feedback_items[:100],  # Limit to 100 for UI
-        "metadata": {
-            "generatedAt": datetime.now().isoformat(),
-            "dataSource": "production",
-            "aiCategorized": categorize
-        }
-    }
+        feedback_data = categorize_feedback_with_ai(feedback_data, batch_size=batch_size,
+                                                    fast_path_threshold=fast_path_threshold,
+                                                    vocabulary=vocabulary)
+    
+    now = datetime.now()
+    accumulator = compute_sharded(feedback_data, lambda: FeedbackAccumulator(categorized=categorize, now=now),
+                                  workers)
+    return accumulator.finalize()
 
 
 # =============================================================================
-# MAIN
+# ROLLUPS
 # =============================================================================
 
-def main():
-    print("=" * 60)
-    print("NEXUS DASHBOARD DATA PIPELINE")
-    print("=" * 60)
-    
-    # Determine output directory
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    src_dir = os.path.join(script_dir, 'src')
-    
-    # Create src directory if it doesn't exist
-    if not os.path.exists(src_dir):
-        os.makedirs(src_dir)
-    
-    # -------------------------------------------------------------------------
-    # 1. QUERY REWRITER METRICS (from Staging)
-    # -------------------------------------------------------------------------
+def refresh_rollups(source, docs, deltas, prepare=None):
+    """
+    Update the day rollups for `source` (see pipeline.rollups) with the deltas
+    fetch_incremental reported this run and return the open store. A None
+    delta means the snapshot was rebuilt, so every partition is rebuilt too.
+    """
+    store = RollupStore()
+    delta = None if any(d is None for d in deltas) else [doc for d in deltas for doc in d]
+    store.refresh(source, docs, delta=delta, prepare=prepare)
+    return store
+
+
+def delta_tracker(deltas):
+    """fetch_incremental on_delta callback collecting deltas for refresh_rollups."""
+    return lambda delta, rebuilt: deltas.append(None if rebuilt else delta)
+
+
+# =============================================================================
+# STREAMING
+# =============================================================================
+
+# List caps on the --stream path. The accumulator is checkpointed after every
+# page, so its heaps stay this small and the whole lists go to list spools
+# that write_artifact pages into the shards.
+STREAM_QUERY_LIMIT = 50
+STREAM_ZERO_LIMIT = 30
+STREAM_ITEMS_LIMIT = 100
+
+
+def list_spools(name, lists):
+    """ListSpools in the state directory for the sharded lists of stream `name`."""
+    return {lst: ListSpool(state.state_path(f"{name}_{lst}", ".spool.jsonl")) for lst in lists}
+
+
+def write_stage_artifact(args, src_dir, filename, metrics, spools=None):
+    """write_artifact with the run's shard options; spools are removed once paged into shards."""
+    changed = write_artifact(src_dir, filename, metrics, args.shard_dir, args.shard_page_size, spools)
+    for spool in (spools or {}).values():
+        spool.remove()
+    return changed
+
+
+# =============================================================================
+# PIPELINE STAGES
+# =============================================================================
+# Each stage fetches, computes and writes one dashboard file, and handles its
+# own errors so a failing source never takes the other stages down.
+
+def run_rewriter_stage(args, src_dir):
+    """1. Query rewriter metrics (Staging) -> src/data.json"""
     print("\n" + "-" * 40)
     print("1. QUERY REWRITER METRICS (Staging)")
     print("-" * 40)
     
     try:
         container_staging = connect_to_cosmos_staging()
-        raw_rewriter_data = fetch_rewriter_queries(container_staging)
+        spools = None
         
-        # Score unscored queries
-        scored = score_unscored_queries(raw_rewriter_data, container_staging)
-        if scored > 0:
-            print(f"Scored {scored} new queries")
-            raw_rewriter_data = fetch_rewriter_queries(container_staging)
-        
-        # Calculate metrics
-        rewriter_metrics = calculate_rewriter_metrics(raw_rewriter_data)
+        if args.stream:
+            # Score each page as it arrives; scores are already on the docs
+            def score_page(page):
+                scored = score_unscored_queries(page, container_staging, args.max_concurrency, args.judge_rpm,
+                                                args.verify_scores)
+                if scored:
+                    print(f"Scored {len(scored)} new queries")
+                return page
+            
+            query, parameters = rewriter_query(ordered=not args.unordered)
+            with step("stream"):
+                accumulator = stream_into(
+                    "staging_rewriter_stream", container_staging, query,
+                    RewriterAccumulator(query_limit=STREAM_QUERY_LIMIT, zero_limit=STREAM_ZERO_LIMIT,
+                                        spools=list_spools("staging_rewriter_stream",
+                                                           ("rewrittenQueries", "zeroResultQueries"))),
+                    parameters=parameters, on_page=score_page
+                )
+            # A resumed accumulator brings the spools of its checkpoint
+            spools = accumulator.spools
+            save_entity_vocabulary(accumulator.entity_counts)
+            with step("calculate"):
+                rewriter_metrics = accumulator.finalize()
+        else:
+            deltas = []
+            fetch_staging = lambda since_ts: fetch_rewriter_queries(container_staging, since_ts=since_ts,
+                                                                    parallelism=args.fetch_parallelism,
+                                                                    ordered=not args.unordered)
+            with step("fetch"):
+                raw_rewriter_data = fetch_incremental("staging_rewriter", fetch_staging, REWRITER_SELECT,
+                                                      full=args.full, on_delta=delta_tracker(deltas))
+            
+            # Score unscored queries. The scored documents already hold what a
+            # refetch would return, so they are merged in place: into the
+            # snapshot, and into the rollups as one more delta.
+            scored = score_unscored_queries(raw_rewriter_data, container_staging, args.max_concurrency,
+                                            args.judge_rpm, args.verify_scores)
+            if scored:
+                print(f"Scored {len(scored)} new queries")
+                with step("merge"):
+                    merge_into_snapshot("staging_rewriter", scored)
+                    deltas.append(scored)
+                    raw_rewriter_data.sort(key=lambda doc: doc.get('_ts', 0), reverse=True)
+            
+            # Calculate metrics
+            with step("calculate"):
+                if args.rollups:
+                    store = refresh_rollups("rewriter", raw_rewriter_data, deltas)
+                    rewriter_metrics = store.rewriter_metrics()
+                    store.close()
+                else:
+                    rewriter_metrics = calculate_rewriter_metrics(raw_rewriter_data, workers=args.workers)
+            
+            # Ontology vocabulary for the feedback fast-path classifier
+            save_entity_vocabulary(collect_entity_vocabulary(raw_rewriter_data))
         
         # Save to src/data.json
         output_path = os.path.join(src_dir, 'data.json')
-        with open(output_path, 'w') as f:
-            json.dump(rewriter_metrics, f, indent=2)
-        print(f"✓ Saved rewriter metrics to {output_path}")
+        with step("write"):
+            changed = write_stage_artifact(args, src_dir, 'data.json', rewriter_metrics, spools)
+        if changed:
+            print(f"✓ Saved rewriter metrics to {output_path}")
+        else:
+            print(f"✓ Rewriter metrics unchanged, kept {output_path}")
         
     except Exception as e:
         print(f"✗ Error fetching rewriter data: {e}")
         rewriter_metrics = None
     
-    # -------------------------------------------------------------------------
-    # 2. ADOPTION METRICS (from Production)
-    # -------------------------------------------------------------------------
+    return rewriter_metrics
+
+
+def check_adoption_parity(container, adoption_metrics, engine):
+    """Recompute adoption with the other engine and report any differing fields."""
+    if engine == "pushdown":
+        other = calculate_adoption_metrics(fetch_all_queries_for_adoption(container))
+    else:
+        other = pushdown_adoption_metrics(container)
+    
+    mismatched = adoption_parity(adoption_metrics, other)
+    if mismatched:
+        print(f"✗ Adoption engines disagree on: {', '.join(mismatched)}")
+    else:
+        print("✓ Adoption pushdown matches the document-by-document path")
+
+
+def run_adoption_stage(args, src_dir):
+    """2. Adoption metrics (Production) -> src/adoption.json"""
     print("\n" + "-" * 40)
     print("2. ADOPTION METRICS (Production)")
     print("-" * 40)
     
     try:
         container_prod = connect_to_cosmos_prod()
-        raw_adoption_data = fetch_all_queries_for_adoption(container_prod)
         
-        # Calculate metrics
-        adoption_metrics = calculate_adoption_metrics(raw_adoption_data)
+        if args.adoption_engine == "pushdown":
+            # Counting happens in Cosmos; only aggregate rows are transferred
+            with step("pushdown"):
+                adoption_metrics = pushdown_adoption_metrics(container_prod)
+        elif args.stream:
+            query, parameters = adoption_query(ordered=not args.unordered)
+            with step("stream"):
+                accumulator = stream_into(
+                    "prod_adoption_stream", container_prod, query, adoption_accumulator(args.distinct_users),
+                    parameters=parameters
+                )
+            with step("calculate"):
+                adoption_metrics = finalize_adoption(accumulator)
+        else:
+            deltas = []
+            with step("fetch"):
+                raw_adoption_data = fetch_incremental(
+                    "prod_adoption",
+                    lambda since_ts: fetch_all_queries_for_adoption(container_prod, since_ts=since_ts,
+                                                                    parallelism=args.fetch_parallelism,
+                                                                    ordered=not args.unordered),
+                    ADOPTION_SELECT,
+                    full=args.full,
+                    on_delta=delta_tracker(deltas)
+                )
+            
+            # Calculate metrics (rollups keep exact distinct counts only)
+            with step("calculate"):
+                if args.rollups and args.distinct_users == "exact":
+                    store = refresh_rollups("adoption", raw_adoption_data, deltas)
+                    adoption_metrics = store.adoption_metrics()
+                    store.close()
+                else:
+                    adoption_metrics = calculate_adoption_metrics(raw_adoption_data, distinct=args.distinct_users,
+                                                                  workers=args.workers)
+        
+        if args.adoption_parity:
+            with step("parity"):
+                check_adoption_parity(container_prod, adoption_metrics, args.adoption_engine)
         
         # Save to src/adoption.json
         output_path = os.path.join(src_dir, 'adoption.json')
-        with open(output_path, 'w') as f:
-            json.dump(adoption_metrics, f, indent=2)
-        print(f"✓ Saved adoption metrics to {output_path}")
+        with step("write"):
+            changed = write_stage_artifact(args, src_dir, 'adoption.json', adoption_metrics)
+        if changed:
+            print(f"✓ Saved adoption metrics to {output_path}")
+        else:
+            print(f"✓ Adoption metrics unchanged, kept {output_path}")
         
     except Exception as e:
         print(f"✗ Error fetching adoption data: {e}")
         adoption_metrics = None
     
-    # -------------------------------------------------------------------------
-    # 3. FEEDBACK METRICS (from Production)
-    # -------------------------------------------------------------------------
+    return adoption_metrics
+
+
+def run_feedback_stage(args, src_dir):
+    """3. Feedback metrics (Production) -> src/feedback.json"""
     print("\n" + "-" * 40)
     print("3. FEEDBACK METRICS (Production)")
     print("-" * 40)
     
     try:
         container_feedback = connect_to_cosmos_prod_feedback()
-        raw_feedback_data = fetch_feedback(container_feedback)
+        fast_path_threshold = None if args.no_fast_path else args.fast_path_threshold
+        spools = None
         
-        # Calculate metrics (set categorize=False for faster runs)
-        feedback_metrics = calculate_feedback_metrics(raw_feedback_data, categorize=True)
+        if args.stream:
+            # Categorize page by page so categories are in place before counting
+            query, parameters = feedback_query(ordered=not args.unordered)
+            with step("stream"):
+                accumulator = stream_into(
+                    "prod_feedback_stream", container_feedback, query,
+                    FeedbackAccumulator(categorized=True, items_limit=STREAM_ITEMS_LIMIT,
+                                        spools=list_spools("prod_feedback_stream", ("feedbackItems",))),
+                    parameters=parameters,
+                    on_page=lambda page: categorize_feedback_with_ai(page, batch_size=args.categorize_batch_size,
+                                                                     fast_path_threshold=fast_path_threshold,
+                                                                     vocabulary=args.entity_vocabulary)
+                )
+            spools = accumulator.spools
+            with step("calculate"):
+                feedback_metrics = accumulator.finalize()
+        else:
+            deltas = []
+            with step("fetch"):
+                raw_feedback_data = fetch_incremental(
+                    "prod_feedback",
+                    lambda since_ts: fetch_feedback(container_feedback, since_ts=since_ts,
+                                                    parallelism=args.fetch_parallelism,
+                                                    ordered=not args.unordered),
+                    FEEDBACK_SELECT,
+                    full=args.full,
+                    on_delta=delta_tracker(deltas)
+                )
+            
+            with step("calculate"):
+                if args.rollups:
+                    # Only the documents in rebuilt partitions need categories
+                    categorize = lambda docs: categorize_feedback_with_ai(docs, batch_size=args.categorize_batch_size,
+                                                                          fast_path_threshold=fast_path_threshold,
+                                                                          vocabulary=args.entity_vocabulary)
+                    store = refresh_rollups("feedback", raw_feedback_data, deltas, prepare=categorize)
+                    feedback_metrics = store.feedback_metrics(categorized=True)
+                    store.close()
+                else:
+                    # Calculate metrics (set categorize=False for faster runs)
+                    feedback_metrics = calculate_feedback_metrics(raw_feedback_data, categorize=True,
+                                                                  batch_size=args.categorize_batch_size,
+                                                                  fast_path_threshold=fast_path_threshold,
+                                                                  workers=args.workers,
+                                                                  vocabulary=args.entity_vocabulary)
         
         # Save to src/feedback.json
         output_path = os.path.join(src_dir, 'feedback.json')
-        with open(output_path, 'w') as f:
-            json.dump(feedback_metrics, f, indent=2)
-        print(f"✓ Saved feedback metrics to {output_path}")
+        with step("write"):
+            changed = write_stage_artifact(args, src_dir, 'feedback.json', feedback_metrics, spools)
+        if changed:
+            print(f"✓ Saved feedback metrics to {output_path}")
+        else:
+            print(f"✓ Feedback metrics unchanged, kept {output_path}")
         
     except Exception as e:
         print(f"✗ Error fetching feedback data: {e}")
         feedback_metrics = None
     
+    return feedback_metrics
+
+
+# =============================================================================
+# WATCH MODE
+# =============================================================================
+
+def run_watch(args, src_dir):
+    """Follow the change feeds and keep the dashboard JSONs current until interrupted."""
+    container_staging = connect_to_cosmos_staging()
+    fast_path_threshold = None if args.no_fast_path else args.fast_path_threshold
+    
+    def score(docs):
+        # Scores are written back to Cosmos and come round again on the feed
+        scored = score_unscored_queries(docs, container_staging, args.max_concurrency, args.judge_rpm,
+                                        args.verify_scores)
+        if scored:
+            print(f"Scored {len(scored)} new queries")
+    
+    daemon = MetricsDaemon(
+        {
+            "rewriter": CosmosChangeFeedSource(container_staging),
+            "adoption": CosmosChangeFeedSource(connect_to_cosmos_prod()),
+            "feedback": CosmosChangeFeedSource(connect_to_cosmos_prod_feedback()),
+        },
+        src_dir,
+        debounce=args.debounce,
+        poll_interval=args.poll_interval,
+        shard_dir=args.shard_dir,
+        page_size=args.shard_page_size,
+        prepare={
+            "rewriter": score,
+            "feedback": lambda docs: categorize_feedback_with_ai(docs, batch_size=args.categorize_batch_size,
+                                                                 fast_path_threshold=fast_path_threshold),
+        }
+    )
+    print(f"Watching change feeds (debounce {args.debounce}s, poll every {args.poll_interval}s); Ctrl+C to stop")
+    try:
+        daemon.run()
+    finally:
+        daemon.close()
+
+
+# =============================================================================
+# MAIN
+# =============================================================================
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Build dashboard JSON from Cosmos DB.")
+    parser.add_argument("--full", action="store_true",
+                        help="Ignore stored watermarks and refetch full history")
+    parser.add_argument("--stream", action="store_true",
+                        help="Stream full history page by page into accumulators (bounded memory, resumable)")
+    parser.add_argument("--max-concurrency", type=int, default=8,
+                        help="Concurrent LLM-as-judge requests when scoring")
+    parser.add_argument("--judge-rpm", type=int, default=300,
+                        help="Judge request rate limit (requests per minute)")
+    parser.add_argument("--verify-scores", action="store_true",
+                        help="Point-read every document whose scores were written and report any that differ")
+    parser.add_argument("--categorize-batch-size", type=int, default=20,
+                        help="Feedback comments per categorization request (1 = one request per comment)")
+    parser.add_argument("--fast-path-threshold", type=float, default=DEFAULT_FAST_PATH_THRESHOLD,
+                        help="Keyword classifier confidence needed to skip GPT "
+                             "(tune with: python -m pipeline.categorizer)")
+    parser.add_argument("--no-fast-path", action="store_true",
+                        help="Send every feedback comment to GPT")
+    parser.add_argument("--adoption-engine", choices=["python", "pushdown"], default="python",
+                        help="Compute adoption from documents (python) or from Cosmos-side aggregates (pushdown)")
+    parser.add_argument("--adoption-parity", action="store_true",
+                        help="Also run the other adoption engine and report any differences")
+    parser.add_argument("--distinct-users", choices=["exact", "hll"], default="exact",
+                        help="Exact WAU/MAU/total users, or HyperLogLog day sketches merged across runs "
+                             "(~0.8%% standard error; see pipeline/hll.py)")
+    parser.add_argument("--rollups", action="store_true",
+                        help="Keep day rollups of each source and build the JSON from them; only days touched "
+                             "by the incremental fetch are recomputed")
+    parser.add_argument("--fetch-parallelism", type=int, default=1,
+                        help="Read each container's feed ranges (physical partitions) with this many concurrent "
+                             "queries instead of one cross-partition iterator")
+    parser.add_argument("--unordered", action="store_true",
+                        help="Fetch without ORDER BY c._ts DESC (fewer RUs, no cross-partition merge-sort); "
+                             "ordering is applied client-side where the outputs need it")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Processes computing each stage's metrics, over _ts ranges of its documents "
+                             "(0 = one per core; small inputs stay in one process). Implies --sequential")
+    parser.add_argument("--sequential", action="store_true",
+                        help="Run the pipeline stages one after another with live output")
+    parser.add_argument("--watch", action="store_true",
+                        help="Keep running: follow the Cosmos change feeds and rewrite the JSONs as data changes")
+    parser.add_argument("--debounce", type=float, default=60,
+                        help="With --watch, seconds to collect changes before rewriting the JSONs")
+    parser.add_argument("--poll-interval", type=float, default=5,
+                        help="With --watch, seconds between change feed polls")
+    parser.add_argument("--replay", metavar="DIR",
+                        help="Read from a JSONL fixture directory instead of Cosmos (see pipeline/replay.py; "
+                             "generate one with python -m pipeline.synthetic). State and output then live "
+                             "under DIR unless --output-dir is given")
+    parser.add_argument("--judge-stub", action="store_true",
+                        help="Send judge and categorization requests to an in-process Azure OpenAI stub "
+                             "(pipeline/judge_stub.py); requires --replay")
+    parser.add_argument("--stub-latency-ms", type=float, default=300,
+                        help="With --judge-stub, simulated completion latency")
+    parser.add_argument("--output-dir", help="Directory for the dashboard JSONs (default: src/)")
+    parser.add_argument("--shard-dir",
+                        help="Directory for the paginated list shards (default: public/shards next to src/, "
+                             "else <output-dir>/shards)")
+    parser.add_argument("--shard-page-size", type=int, default=DEFAULT_PAGE_SIZE,
+                        help="Items per list shard page")
+    parser.add_argument("--report", metavar="PATH",
+                        help="Where to write the JSON run report with per-step timings, documents, RUs, "
+                             "LLM calls and tokens (default: .pipeline_state/run_report.json)")
+    parser.add_argument("--openmetrics", metavar="PATH",
+                        help="Also write the run report as an OpenMetrics text file")
+    args = parser.parse_args(argv)
+    if args.judge_stub and not args.replay:
+        # Stub scores would be written into live documents and cached in the live state
+        parser.error("--judge-stub requires --replay")
+    if args.workers != 1:
+        # Workers are only forked from a single-threaded process (see pipeline.sharding),
+        # which the parallel stages never are
+        args.sequential = True
+    return args
+
+
+def use_offline_sources(args):
+    """Point the pipeline at a replay fixture and/or the judge stub."""
+    if args.replay:
+        os.environ["PIPELINE_REPLAY_DIR"] = os.path.abspath(args.replay)
+        # Keep replay watermarks and snapshots away from the live ones
+        state.STATE_DIR = os.path.join(os.path.abspath(args.replay), ".pipeline_state")
+        print(f"Replaying fixtures from {args.replay}")
+    
+    if args.judge_stub:
+        from pipeline.judge_stub import serve, use_stub
+        server = serve(port=0, latency_ms=args.stub_latency_ms)
+        use_stub(server)
+        print(f"Judge stub listening on {os.environ['AZURE_OPENAI_ENDPOINT']}")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    
+    print("=" * 60)
+    print("NEXUS DASHBOARD DATA PIPELINE")
+    print("=" * 60)
+    
+    use_offline_sources(args)
+    
+    # Determine output directory
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    if args.output_dir:
+        src_dir = args.output_dir
+    elif args.replay:
+        src_dir = os.path.join(args.replay, 'output')
+    else:
+        src_dir = os.path.join(script_dir, 'src')
+    
+    # Create src directory if it doesn't exist
+    if not os.path.exists(src_dir):
+        os.makedirs(src_dir)
+    args.shard_dir = args.shard_dir or default_shard_dir(src_dir)
+    
+    if args.watch:
+        run_watch(args, src_dir)
+        return
+    
+    # -------------------------------------------------------------------------
+    # 1-3. STAGES (independent sources, run concurrently)
+    # -------------------------------------------------------------------------
+    # The rewriter stage rewrites the entity vocabulary while the feedback
+    # stage categorizes; feedback uses the one saved by the previous run,
+    # read here before either starts, whatever order they run in.
+    args.entity_vocabulary = load_entity_vocabulary()
+    rewriter_metrics, adoption_metrics, feedback_metrics = run_stages([
+        ("rewriter", lambda: run_rewriter_stage(args, src_dir)),
+        ("adoption", lambda: run_adoption_stage(args, src_dir)),
+        ("feedback", lambda: run_feedback_stage(args, src_dir)),
+    ], parallel=not args.sequential)
+    
     # -------------------------------------------------------------------------
     # SUMMARY
     # -------------------------------------------------------------------------
@@ -683,6 +852,11 @@ def main():
     print("PIPELINE COMPLETE")
     print("=" * 60)
     
+    report = write_report(args.report or state.state_path("run_report", ".json"), args.openmetrics)
+    print()
+    for line in summary_lines(report):
+        print(line)
+    
     if rewriter_metrics:
         print(f"\nQuery Rewriter (src/data.json):")
         print(f"  Total Queries: {rewriter_metrics['summary']['totalQueries']}")